@@ -11,6 +11,8 @@ from .models import (
     Bookmark,
     Download,
     View,
+    ResourceActivityDay,
+    UserActivityDay,
 )
 
 admin.site.register(Profile)
@@ -23,3 +25,5 @@ admin.site.register(Comment)
 admin.site.register(Bookmark)
 admin.site.register(Download)
 admin.site.register(View)
+admin.site.register(ResourceActivityDay)
+admin.site.register(UserActivityDay)
@@ -0,0 +1,68 @@
+"""
+Helpers for the async views.
+
+Django's async ORM methods (``aget``, ``acount``, ...) hand every query to
+the one thread that runs all sync code for a request, so gathering them
+still runs the queries one after another. ``gather_queries`` runs each
+function in its own worker thread instead. Every worker uses its own
+database connection, so independent queries really do overlap, and the
+connection is released afterwards just as at the end of a request.
+
+Only use it for reads that do not need to see the caller's uncommitted
+writes: each worker runs outside any transaction the caller has open. With
+``ASYNC_CONCURRENT_QUERIES = False`` the functions run one at a time on the
+request's own thread instead (useful under ``TestCase``, whose data only its
+own connection can see).
+"""
+
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.shortcuts import render
+
+
+def _releasing_connections(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return wrapper
+
+
+def run_in_worker(func, *args, **kwargs):
+    """Awaitable running ``func(*args, **kwargs)`` on its own connection."""
+    if not getattr(settings, 'ASYNC_CONCURRENT_QUERIES', True):
+        return sync_to_async(func)(*args, **kwargs)
+    return sync_to_async(_releasing_connections(func), thread_sensitive=False)(*args, **kwargs)
+
+
+async def gather_queries(*calls):
+    """
+    Run independent database work concurrently and return the results in
+    order. Each call is a function, or a ``(function, *args)`` tuple.
+    """
+    awaitables = []
+    for call in calls:
+        func, *args = call if isinstance(call, tuple) else (call,)
+        awaitables.append(run_in_worker(func, *args))
+    return await asyncio.gather(*awaitables)
+
+
+async def request_user(request):
+    """
+    ``await request.auser()``, also caching the user where the sync
+    ``request.user`` looks for it, so templates do not load it a second time.
+    """
+    user = await request.auser()
+    request._cached_user = user
+    return user
+
+
+async def arender(request, template_name, context=None):
+    # Templates may still touch lazy relations, so render on the sync thread
+    return await sync_to_async(render)(request, template_name, context)
@@ -0,0 +1,9 @@
+"""
+Read-only JSON API, mounted at ``/api/v1/``.
+
+Every list is cursor-paginated with the same keyset paginator as the HTML
+pages (``library.pagination``), takes ``?fields=a,b`` to return only some
+fields, and answers conditional requests: a list page is fingerprinted with
+one narrow query over the rows it would contain, so an unchanged page gets a
+304 before any object is built or serialised.
+"""
@@ -0,0 +1,59 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+class ConditionalMixin:
+    """
+    ETag (and, for single objects, Last-Modified) support for read-only
+    viewsets. ``fingerprint_fields`` must cover everything in the
+    representation that can change; ``last_modified_field`` is an optional
+    timestamp column bumped on every change.
+    """
+
+    fingerprint_fields = ('pk',)
+    last_modified_field = None
+
+    def etag_for(self, rows):
+        request = self.request
+        digest = hashlib.sha1()
+        # The same rows render differently per path, query, format and user
+        digest.update(request.get_full_path().encode())
+        digest.update(str(getattr(request, 'accepted_media_type', '')).encode())
+        digest.update(str(request.user.pk).encode())
+        for row in rows:
+            digest.update(repr(row).encode())
+        return f'"{digest.hexdigest()}"'
+
+    def _conditional(self, rows, last_modified=None):
+        etag = self.etag_for(rows)
+        timestamp = last_modified.timestamp() if last_modified else None
+        return etag, timestamp, get_conditional_response(self.request, etag=etag, last_modified=timestamp)
+
+    def _finish(self, response, etag, timestamp):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        window = self.paginator.window(queryset, request, self)
+        etag, timestamp, not_modified = self._conditional(list(window.values_list(*self.fingerprint_fields)))
+        if not_modified is not None:
+            return not_modified
+        return self._finish(super().list(request, *args, **kwargs), etag, timestamp)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        fields = self.fingerprint_fields + ((self.last_modified_field,) if self.last_modified_field else ())
+        rows = list(self.filter_queryset(self.get_queryset()).filter(**lookup).values_list(*fields))
+        if not rows:
+            return super().retrieve(request, *args, **kwargs)  # 404
+        last_modified = rows[0][-1] if self.last_modified_field else None
+        etag, timestamp, not_modified = self._conditional(rows, last_modified)
+        if not_modified is not None:
+            return not_modified
+        return self._finish(super().retrieve(request, *args, **kwargs), etag, timestamp)
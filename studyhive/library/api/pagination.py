@@ -0,0 +1,54 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+from ..pagination import CursorPaginator, InvalidCursor, page_size_from
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF adapter for ``library.pagination.CursorPaginator``. The view gives
+    the sort order with ``get_ordering()``.
+    """
+
+    cursor_query_param = 'cursor'
+
+    def _paginator(self, queryset, request, view):
+        return CursorPaginator(queryset, view.get_ordering(), page_size_from(request))
+
+    def window(self, queryset, request, view):
+        """The rows the page would hold, as a queryset (see CursorPaginator.window)."""
+        try:
+            return self._paginator(queryset, request, view).window(request.query_params.get(self.cursor_query_param))[0]
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = self._paginator(queryset, request, view).page(
+                request.query_params.get(self.cursor_query_param), request, self.cursor_query_param,
+            )
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        return list(self.page)
+
+    def _link(self, url):
+        return self.request.build_absolute_uri(self.request.path + url) if url else None
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self._link(self.page.next_url),
+            'previous': self._link(self.page.previous_url),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
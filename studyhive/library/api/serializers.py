@@ -0,0 +1,93 @@
+from django.urls import reverse
+from rest_framework import serializers
+
+from ..models import Bookmark, Comment, Rating, Resource, ResourceActivityDay, Subject, Tag
+
+
+class SparseFieldsetSerializer(serializers.ModelSerializer):
+    """Takes ``fields=`` to drop every field not named in it."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SubjectSerializer(SparseFieldsetSerializer):
+    class Meta:
+        model = Subject
+        fields = ['id', 'name', 'description']
+
+
+class TagSerializer(SparseFieldsetSerializer):
+    class Meta:
+        model = Tag
+        fields = ['id', 'name']
+
+
+class ResourceSerializer(SparseFieldsetSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='api:resource-detail')
+    uploader = serializers.SlugRelatedField(slug_field='username', read_only=True)
+    subject = serializers.SlugRelatedField(slug_field='name', read_only=True)
+    subject_id = serializers.IntegerField(read_only=True)
+    tags = serializers.SlugRelatedField(slug_field='name', many=True, read_only=True)
+    download_url = serializers.SerializerMethodField()
+    previews = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Resource
+        fields = [
+            'id', 'url', 'title', 'description', 'resource_type', 'file_type', 'download_url', 'previews',
+            'file_size', 'mime_type', 'page_count', 'video_url', 'video_id',
+            'subject', 'subject_id', 'tags', 'uploader', 'upload_date', 'updated_at',
+            'views_count', 'downloads_count', 'average_rating', 'total_ratings',
+        ]
+
+    def get_download_url(self, resource):
+        if not resource.file:
+            return None
+        return self.context['request'].build_absolute_uri(reverse('download_resource', args=[resource.pk]))
+
+    def get_previews(self, resource):
+        request = self.context['request']
+        return {str(width): request.build_absolute_uri(url) for width, url in resource.preview_urls()}
+
+
+class CommentSerializer(SparseFieldsetSerializer):
+    user = serializers.SlugRelatedField(slug_field='username', read_only=True)
+    parent = serializers.IntegerField(source='parent_comment_id', read_only=True)
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'resource', 'parent', 'depth', 'user', 'comment_text', 'comment_date']
+
+
+class RatingSerializer(SparseFieldsetSerializer):
+    user = serializers.SlugRelatedField(slug_field='username', read_only=True)
+
+    class Meta:
+        model = Rating
+        fields = ['id', 'resource', 'user', 'rating', 'rating_date']
+
+
+class ActivitySerializer(SparseFieldsetSerializer):
+    class Meta:
+        model = ResourceActivityDay
+        fields = ['id', 'resource', 'day', 'views', 'downloads']
+
+
+class BookmarkedResourceSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='api:resource-detail')
+
+    class Meta:
+        model = Resource
+        fields = ['id', 'url', 'title']
+
+
+class BookmarkSerializer(SparseFieldsetSerializer):
+    resource = BookmarkedResourceSerializer(read_only=True)
+
+    class Meta:
+        model = Bookmark
+        fields = ['id', 'resource', 'bookmark_date']
@@ -0,0 +1,16 @@
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+app_name = 'api'
+
+router = DefaultRouter()
+router.register('resources', views.ResourceViewSet, basename='resource')
+router.register('subjects', views.SubjectViewSet, basename='subject')
+router.register('tags', views.TagViewSet, basename='tag')
+router.register('comments', views.CommentViewSet, basename='comment')
+router.register('ratings', views.RatingViewSet, basename='rating')
+router.register('activity', views.ActivityViewSet, basename='activity')
+router.register('bookmarks', views.BookmarkViewSet, basename='bookmark')
+
+urlpatterns = router.urls
@@ -0,0 +1,167 @@
+from django.utils.dateparse import parse_date
+from rest_framework import permissions, viewsets
+from rest_framework.exceptions import ValidationError
+
+from ..models import Bookmark, Comment, Rating, Resource, ResourceActivityDay, Subject, Tag
+from ..routing import reading_from_replicas
+from ..views import LISTING_ORDERINGS
+from . import serializers
+from .conditional import ConditionalMixin
+
+
+class ReadOnlyViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    """Keyset-paginated, conditional, sparse-fieldset read-only endpoint."""
+
+    ordering = ('-id',)
+    lookup_value_regex = r'\d+'
+
+    def dispatch(self, request, *args, **kwargs):
+        # Read-only, so served from a replica where there is one
+        with reading_from_replicas(request):
+            return super().dispatch(request, *args, **kwargs)
+
+    def get_ordering(self):
+        return self.ordering
+
+    def requested_fields(self):
+        value = self.request.query_params.get('fields')
+        if not value:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def wants(self, field):
+        fields = self.requested_fields()
+        return fields is None or field in fields
+
+
+class ResourceViewSet(ReadOnlyViewSet):
+    """
+    Active resources, newest first. Filters: ``subject``, ``resource_type``,
+    ``file_type``, ``mime_type``, ``tag`` (name), ``uploader`` (username),
+    ``min_pages``/``max_pages`` and ``max_size`` (bytes); ``sort=popular``
+    orders by views, ``sort=trending`` by recent activity.
+    """
+
+    serializer_class = serializers.ResourceSerializer
+    fingerprint_fields = ('id', 'updated_at')
+    last_modified_field = 'updated_at'
+
+    def get_ordering(self):
+        return LISTING_ORDERINGS.get(self.request.query_params.get('sort'), LISTING_ORDERINGS['recent'])
+
+    def get_queryset(self):
+        queryset = Resource.objects.filter(is_active=True)
+        params = self.request.query_params
+        if params.get('subject', '').isdigit():
+            queryset = queryset.filter(subject_id=params['subject'])
+        for name in ('resource_type', 'file_type', 'mime_type'):
+            if params.get(name):
+                queryset = queryset.filter(**{name: params[name]})
+        for name, lookup in (('min_pages', 'page_count__gte'), ('max_pages', 'page_count__lte'), ('max_size', 'file_size__lte')):
+            if params.get(name, '').isdigit():
+                queryset = queryset.filter(**{lookup: int(params[name])})
+        if params.get('tag'):
+            queryset = queryset.filter(tags__name=params['tag'])
+        if params.get('uploader'):
+            queryset = queryset.filter(uploader__username=params['uploader'])
+        # Only join and prefetch what will be serialised
+        related = [name for name in ('uploader', 'subject') if self.wants(name)]
+        if related:
+            queryset = queryset.select_related(*related)
+        if self.wants('tags'):
+            queryset = queryset.prefetch_related('tags')
+        return queryset
+
+
+class SubjectViewSet(ReadOnlyViewSet):
+    queryset = Subject.objects.all()
+    serializer_class = serializers.SubjectSerializer
+    ordering = ('name', 'id')
+    fingerprint_fields = ('id', 'name', 'description')
+
+
+class TagViewSet(ReadOnlyViewSet):
+    queryset = Tag.objects.all()
+    serializer_class = serializers.TagSerializer
+    ordering = ('name', 'id')
+    fingerprint_fields = ('id', 'name')
+
+
+class CommentViewSet(ReadOnlyViewSet):
+    """Comments in thread order (replies follow their parent). Filter: ``resource``."""
+
+    serializer_class = serializers.CommentSerializer
+    ordering = ('path', 'id')
+    fingerprint_fields = ('id', 'comment_text', 'parent_comment_id', 'depth')
+
+    def get_queryset(self):
+        queryset = Comment.objects.filter(resource__is_active=True)
+        if self.request.query_params.get('resource', '').isdigit():
+            queryset = queryset.filter(resource_id=self.request.query_params['resource'])
+        if self.wants('user'):
+            queryset = queryset.select_related('user')
+        return queryset
+
+
+class RatingViewSet(ReadOnlyViewSet):
+    """Filters: ``resource``, ``user`` (username)."""
+
+    serializer_class = serializers.RatingSerializer
+    fingerprint_fields = ('id', 'rating')
+
+    def get_queryset(self):
+        queryset = Rating.objects.all()
+        params = self.request.query_params
+        if params.get('resource', '').isdigit():
+            queryset = queryset.filter(resource_id=params['resource'])
+        if params.get('user'):
+            queryset = queryset.filter(user__username=params['user'])
+        if self.wants('user'):
+            queryset = queryset.select_related('user')
+        return queryset
+
+
+class ActivityViewSet(ReadOnlyViewSet):
+    """
+    Daily views and downloads per resource, newest day first (see
+    ``library.rollups``). Filters: ``resource``, ``since`` (YYYY-MM-DD).
+    """
+
+    serializer_class = serializers.ActivitySerializer
+    ordering = ('-day', '-id')
+    fingerprint_fields = ('id', 'views', 'downloads')
+
+    def get_queryset(self):
+        queryset = ResourceActivityDay.objects.filter(resource__is_active=True)
+        params = self.request.query_params
+        if params.get('resource', '').isdigit():
+            queryset = queryset.filter(resource_id=params['resource'])
+        if params.get('since'):
+            try:
+                # None when malformed, ValueError for an impossible date
+                since = parse_date(params['since'])
+            except ValueError:
+                since = None
+            if since is None:
+                raise ValidationError({'since': 'Expected YYYY-MM-DD'})
+            queryset = queryset.filter(day__gte=since)
+        return queryset
+
+
+class BookmarkViewSet(ReadOnlyViewSet):
+    """The authenticated user's bookmarks, newest first."""
+
+    serializer_class = serializers.BookmarkSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    ordering = ('-bookmark_date', '-id')
+    fingerprint_fields = ('id', 'resource__updated_at')
+
+    def get_queryset(self):
+        queryset = Bookmark.objects.filter(user=self.request.user)
+        if self.wants('resource'):
+            queryset = queryset.select_related('resource')
+        return queryset
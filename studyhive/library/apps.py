@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class LibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library'
+
+    def ready(self):
+        # Connect the signal receivers that keep derived data in sync
+        from . import autocomplete, caching, cards, comments, extraction, leaderboards, media, previews, ratings, search, timestamps, trending  # noqa: F401
+        # Hook query profiling into connections before any are opened
+        from . import profiling  # noqa: F401
@@ -0,0 +1,299 @@
+"""
+Tag and title autocomplete from an in-memory prefix index.
+
+``/autocomplete/?q=`` suggests existing tags (so uploaders reuse them rather
+than inventing near-duplicates) and resource titles. Lookups never touch the
+database: each process keeps a ``PrefixIndex`` per kind, a sorted array of
+``(key, entry id)`` searched with ``bisect``. Every word start of a name is a
+key, so "calc" finds "Intro to Calculus". Matches are ranked by usage:
+resources per tag, and views per title.
+
+An index is immutable once published. Updates build a new one under a lock
+and swap it in, so the request threads read it without locking and never
+see a half-applied change. Building it is one pass over the key array that
+merges in the sorted new keys, however many entries change. Short prefixes
+match many keys, so their best entries are memoised; an update patches the
+memoised prefixes it touches instead of discarding them.
+
+The index is loaded on first use. It is kept current from model signals in
+the process that made the change: the ids a transaction touches are queued
+and reindexed together once it commits, one query and one update per kind
+rather than one per saved row. Every process also reloads it in the
+background once it is ``AUTOCOMPLETE_REFRESH_INTERVAL`` seconds old; that
+also picks up other processes' writes and view counts, which change
+without signals.
+"""
+
+import heapq
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Resource, ResourceTag, Tag
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+MAX_LIMIT = 20
+# Prefixes matching more keys than this have their best MAX_LIMIT ids
+# memoised, up to MEMO_SIZE prefixes per index
+MEMO_MIN_KEYS = 200
+MEMO_SIZE = 10000
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def _keys(label):
+    text = normalize(label)
+    return {text[match.start():] for match in WORD_RE.finditer(text)}
+
+
+def _upper_bound(prefix):
+    # The smallest string greater than every string starting with prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _prefixes(keys):
+    return {key[:length] for key in keys for length in range(1, len(key) + 1)}
+
+
+class PrefixIndex:
+    """Entries ``{id: (label, weight)}`` searchable by the prefix of any word."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (sorted keys, entries, memo), replaced as a whole on every update
+        self._state = ([], {}, {})
+
+    def __len__(self):
+        return len(self._state[1])
+
+    @staticmethod
+    def _rank(entries):
+        return lambda entry_id: (-entries[entry_id][1], entries[entry_id][0], entry_id)
+
+    def load(self, entries):
+        """Replace the contents with ``{id: (label, weight)}``."""
+        keys = sorted((key, entry_id) for entry_id, (label, _) in entries.items() for key in _keys(label))
+        with self._lock:
+            self._state = (keys, dict(entries), {})
+
+    def update(self, changed=(), removed=()):
+        """Add or replace ``changed`` (``{id: (label, weight)}``) and drop ``removed`` ids."""
+        changed = dict(changed)
+        with self._lock:
+            keys, old_entries, memo = self._state
+            entries = dict(old_entries)
+            for entry_id in removed:
+                entries.pop(entry_id, None)
+            entries.update(changed)
+
+            old_keys = {
+                entry_id: _keys(old_entries[entry_id][0])
+                for entry_id in set(removed) | set(changed) if entry_id in old_entries
+            }
+            new_keys = {entry_id: _keys(label) for entry_id, (label, _) in changed.items()}
+            stale = {(key, entry_id) for entry_id, names in old_keys.items() for key in names}
+            added = sorted((key, entry_id) for entry_id, names in new_keys.items() for key in names)
+            # One pass: an insort or del per key would move the array each time
+            kept = (item for item in keys if item not in stale) if stale else keys
+            keys = list(heapq.merge(kept, added))
+
+            # Patch the memoised prefixes the change touches rather than
+            # dropping them all; a hot prefix stays answered from memory
+            memo = dict(memo)
+            touched = _prefixes(set().union(*old_keys.values(), *new_keys.values())) & memo.keys()
+            for prefix in touched:
+                best = memo[prefix]
+                matching = {entry_id for entry_id, names in new_keys.items() if any(key.startswith(prefix) for key in names)}
+                demoted = any(
+                    entry_id in best and (
+                        entry_id not in matching or entries[entry_id][1] < old_entries[entry_id][1]
+                    )
+                    for entry_id in old_keys
+                )
+                if demoted:
+                    # Whatever comes next in line is not known here
+                    del memo[prefix]
+                else:
+                    memo[prefix] = sorted(set(best) | matching, key=self._rank(entries))[:MAX_LIMIT]
+            self._state = (keys, entries, memo)
+
+    def lookup(self, prefix, limit=10):
+        """``[(id, label, weight), ...]`` for entries with a word starting with ``prefix``, most used first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_LIMIT)
+        keys, entries, memo = self._state
+        best = memo.get(prefix)
+        if best is None:
+            start = bisect_left(keys, (prefix,))
+            end = bisect_left(keys, (_upper_bound(prefix),), start)
+            ids = {entry_id for _, entry_id in keys[start:end]}
+            if end - start > MEMO_MIN_KEYS and len(memo) < MEMO_SIZE:
+                best = memo[prefix] = heapq.nsmallest(MAX_LIMIT, ids, key=self._rank(entries))
+            else:
+                best = heapq.nsmallest(limit, ids, key=self._rank(entries))
+        return [(entry_id, *entries[entry_id]) for entry_id in best[:limit]]
+
+
+tags = PrefixIndex()
+titles = PrefixIndex()
+
+_load_lock = threading.Lock()
+_loaded_at = None
+_refreshing = False
+# Ids changed by this thread's transaction, see _queue()
+_pending = threading.local()
+
+
+def _tag_entries(tag_ids=None):
+    queryset = Tag.objects.all() if tag_ids is None else Tag.objects.filter(pk__in=tag_ids)
+    return {
+        tag_id: (name, uses)
+        for tag_id, name, uses in queryset.annotate(uses=Count('resource_tags')).values_list('id', 'name', 'uses')
+    }
+
+
+def _title_entries(resource_ids=None):
+    queryset = Resource.objects.filter(is_active=True)
+    if resource_ids is not None:
+        queryset = queryset.filter(pk__in=resource_ids)
+    return {resource_id: (title, views) for resource_id, title, views in queryset.values_list('id', 'title', 'views_count')}
+
+
+def load():
+    """(Re)load both indexes from the database."""
+    global _loaded_at
+    tags.load(_tag_entries())
+    titles.load(_title_entries())
+    _loaded_at = time.monotonic()
+
+
+def _refresh_in_background():
+    global _refreshing
+    try:
+        load()
+    except Exception:
+        logger.exception('Could not refresh the autocomplete index')
+    finally:
+        _refreshing = False
+        connection.close()
+
+
+def ensure_loaded():
+    """Load the indexes if this process has none yet; start a reload if they are stale."""
+    global _refreshing
+    if _loaded_at is None:
+        with _load_lock:
+            if _loaded_at is None:
+                load()
+        return
+    interval = getattr(settings, 'AUTOCOMPLETE_REFRESH_INTERVAL', 900)
+    if time.monotonic() - _loaded_at < interval:
+        return
+    with _load_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    threading.Thread(target=_refresh_in_background, daemon=True).start()
+
+
+def suggest(query, limit=10):
+    """``{'tags': [...], 'resources': [...]}`` matching the start of a word in ``query``."""
+    ensure_loaded()
+    limit = max(1, min(limit, MAX_LIMIT))
+    return {
+        'tags': [{'id': tag_id, 'name': name, 'resources': uses} for tag_id, name, uses in tags.lookup(query, limit)],
+        'resources': [{'id': resource_id, 'title': title} for resource_id, title, _ in titles.lookup(query, limit)],
+    }
+
+
+def index_tags(tag_ids):
+    """Reload the names and usage counts of ``tag_ids`` (one query)."""
+    if _loaded_at is None or not tag_ids:
+        return
+    tag_ids = set(tag_ids)
+    entries = _tag_entries(tag_ids)
+    tags.update(entries, tag_ids - set(entries))
+
+
+def index_titles(resource_ids):
+    """Reload the titles of ``resource_ids`` (one query)."""
+    if _loaded_at is None or not resource_ids:
+        return
+    resource_ids = set(resource_ids)
+    entries = _title_entries(resource_ids)
+    titles.update(entries, resource_ids - set(entries))
+
+
+def index_resources(resource_ids):
+    """Reload the titles of ``resource_ids`` and the counts of their tags."""
+    if _loaded_at is None or not resource_ids:
+        return
+    index_titles(resource_ids)
+    index_tags(ResourceTag.objects.filter(resource_id__in=resource_ids).values_list('tag_id', flat=True).distinct())
+
+
+def _queue(tag_ids=(), resource_ids=()):
+    """Reindex ``tag_ids`` and the titles of ``resource_ids`` once the current transaction commits."""
+    if not hasattr(_pending, 'tag_ids'):
+        _pending.tag_ids, _pending.resource_ids = set(), set()
+    _pending.tag_ids.update(tag_ids)
+    _pending.resource_ids.update(resource_ids)
+    # Every change registers the callback; the first to run after the commit
+    # takes the lot and the rest find nothing to do. Ids queued by a
+    # transaction that rolled back wait for the next commit, and reindexing
+    # them just reads back what the database holds.
+    transaction.on_commit(_apply_queued)
+
+
+def _apply_queued():
+    tag_ids, resource_ids = getattr(_pending, 'tag_ids', set()), getattr(_pending, 'resource_ids', set())
+    _pending.tag_ids, _pending.resource_ids = set(), set()
+    index_titles(resource_ids)
+    index_tags(tag_ids)
+
+
+# Keep a loaded index in step with the database once changes commit
+
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def index_changed_resource(sender, instance, raw=False, **kwargs):
+    if _loaded_at is not None and not raw:
+        _queue(resource_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=ResourceTag)
+@receiver(post_delete, sender=ResourceTag)
+def index_changed_tag(sender, instance, raw=False, **kwargs):
+    if _loaded_at is not None and not raw:
+        _queue(tag_ids=[instance.pk if sender is Tag else instance.tag_id])
+
+
+@receiver(m2m_changed, sender=Resource.tags.through)
+def index_retagged(sender, instance, action, reverse, pk_set, **kwargs):
+    if _loaded_at is None:
+        return
+    if not reverse and action == 'pre_clear':
+        instance._autocomplete_cleared_ids = list(instance.tags.values_list('id', flat=True))
+    elif not reverse and action == 'post_clear':
+        _queue(tag_ids=getattr(instance, '_autocomplete_cleared_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        # Forward: pk_set are tags; reverse: the tag itself changed
+        _queue(tag_ids=[instance.pk] if reverse else pk_set)
+    elif reverse and action == 'post_clear':
+        _queue(tag_ids=[instance.pk])
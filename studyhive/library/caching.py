@@ -0,0 +1,175 @@
+"""
+Read-through object cache.
+
+Rows that nearly every page needs but that rarely change are kept in the
+cache configured by ``CACHES`` (local memory, a shared directory or a Redis
+compatible server, see settings): resources by id with their uploader and
+subject, subjects (singly and as the full list), tags by id and profiles by
+user id. ``subjects.get(pk)`` returns a model instance like
+``Subject.objects.get(pk=pk)`` would, or raises ``DoesNotExist``; missing
+rows are cached too, so probing bad ids stays off the database.
+
+Entries are dropped once the change that makes them stale commits: from
+``post_save``/``post_delete`` on the models themselves, from ``m2m_changed``,
+the other tag signals and renamed subjects and uploaders by way of
+``timestamps.touch_resources``, and from
+the modules that change resources with ``QuerySet.update()`` (ratings,
+previews, media). View and download counts and trending scores are the
+exception: they change on every tracking flush, and dropping the busiest
+resources every few seconds would leave the most visited pages with the
+least use of the cache (and their concurrent requests waiting on the
+reload, see below). No page that reads cached resources shows them, so
+cached copies may carry counts up to ``OBJECT_CACHE_TIMEOUT`` old; listings
+and the API read them from the table. Rows are always loaded from the
+primary, so a lagging replica cannot put a stale copy back after an
+invalidation.
+
+``get_or_compute()`` keeps a popular key from sending every worker to the
+database at once. Entries stay in the cache ``STALE_GRACE`` seconds past
+their timeout; the first worker to see an expired entry takes a short lease
+and recomputes it while the others keep serving the old value. On a miss
+(a cold cache or an invalidated key) the lease holder computes and the
+others poll for its result, every ``WAIT_STEP`` seconds for up to
+``LEASE_WAIT``. For a primary-key lookup that is one or two steps, but the
+waiting ties up a worker thread, which is why keys are only invalidated by
+changes a page actually shows.
+
+With ``LocMemCache`` each process has its own copy and only sees its own
+invalidations, so run more than one process only with a shared cache.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import Http404
+
+from .models import Profile, Resource, Subject, Tag
+
+# Expired entries are served this much longer while one worker refreshes them
+STALE_GRACE = 60
+# How long a recompute may hold its lease, and how long others wait for it
+LEASE_TIMEOUT = 10
+LEASE_WAIT = 2.0
+WAIT_STEP = 0.02
+
+
+def default_timeout():
+    return getattr(settings, 'OBJECT_CACHE_TIMEOUT', 600)
+
+
+def get_or_compute(key, compute, timeout=None):
+    """The cached value of ``key``, computed with ``compute()`` by one worker at a time."""
+    timeout = default_timeout() if timeout is None else timeout
+    lease = f'{key}:lease'
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        # Past its timeout: refresh it unless another worker already is
+        if fresh_until > time.time() or not cache.add(lease, 1, LEASE_TIMEOUT):
+            return value
+        leased = True
+    else:
+        leased = cache.add(lease, 1, LEASE_TIMEOUT)
+        if not leased:
+            deadline = time.monotonic() + LEASE_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(WAIT_STEP)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry[0]
+            # The lease holder is slow or gone; don't wait any longer
+    try:
+        value = compute()
+        cache.set(key, (value, time.time() + timeout), timeout + STALE_GRACE)
+    finally:
+        if leased:
+            cache.delete(lease)
+    return value
+
+
+class ObjectCache:
+    """Instances of ``model`` cached one per ``field`` value, and optionally all together."""
+
+    def __init__(self, model, field='pk', select_related=()):
+        self.model = model
+        self.field = field
+        self.select_related = select_related
+        # Instances pickled before a schema change must not be read back
+        columns = ','.join(column.attname for column in model._meta.concrete_fields)
+        schema = hashlib.sha1(columns.encode()).hexdigest()[:8]
+        self.prefix = f'obj:{model._meta.label_lower}:{schema}'
+
+    def key(self, value):
+        return f'{self.prefix}:{self.field}:{value}'
+
+    def queryset(self):
+        return self.model._default_manager.using(DEFAULT_DB_ALIAS).select_related(*self.select_related)
+
+    def get(self, value):
+        """The instance whose ``field`` is ``value``; raises ``model.DoesNotExist``."""
+        instance = get_or_compute(
+            self.key(value), lambda: self.queryset().filter(**{self.field: value}).first(),
+        )
+        if instance is None:
+            raise self.model.DoesNotExist(f'No {self.model._meta.object_name} with {self.field}={value}')
+        return instance
+
+    def get_or_404(self, value):
+        try:
+            return self.get(value)
+        except self.model.DoesNotExist:
+            raise Http404(f'No {self.model._meta.object_name} matches the given query.')
+
+    def all(self):
+        """Every instance, in the model's default order. Only for small tables."""
+        return get_or_compute(f'{self.prefix}:all', lambda: list(self.queryset()))
+
+    def in_bulk(self):
+        return {instance.pk: instance for instance in self.all()}
+
+    def invalidate(self, values):
+        """Drop the entries for ``values`` (and the full list) once the transaction commits."""
+        keys = [self.key(value) for value in values]
+        keys.append(f'{self.prefix}:all')
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+resources = ObjectCache(Resource, select_related=('uploader', 'subject'))
+subjects = ObjectCache(Subject)
+tags = ObjectCache(Tag)
+profiles = ObjectCache(Profile, field='user_id')
+
+
+def invalidate_resources(resource_ids):
+    resource_ids = list(resource_ids)
+    if resource_ids:
+        resources.invalidate(resource_ids)
+
+
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def invalidate_resource(sender, instance, **kwargs):
+    resources.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_subject(sender, instance, **kwargs):
+    subjects.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag(sender, instance, **kwargs):
+    tags.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile(sender, instance, **kwargs):
+    profiles.invalidate([instance.user_id])
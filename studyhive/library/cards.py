@@ -0,0 +1,75 @@
+"""
+Cached resource cards.
+
+Every list page renders its resources as the same card markup
+(``library/resource_card.html``), in one of a few variants. Rendering a card
+runs the YouTube id regex, reverses the detail URL and builds the preview
+``srcset``, so finished cards are cached as HTML under
+``card:<variant>:<id>:<version>``, where the version is
+``Resource.card_version``. A list page fetches all of its cards with a single
+``get_many`` and renders only the misses (see ``render_cards()`` and the
+``resource_cards`` template tag).
+
+The version is bumped with a relative UPDATE whenever something a card shows
+changes: a saved resource, its tags or its uploader's username
+(``library.timestamps``) or new previews (``library.previews``). Old entries
+are never deleted, they just stop being asked for and expire.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Resource
+
+VARIANTS = ('grid', 'profile', 'search', 'list')
+# Bump when resource_card.html changes, so cached cards are not served stale
+TEMPLATE_VERSION = 2
+
+
+def _cache_key(variant, resource):
+    return f'card:{TEMPLATE_VERSION}:{variant}:{resource.pk}:{resource.card_version}'
+
+
+def _timeout():
+    timeout = getattr(settings, 'CARD_CACHE_TIMEOUT', 6 * 3600)
+    # Cards embed preview URLs, which object storage signs for a limited time
+    storage = Resource._meta.get_field('file').storage
+    if getattr(storage, 'querystring_auth', False):
+        timeout = min(timeout, storage.url_expiry // 2)
+    return timeout
+
+
+def bump_card_versions(resources):
+    """Invalidate the cards of ``resources`` (a queryset)."""
+    resources.update(card_version=F('card_version') + 1)
+
+
+def render_cards(resources, variant='grid'):
+    """The card HTML for each of ``resources``, in order."""
+    if variant not in VARIANTS:
+        raise ValueError(f'Unknown card variant "{variant}"')
+    resources = list(resources)
+    keys = [_cache_key(variant, resource) for resource in resources]
+    cached = cache.get_many(keys)
+    rendered = {}
+    for key, resource in zip(keys, resources):
+        if key not in cached and key not in rendered:
+            rendered[key] = render_to_string('library/resource_card.html', {'resource': resource, 'variant': variant})
+    if rendered:
+        cache.set_many(rendered, _timeout())
+    cached.update(rendered)
+    return [mark_safe(cached[key]) for key in keys]
+
+
+@receiver(post_save, sender=Resource)
+def bump_saved_resource(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        bump_card_versions(Resource.objects.filter(pk=instance.pk))
+        # So a card rendered from this instance is not cached under the old version
+        instance.card_version += 1
+
@@ -0,0 +1,181 @@
+"""
+Threaded comments stored as materialised paths.
+
+Every comment carries the path of ids from its thread's top-level comment
+down to itself (fixed-width base-36 segments, so sorting by ``path`` yields
+depth-first order with replies oldest first), its ``depth`` and the ``thread``
+it belongs to. The columns are filled in by a ``post_save`` receiver once the
+new row has an id, so a resource's whole comment tree, or a page of
+top-level threads with every reply beneath them, is a single indexed query
+that ``build_tree`` assembles in one pass.
+
+Replies to a comment already ``MAX_DEPTH`` deep are attached to its parent
+instead, so paths always fit the column. Re-parenting a comment moves its
+replies along; a move below one of its own replies, or one that would nest
+them past ``MAX_DEPTH``, is refused before the comment is saved.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DEFERRED, F, Max, Subquery, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.http import Http404
+
+from .models import Comment
+from .pagination import InvalidCursor, _build_page, decode_cursor
+
+SEGMENT_WIDTH = 8
+MAX_DEPTH = Comment._meta.get_field('path').max_length // SEGMENT_WIDTH - 1
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def path_segment(comment_id):
+    digits = []
+    while comment_id:
+        comment_id, digit = divmod(comment_id, 36)
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits)).rjust(SEGMENT_WIDTH, '0')
+
+
+def tree_position(comment_id, parent):
+    """
+    ``(parent, path, depth, thread_id)`` for a comment replying to ``parent``
+    (None for a top-level comment). ``parent`` moves up when it is too deep.
+    """
+    if parent is None:
+        return None, path_segment(comment_id), 0, comment_id
+    while parent.depth >= MAX_DEPTH:
+        parent = parent.parent_comment
+    return parent, parent.path + path_segment(comment_id), parent.depth + 1, parent.thread_id
+
+
+@receiver(post_init, sender=Comment)
+def remember_original_parent(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred column is not loaded row by row
+    instance._original_parent_id = instance.__dict__.get('parent_comment_id', DEFERRED)
+
+
+def _moved(instance):
+    return (
+        bool(instance.path) and instance._original_parent_id is not DEFERRED
+        and instance.parent_comment_id != instance._original_parent_id
+    )
+
+
+@receiver(pre_save, sender=Comment)
+def refuse_bad_move(sender, instance, raw=False, **kwargs):
+    # post_save runs after the new parent is written, too late to refuse
+    if not raw and _moved(instance):
+        _move_target(instance)
+
+
+@receiver(post_save, sender=Comment)
+def place_comment(sender, instance, created, **kwargs):
+    if created or not instance.path:
+        parent, path, depth, thread_id = tree_position(instance.pk, instance.parent_comment)
+        Comment.objects.filter(pk=instance.pk).update(
+            parent_comment=parent, path=path, depth=depth, thread_id=thread_id,
+        )
+        instance.parent_comment, instance.path, instance.depth, instance.thread_id = parent, path, depth, thread_id
+    elif _moved(instance):
+        move_subtree(instance)
+    instance._original_parent_id = instance.parent_comment_id
+
+
+def _move_target(comment):
+    """
+    The stored path, depth and thread of ``comment`` and where a move to its
+    current parent puts it. Raises ``ValueError`` if the move is not allowed.
+    """
+    old = Comment.objects.values('path', 'depth', 'thread_id').get(pk=comment.pk)
+    parent = comment.parent_comment
+    if parent is not None and parent.path.startswith(old['path']):
+        raise ValueError('A comment cannot be moved below one of its own replies.')
+    position = tree_position(comment.pk, parent)
+    deepest = Comment.objects.filter(
+        thread_id=old['thread_id'], path__startswith=old['path'],
+    ).aggregate(depth=Max('depth'))['depth']
+    if deepest - old['depth'] + position[2] > MAX_DEPTH:
+        raise ValueError('Moving this comment would nest its replies too deeply.')
+    return old, position
+
+
+def move_subtree(comment):
+    """Rewrite the paths of ``comment`` and its replies after a re-parent."""
+    old, (parent, path, depth, thread_id) = _move_target(comment)
+    subtree = Comment.objects.filter(thread_id=old['thread_id'], path__startswith=old['path'])
+    with transaction.atomic():
+        subtree.update(
+            path=Concat(Value(path), Substr('path', len(old['path']) + 1)),
+            depth=F('depth') + (depth - old['depth']),
+            thread_id=thread_id,
+        )
+        if parent != comment.parent_comment:
+            # Moved below a comment already MAX_DEPTH deep: attach to its parent
+            Comment.objects.filter(pk=comment.pk).update(parent_comment=parent)
+            comment.parent_comment = parent
+    comment.path, comment.depth, comment.thread_id = path, depth, thread_id
+
+
+def build_tree(comments):
+    """
+    Link ``comments``, ordered by ``path``, into trees: each comment gets a
+    ``children`` list. Returns the top-level comments, oldest first. Parents
+    sort before their replies, so one pass is enough.
+    """
+    nodes = {}
+    roots = []
+    for comment in comments:
+        comment.children = []
+        nodes[comment.pk] = comment
+        parent = nodes.get(comment.parent_comment_id)
+        if parent is None:
+            roots.append(comment)
+        else:
+            parent.children.append(comment)
+    return roots
+
+
+def _with_authors(queryset):
+    return queryset.select_related('user__profile').order_by('path')
+
+
+def comment_tree(resource):
+    """Every comment thread on ``resource``, newest thread first."""
+    roots = build_tree(_with_authors(Comment.objects.filter(resource=resource)))
+    roots.reverse()
+    return roots
+
+
+def thread_page(request, resource, param='comments_cursor'):
+    """
+    One page of ``resource``'s top-level threads, newest first, with all of
+    their replies. The threads on the page are picked by a subquery, so the
+    whole page is fetched in one query.
+    """
+    size = getattr(settings, 'COMMENT_THREADS_PER_PAGE', 20)
+    cursor = request.GET.get(param)
+    direction = 'next'
+    roots = Comment.objects.filter(resource=resource, depth=0)
+    if cursor:
+        try:
+            values, direction = decode_cursor(cursor)
+            root_id = int(values[0])
+        except (InvalidCursor, ValueError, TypeError, IndexError):
+            raise Http404('Invalid page cursor.')
+        if direction == 'next':
+            roots = roots.filter(id__lt=root_id)
+        else:
+            roots = roots.filter(id__gt=root_id)
+    roots = roots.order_by('-id' if direction == 'next' else 'id').values('id')[:size + 1]
+
+    threads = build_tree(_with_authors(Comment.objects.filter(thread_id__in=Subquery(roots))))
+    if direction == 'next':
+        threads.reverse()
+    has_more = len(threads) > size
+    threads = threads[:size]
+    if direction == 'prev':
+        threads.reverse()
+    return _build_page(threads, [[thread.pk] for thread in threads], direction, has_more, cursor, request, param)
@@ -0,0 +1,22 @@
+"""
+Template context shared by every page.
+"""
+
+from django.utils.functional import SimpleLazyObject
+
+from . import caching
+from .models import Profile
+
+
+def user_profile(request):
+    """``user_profile``: the signed-in user's Profile for the navbar, from the object cache."""
+    def load():
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        try:
+            return caching.profiles.get(user.pk)
+        except Profile.DoesNotExist:
+            return None
+
+    return {'user_profile': SimpleLazyObject(load)}
@@ -0,0 +1,143 @@
+"""
+File delivery for resource downloads.
+
+Files are either streamed by Django (with single-range ``Range`` support so
+interrupted downloads can resume) or handed off to the front-end web server
+with ``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache/lighttpd),
+depending on ``DOWNLOAD_SENDFILE_MODE``. On object storage that can sign
+URLs (``library.storage.S3Storage``) the client is redirected to the bucket
+instead, which serves ranges itself.
+"""
+
+import mimetypes
+import os
+import re
+import urllib.parse
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_etags
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(size, modified):
+    return '"%x-%x"' % (int(modified.timestamp() * 1000000), size)
+
+
+def parse_range(header, size):
+    """
+    Parse a ``Range`` header against a file of ``size`` bytes.
+
+    Returns ``(start, end)`` with ``end`` inclusive, ``None`` when the header
+    should be ignored (absent, malformed or multi-range), or ``False`` when
+    the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _iter_range(fieldfile, start, length):
+    fieldfile.open('rb')
+    try:
+        fieldfile.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fieldfile.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fieldfile.close()
+
+
+def serve_file(request, fieldfile):
+    """
+    Build the response for downloading ``fieldfile``.
+
+    Returns ``(response, counted)`` where ``counted`` tells the caller whether
+    this request is a new download (as opposed to a revalidation or the
+    continuation of a resumed transfer) and should be recorded.
+    """
+    storage = fieldfile.storage
+    name = fieldfile.name
+    if hasattr(storage, 'presigned_download_url'):
+        # The bytes never pass through Django; every hit here starts a download
+        response = HttpResponseRedirect(storage.presigned_download_url(name, filename=os.path.basename(name)))
+        response['Cache-Control'] = 'private, no-store'
+        return response, request.method == 'GET'
+    size = storage.size(name)
+    modified = storage.get_modified_time(name)
+    etag = file_etag(size, modified)
+    last_modified = modified.timestamp()
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response, False
+
+    byte_range = parse_range(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    if byte_range and if_range and etag not in parse_etags(if_range):
+        # The file changed since the client's partial copy: send it all
+        byte_range = None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response, False
+    # Only the request that fetches the start of the file is a new download
+    counted = request.method == 'GET' and (not byte_range or byte_range[0] == 0)
+
+    filename = os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    mode = getattr(settings, 'DOWNLOAD_SENDFILE_MODE', None)
+
+    if mode:
+        # The front-end server does the byte shovelling, including ranges
+        response = HttpResponse(content_type=content_type)
+        if mode == 'x-accel-redirect':
+            prefix = getattr(settings, 'DOWNLOAD_ACCEL_PREFIX', '/protected/')
+            # nginx decodes the URI, so names with spaces or '?' survive quoting
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + urllib.parse.quote(name)
+        elif mode == 'x-sendfile':
+            response['X-Sendfile'] = fieldfile.path
+        else:
+            raise ValueError(f'Unknown DOWNLOAD_SENDFILE_MODE {mode!r}')
+    elif byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _iter_range(fieldfile, start, length), status=206, content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    else:
+        # FileResponse uses wsgi.file_wrapper (sendfile) when the server has it
+        fieldfile.open('rb')
+        response = FileResponse(fieldfile, content_type=content_type)
+        response['Content-Length'] = str(size)
+
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response, counted
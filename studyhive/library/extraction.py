@@ -0,0 +1,185 @@
+"""
+Text extraction from uploaded documents, for search.
+
+When a resource is saved with a PDF/PPT/DOC/DOCX file, ``queue()`` hands it
+to a process pool once the transaction commits. A pool worker streams the
+text out page by page (see ``library.textextract``) and stops at
+``TEXT_EXTRACTION_MAX_CHARS``; the normalised text is stored in
+``ResourceText``, one row per resource in its own table, and the resource is
+re-indexed so ``library.search`` matches on it.
+
+Each tool run is bounded like preview rendering (``TEXT_EXTRACTION_CPU_LIMIT``,
+``TEXT_EXTRACTION_MEMORY_LIMIT``, ``TEXT_EXTRACTION_TIMEOUT``), and the pool
+workers themselves are capped at ``TEXT_EXTRACTION_MEMORY_LIMIT`` since ZIP
+based formats are parsed in-process.
+
+``ResourceText.source`` is the file the text came from, so a resource whose
+text matches its file is skipped, and failures are stored with an ``error``
+rather than retried on every save. ``manage.py extract_text`` processes
+whatever is missing or out of date; it stores each result as soon as it is
+ready, so an interrupted run resumes where it stopped.
+"""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import search
+from .models import Resource, ResourceText
+from .textextract import EXTRACTED_TYPES, extract_text
+from .tools import Limits, ToolError, limit_memory
+from .workers import WorkerPool, document_source
+
+logger = logging.getLogger(__name__)
+
+
+def _memory_limit():
+    return getattr(settings, 'TEXT_EXTRACTION_MEMORY_LIMIT', 1024 ** 3)
+
+
+pool = WorkerPool('TEXT_EXTRACTION', initializer=limit_memory, initargs=lambda: (_memory_limit(),))
+
+
+def max_chars():
+    return getattr(settings, 'TEXT_EXTRACTION_MAX_CHARS', 200_000)
+
+
+def _limits():
+    return Limits(
+        cpu_seconds=getattr(settings, 'TEXT_EXTRACTION_CPU_LIMIT', 60),
+        memory_bytes=_memory_limit(),
+        timeout=getattr(settings, 'TEXT_EXTRACTION_TIMEOUT', 120),
+    )
+
+
+def has_document(resource):
+    return bool(resource.file and resource.file_type in EXTRACTED_TYPES)
+
+
+def pending_resources(force=False, retry_failed=False):
+    """Resources whose text is missing or was extracted from another file."""
+    resources = Resource.objects.filter(file_type__in=EXTRACTED_TYPES).exclude(file='').exclude(file__isnull=True)
+    if not force:
+        done = Q(extracted_text__source=F('file'))
+        if retry_failed:
+            done &= Q(extracted_text__error='')
+        resources = resources.exclude(done)
+    return resources.only('id', 'file', 'file_type').order_by('id')
+
+
+def submit(executor, resource):
+    """Start extracting ``resource`` on ``executor``; returns the future."""
+    return executor.submit(extract_text, document_source(resource.file), resource.file_type, max_chars(), _limits())
+
+
+def queue(resources):
+    """Extract the text of ``resources`` in the background."""
+    if not pool.enabled:
+        return
+    resources = [resource for resource in resources if has_document(resource)]
+    if not resources:
+        return
+    extracted = dict(
+        ResourceText.objects.filter(resource_id__in=[resource.pk for resource in resources])
+        .values_list('resource_id', 'source')
+    )
+    executor = pool.get()
+    for resource in resources:
+        if extracted.get(resource.pk) == resource.file.name:
+            continue
+        try:
+            future = submit(executor, resource)
+        except Exception:
+            logger.exception('Could not queue text extraction for resource %d', resource.pk)
+            continue
+        future.add_done_callback(partial(_store_from_pool, resource.pk, resource.file.name))
+
+
+def _store_from_pool(resource_id, source_name, future):
+    # Runs on the pool's result thread, which has its own connection
+    try:
+        store(resource_id, source_name, future)
+    except Exception:
+        logger.exception('Could not store extracted text for resource %d', resource_id)
+    finally:
+        connection.close()
+
+
+def store(resource_id, source_name, future):
+    """
+    Save the text of a finished job and re-index the resource, unless its
+    file changed while the job ran. Returns the ``ResourceText`` or None.
+    """
+    text, pages, truncated, error = '', 0, False, ''
+    try:
+        text, pages, truncated = future.result()
+    except ToolError as exc:
+        logger.warning('No text for resource %d (%s): %s', resource_id, source_name, exc)
+        error = str(exc)[:255]
+
+    with transaction.atomic():
+        if not Resource.objects.filter(pk=resource_id, file=source_name).exists():
+            return None
+        extracted, _ = ResourceText.objects.update_or_create(
+            resource_id=resource_id,
+            defaults={'source': source_name, 'text': text, 'pages': pages, 'truncated': truncated, 'error': error},
+        )
+        search.index_resources([resource_id])
+    return extracted
+
+
+def extract_all(resources, workers=None, progress=None):
+    """
+    Extract the text of ``resources`` on a private pool, storing each result
+    as it arrives. At most a few jobs per worker are in flight, so memory
+    stays flat however large the corpus. ``progress(done, total)`` is called
+    as jobs finish. Returns ``(extracted, failed)`` counts.
+    """
+    resources = list(resources)
+    workers = workers or pool.workers
+    extracted = failed = 0
+    with pool.make(workers) as executor:
+        window = workers * 4
+        remaining = iter(resources)
+        running = {}
+        done = 0
+        while True:
+            for resource in remaining:
+                try:
+                    running[submit(executor, resource)] = resource
+                except Exception:
+                    logger.exception('Could not queue text extraction for resource %d', resource.pk)
+                    failed += 1
+                    done += 1
+                if len(running) >= window:
+                    break
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                resource = running.pop(future)
+                try:
+                    stored = store(resource.pk, resource.file.name, future)
+                except Exception:
+                    logger.exception('Could not store extracted text for resource %d', resource.pk)
+                    stored = None
+                if stored is not None and not stored.error:
+                    extracted += 1
+                else:
+                    failed += 1
+                done += 1
+                if progress:
+                    progress(done, len(resources))
+    return extracted, failed
+
+
+@receiver(post_save, sender=Resource)
+def queue_saved_resource(sender, instance, **kwargs):
+    if has_document(instance):
+        transaction.on_commit(lambda: queue([instance]))
@@ -0,0 +1,89 @@
+"""
+Facet counts for search results and listings.
+
+The search page filters on subject, resource type and file type, and shows
+how many results each choice would give. Rather than one COUNT per option,
+or the search run again per filter, every match is counted once by its
+combination of the three values (``search.facet_rows()`` for a text query,
+a grouped query on ``Resource`` otherwise). The resulting "cube" has one row
+per combination that occurs, a few hundred at most, and does not depend on
+the filters, so it is cached per query for ``FACET_CACHE_TIMEOUT`` seconds:
+drilling down or switching filters reads it from the cache and only the
+result page is queried again.
+
+Each facet is counted with the other facets' filters applied but not its
+own, so the alternatives to a selected value keep their counts. Counts can
+lag behind new uploads by up to the cache timeout.
+"""
+
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from . import search
+from .models import Resource
+
+# Same keys as the search filters, in the order of search.facet_rows() columns
+FACETS = tuple(search.FILTER_COLUMNS)
+
+
+def _cache_key(query):
+    terms = ' '.join(search.tokenize(query or ''))
+    return f'facets:{hashlib.sha1(terms.encode()).hexdigest()}'
+
+
+def _compute(query):
+    if search.tokenize(query or ''):
+        return [tuple(row) for row in search.facet_rows(query)]
+    return list(
+        Resource.objects.filter(is_active=True)
+        .values_list(*FACETS)
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+
+def facet_cube(query):
+    """``[(subject_id, resource_type, file_type, count), ...]`` for ``query`` (all active resources if empty)."""
+    key = _cache_key(query)
+    cube = cache.get(key)
+    if cube is None:
+        cube = _compute(query)
+        cache.set(key, cube, getattr(settings, 'FACET_CACHE_TIMEOUT', 60))
+    return cube
+
+
+def count_facets(cube, filters):
+    """
+    ``{facet: Counter({value: count})}`` for ``filters`` (``{facet: value}``,
+    empty values ignored). Values are compared as strings, as they come
+    from the query string.
+    """
+    selected = {facet: str(value) for facet, value in (filters or {}).items() if value not in (None, '')}
+    counts = {facet: Counter() for facet in FACETS}
+    for *values, count in cube:
+        values = dict(zip(FACETS, values))
+        for facet in FACETS:
+            if values[facet] is None:
+                continue
+            if all(str(values[other]) == value for other, value in selected.items() if other != facet):
+                counts[facet][values[facet]] += count
+    return counts
+
+
+def count_matches(cube, filters):
+    """How many resources in ``cube`` match every one of ``filters``."""
+    selected = {facet: str(value) for facet, value in (filters or {}).items() if value not in (None, '')}
+    return sum(
+        row[-1] for row in cube
+        if all(str(value) == selected[facet] for facet, value in zip(FACETS, row) if facet in selected)
+    )
+
+
+def get_facets(query, filters):
+    """``(count_facets(), count_matches())`` for ``query`` and ``filters``."""
+    cube = facet_cube(query)
+    return count_facets(cube, filters), count_matches(cube, filters)
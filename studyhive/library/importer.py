@@ -0,0 +1,337 @@
+"""
+Bulk import of resources from a ZIP archive or a directory.
+
+The source holds the files plus a manifest (``manifest.csv`` or
+``manifest.json``, or a manifest given separately) with one row per resource:
+
+    title, description, resource_type, file_type, file, video_url, subject, tags
+
+``file`` is a path inside the source; ``tags`` is comma-separated in a CSV
+and a string or list in JSON. ``resource_type`` and ``file_type`` are worked
+out from the file extension or video URL when left blank, and unknown
+subjects are created.
+
+Rows are validated first. The files of the valid rows are then copied into
+storage by a thread pool, every tag is resolved with one ``bulk_create`` and
+one fetch, and the ``Resource``/``ResourceTag`` rows are inserted in batches
+of ``IMPORT_BATCH_SIZE``, one transaction per batch. A row that fails never
+stops the import; it is reported with its manifest row number.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from . import autocomplete, caching, extraction, leaderboards, media, previews, search
+from .models import Resource, ResourceTag, Subject
+from .tags import parse_tag_names, resolve_tags
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAMES = ('manifest.csv', 'manifest.json')
+FILE_TYPES_BY_EXTENSION = {
+    '.pdf': 'PDF',
+    '.ppt': 'PPT',
+    '.pptx': 'PPT',
+    '.doc': 'DOC',
+    '.docx': 'DOCX',
+}
+RESOURCE_TYPES = {value for value, _ in Resource.RESOURCE_TYPE_CHOICES}
+FILE_TYPES = {value for value, _ in Resource.FILE_TYPE_CHOICES}
+
+
+class ImportSourceError(Exception):
+    """The source or manifest cannot be read at all."""
+
+
+class DirectorySource:
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+
+    def _path(self, name):
+        path = os.path.realpath(os.path.join(self.root, name))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValidationError(f'File "{name}" is outside the import directory.')
+        return path
+
+    def exists(self, name):
+        return os.path.isfile(self._path(name))
+
+    def open(self, name):
+        return open(self._path(name), 'rb')
+
+    def close(self):
+        pass
+
+
+class ZipSource:
+    # ZipFile.open() may be called from several threads at once; reads of
+    # the underlying file are serialised, decompression is not.
+
+    def __init__(self, file):
+        try:
+            self.archive = zipfile.ZipFile(file)
+        except zipfile.BadZipFile as exc:
+            raise ImportSourceError(f'Not a ZIP archive: {exc}')
+        self.names = {info.filename for info in self.archive.infolist() if not info.is_dir()}
+
+    def _name(self, name):
+        name = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+        if name.startswith('../'):
+            raise ValidationError(f'File "{name}" is outside the archive.')
+        return name
+
+    def exists(self, name):
+        return self._name(name) in self.names
+
+    def open(self, name):
+        return self.archive.open(self._name(name))
+
+    def close(self):
+        self.archive.close()
+
+
+def open_source(path_or_file):
+    """A ``DirectorySource`` for a directory, else a ``ZipSource``."""
+    if isinstance(path_or_file, str) and os.path.isdir(path_or_file):
+        return DirectorySource(path_or_file)
+    return ZipSource(path_or_file)
+
+
+def read_manifest(source, manifest=None):
+    """
+    Return the manifest rows as dicts. ``manifest`` is a path or an open
+    file; without it ``manifest.csv`` or ``manifest.json`` is read from the
+    source.
+    """
+    if manifest is None:
+        for name in MANIFEST_NAMES:
+            if source.exists(name):
+                with source.open(name) as fp:
+                    return parse_manifest(fp.read(), name)
+        raise ImportSourceError(f'No manifest given and none of {", ".join(MANIFEST_NAMES)} in the source.')
+    if isinstance(manifest, str):
+        with open(manifest, 'rb') as fp:
+            return parse_manifest(fp.read(), manifest)
+    return parse_manifest(manifest.read(), getattr(manifest, 'name', ''))
+
+
+def parse_manifest(data, name):
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    if name.lower().endswith('.json') or text.lstrip().startswith('['):
+        try:
+            rows = json.loads(text)
+        except ValueError as exc:
+            raise ImportSourceError(f'Invalid JSON manifest: {exc}')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ImportSourceError('A JSON manifest must be a list of objects.')
+        return rows
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+class ImportResult:
+
+    def __init__(self, total):
+        self.total = total
+        self.created = []
+        self.errors = []  # (manifest row number, message)
+
+    def fail(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def as_dict(self):
+        return {
+            'total': self.total,
+            'created': len(self.created),
+            'resource_ids': self.created,
+            'errors': [{'row': row, 'error': message} for row, message in sorted(self.errors)],
+        }
+
+
+class ImportRow:
+    """One validated manifest row, ready to be written."""
+
+    def __init__(self, number, values, tags):
+        self.number = number
+        self.values = values
+        self.tags = tags
+        self.stored_name = None
+
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def clean_row(number, row, source):
+    """Validate one manifest row; raises ValidationError."""
+    title = _text(row, 'title')
+    if not title:
+        raise ValidationError('Title is required.')
+    if len(title) > Resource._meta.get_field('title').max_length:
+        raise ValidationError('Title is too long.')
+    file_name = _text(row, 'file')
+    video_url = _text(row, 'video_url')
+    if bool(file_name) == bool(video_url):
+        raise ValidationError('Exactly one of file or video_url must be given.')
+
+    resource_type = _text(row, 'resource_type') or ('Document' if file_name else 'Video')
+    file_type = _text(row, 'file_type')
+    if file_name:
+        file_type = file_type or FILE_TYPES_BY_EXTENSION.get(os.path.splitext(file_name)[1].lower(), '')
+        if resource_type != 'Document':
+            raise ValidationError('Resource type must be "Document" when a file is provided.')
+        if not source.exists(file_name):
+            raise ValidationError(f'File "{file_name}" not found in the source.')
+    else:
+        file_type = file_type or 'YouTube'
+        if resource_type != 'Video':
+            raise ValidationError('Resource type must be "Video" when a video URL is provided.')
+        URLValidator()(video_url)
+    if resource_type not in RESOURCE_TYPES:
+        raise ValidationError(f'Unknown resource type "{resource_type}".')
+    if file_type not in FILE_TYPES:
+        raise ValidationError(f'Unknown or missing file type "{file_type}".')
+
+    subject = _text(row, 'subject')
+    if len(subject) > Subject._meta.get_field('name').max_length:
+        raise ValidationError('Subject name is too long.')
+
+    values = {
+        'title': title,
+        'description': _text(row, 'description'),
+        'resource_type': resource_type,
+        'file_type': file_type,
+        'file': file_name,
+        'video_url': video_url or None,
+        'subject': subject,
+    }
+    tags = row.get('tags') or []
+    # A JSON manifest may hold anything here
+    if not isinstance(tags, (str, list)) or not all(isinstance(name, str) for name in tags):
+        raise ValidationError('Tags must be a comma-separated string or a list of names.')
+    return ImportRow(number, values, parse_tag_names(tags))
+
+
+def _store_file(source, row):
+    field = Resource._meta.get_field('file')
+    name = field.generate_filename(None, posixpath.basename(row.values['file'].replace('\\', '/')))
+    with source.open(row.values['file']) as fp:
+        row.stored_name = field.storage.save(name, File(fp, name=name))
+    return row
+
+
+def _delete_files(rows):
+    storage = Resource._meta.get_field('file').storage
+    for row in rows:
+        if row.stored_name:
+            storage.delete(row.stored_name)
+
+
+def _resolve_subjects(names):
+    names = sorted({name for name in names if name})
+    Subject.objects.bulk_create([Subject(name=name) for name in names], ignore_conflicts=True)
+    subjects = dict(Subject.objects.filter(name__in=names).values_list('name', 'id'))
+    caching.subjects.invalidate(subjects.values())
+    return subjects
+
+
+def _insert_batch(rows, uploader, subjects, tags):
+    with transaction.atomic():
+        resources = Resource.objects.bulk_create([
+            Resource(
+                title=row.values['title'],
+                description=row.values['description'],
+                resource_type=row.values['resource_type'],
+                file_type=row.values['file_type'],
+                file=row.stored_name,
+                video_url=row.values['video_url'],
+                video_id=media.youtube_video_id(row.values['video_url']) or '',
+                subject_id=subjects.get(row.values['subject']),
+                uploader=uploader,
+            )
+            for row in rows
+        ])
+        ResourceTag.objects.bulk_create([
+            ResourceTag(resource=resource, tag=tags[name])
+            for resource, row in zip(resources, rows)
+            for name in row.tags
+        ])
+        # bulk_create sends no signals, so index the batch here
+        search.index_resources([resource.pk for resource in resources])
+        caching.invalidate_resources([resource.pk for resource in resources])
+        transaction.on_commit(lambda: previews.queue(resources))
+        transaction.on_commit(lambda: extraction.queue(resources))
+        transaction.on_commit(lambda: media.queue(resources))
+        transaction.on_commit(lambda: autocomplete.index_resources([resource.pk for resource in resources]))
+    return resources
+
+
+def import_resources(source, rows, uploader, progress=None):
+    """
+    Import manifest ``rows`` from ``source`` as resources uploaded by
+    ``uploader``. ``progress(done, total)`` is called after each batch.
+    Returns an ``ImportResult``.
+    """
+    batch_size = getattr(settings, 'IMPORT_BATCH_SIZE', 200)
+    workers = getattr(settings, 'IMPORT_WORKERS', 8)
+    result = ImportResult(len(rows))
+
+    valid = []
+    for number, row in enumerate(rows, 1):
+        try:
+            valid.append(clean_row(number, row, source))
+        except ValidationError as exc:
+            result.fail(number, ' '.join(exc.messages))
+
+    subjects = _resolve_subjects(row.values['subject'] for row in valid)
+    tags = resolve_tags(name for row in valid for name in row.tags)
+
+    done = len(rows) - len(valid)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            # Copy this batch's files in parallel before inserting its rows
+            futures = [
+                (row, pool.submit(_store_file, source, row)) for row in batch if row.values['file']
+            ]
+            failed = set()
+            for row, future in futures:
+                try:
+                    future.result()
+                except Exception as exc:
+                    logger.exception('Import of manifest row %d failed', row.number)
+                    result.fail(row.number, f'Could not store file: {exc}')
+                    failed.add(row.number)
+            batch = [row for row in batch if row.number not in failed]
+            done += len(failed)
+            if not batch:
+                continue
+            try:
+                resources = _insert_batch(batch, uploader, subjects, tags)
+            except Exception as exc:
+                logger.exception('Import batch starting at manifest row %d failed', batch[0].number)
+                _delete_files(batch)
+                for row in batch:
+                    result.fail(row.number, f'Database error: {exc}')
+            else:
+                result.created.extend(resource.pk for resource in resources)
+            done += len(batch)
+            if progress:
+                progress(done, len(rows))
+
+    if result.created:
+        transaction.on_commit(leaderboards.schedule_recent_refresh)
+    return result
@@ -0,0 +1,175 @@
+"""
+Materialised leaderboards.
+
+The top ``LEADERBOARD_SIZE`` active resources for each metric, overall and
+per subject, are stored in ``LeaderboardEntry`` and cached, so the home page
+and the popular/recent recommendation sources read a handful of ids and then
+fetch the resources by primary key, whatever the size of the catalogue.
+
+Boards are refreshed by ``manage.py refresh_leaderboards`` (run it from cron),
+automatically once enough counter activity has been flushed by
+``library.tracking`` or ``LEADERBOARD_REFRESH_INTERVAL`` has passed. New
+uploads put the "recent" board on a background refresh
+``LEADERBOARD_RECENT_DELAY`` seconds later, so a burst of uploads costs one
+refresh and the uploading request none.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import LeaderboardEntry, Resource
+
+logger = logging.getLogger(__name__)
+
+METRICS = {
+    # Decayed recent activity, see library/trending.py
+    'trending': ('-trending_score', '-id'),
+    'views': ('-views_count', '-id'),
+    'downloads': ('-downloads_count', '-id'),
+    'rating': ('-average_rating', '-id'),
+    'recent': ('-upload_date', '-id'),
+}
+
+_state_lock = threading.Lock()
+_pending_activity = 0
+_last_refresh = time.monotonic()
+_recent_timer = None
+
+
+def _size():
+    return getattr(settings, 'LEADERBOARD_SIZE', 10)
+
+
+def _cache_key(metric, subject_id):
+    return f'leaderboard:{metric}:{subject_id or "all"}'
+
+
+def _compute(metric):
+    """Current top ids for ``metric``: {subject_id or None: [resource ids]}."""
+    ordering = METRICS[metric]
+    size = _size()
+    active = Resource.objects.filter(is_active=True)
+    boards = {None: list(active.order_by(*ordering).values_list('id', flat=True)[:size])}
+    # One windowed query covers every subject
+    ranked = (
+        active.filter(subject__isnull=False)
+        .annotate(position=Window(RowNumber(), partition_by=[F('subject_id')], order_by=list(ordering)))
+        .filter(position__lte=size)
+        .order_by('subject_id', 'position')
+        .values_list('subject_id', 'id')
+    )
+    for subject_id, resource_id in ranked:
+        boards.setdefault(subject_id, []).append(resource_id)
+    return boards
+
+
+def refresh(metrics=None):
+    """Recompute and store the boards for ``metrics`` (default: all)."""
+    global _last_refresh
+    timeout = getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 300)
+    for metric in metrics or METRICS:
+        boards = _compute(metric)
+        with transaction.atomic():
+            LeaderboardEntry.objects.filter(metric=metric).delete()
+            LeaderboardEntry.objects.bulk_create([
+                LeaderboardEntry(metric=metric, subject_id=subject_id, rank=rank, resource_id=resource_id)
+                for subject_id, ids in boards.items()
+                for rank, resource_id in enumerate(ids, 1)
+            ])
+        cache.set_many({_cache_key(metric, subject_id): ids for subject_id, ids in boards.items()}, timeout)
+    with _state_lock:
+        _last_refresh = time.monotonic()
+
+
+def note_activity(count):
+    """
+    Called by the tracking buffer after a flush. Refreshes the boards once
+    enough counter deltas have accumulated or the refresh interval expired.
+    """
+    global _pending_activity
+    threshold = getattr(settings, 'LEADERBOARD_REFRESH_DELTA', 1000)
+    interval = getattr(settings, 'LEADERBOARD_REFRESH_INTERVAL', 600)
+    with _state_lock:
+        _pending_activity += count
+        due = _pending_activity >= threshold or time.monotonic() - _last_refresh >= interval
+        if due:
+            _pending_activity = 0
+    if due:
+        # "recent" too, for resources hidden or shown again by an edit
+        refresh()
+
+
+def _refresh_recent_from_timer():
+    global _recent_timer
+    with _state_lock:
+        _recent_timer = None
+    try:
+        refresh(['recent'])
+    except Exception:
+        logger.exception('Failed to refresh the recent leaderboard')
+    finally:
+        # Timer threads get their own connection; don't leak it
+        connection.close()
+
+
+def schedule_recent_refresh():
+    """Refresh the "recent" board in the background soon, unless a refresh is already pending."""
+    global _recent_timer
+    with _state_lock:
+        if _recent_timer is not None:
+            return
+        _recent_timer = threading.Timer(getattr(settings, 'LEADERBOARD_RECENT_DELAY', 5), _refresh_recent_from_timer)
+        _recent_timer.daemon = True
+        _recent_timer.start()
+
+
+def get_leaderboards(metrics, subject_id=None):
+    """
+    Return ``{metric: [Resource, ...]}``. With a warm cache this costs one
+    query: a primary-key fetch of every resource on the requested boards.
+    """
+    keys = {metric: _cache_key(metric, subject_id) for metric in metrics}
+    cached = cache.get_many(keys.values())
+    ids = {metric: cached.get(key) for metric, key in keys.items()}
+
+    missing = [metric for metric, value in ids.items() if value is None]
+    if missing:
+        rows = LeaderboardEntry.objects.filter(metric__in=missing, subject_id=subject_id).order_by('rank')
+        for metric in missing:
+            ids[metric] = []
+        for metric, resource_id in rows.values_list('metric', 'resource_id'):
+            ids[metric].append(resource_id)
+        for metric in missing:
+            if not ids[metric]:
+                # Never refreshed (or nothing to rank): fall back to the live
+                # query, which the indexes keep cheap
+                active = Resource.objects.filter(is_active=True)
+                if subject_id is not None:
+                    active = active.filter(subject_id=subject_id)
+                ids[metric] = list(active.order_by(*METRICS[metric]).values_list('id', flat=True)[:_size()])
+        timeout = getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 300)
+        cache.set_many({keys[metric]: ids[metric] for metric in missing}, timeout)
+
+    wanted = {resource_id for board in ids.values() for resource_id in board}
+    found = Resource.objects.filter(is_active=True).select_related('uploader').in_bulk(wanted)
+    return {
+        metric: [found[resource_id] for resource_id in board if resource_id in found]
+        for metric, board in ids.items()
+    }
+
+
+@receiver(post_save, sender=Resource)
+def refresh_recent_board(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # A new upload goes to the top of "recent". Plain edits leave it alone;
+    # get_leaderboards() already skips resources that were hidden.
+    if not raw and (created or (update_fields is not None and 'is_active' in update_fields)):
+        transaction.on_commit(schedule_recent_refresh)
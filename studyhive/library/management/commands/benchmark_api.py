@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from library.models import Resource, Subject
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the HTML pages against the equivalent /api/v1/ endpoints in-process. '
+        'Query counts are shown when QUERY_PROFILING is on.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint (default 50).')
+        parser.add_argument('--user', help='Username to log in as (default: anonymous).')
+        parser.add_argument('--host', default='localhost', help='Host header to send (default localhost).')
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST=options['host'])
+        if options['user']:
+            try:
+                client.force_login(User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f'No user named "{options["user"]}".')
+
+        resource = Resource.objects.filter(is_active=True).order_by('-id').first()
+        subject = Subject.objects.order_by('id').first()
+        if resource is None or subject is None:
+            raise CommandError('Nothing to fetch; run seed_studyhive first.')
+
+        cases = [
+            ('listing', '/search/', '/api/v1/resources/'),
+            ('subject listing', f'/subject/{subject.pk}/', f'/api/v1/resources/?subject={subject.pk}'),
+            ('resource detail', f'/resource/{resource.pk}/', f'/api/v1/resources/{resource.pk}/'),
+            ('sparse listing', None, '/api/v1/resources/?fields=id,title,average_rating'),
+        ]
+        self.stdout.write(f'{"endpoint":<40} {"req/s":>8} {"mean ms":>8} {"p95 ms":>8} {"queries":>8}')
+        for label, html_url, api_url in cases:
+            if html_url:
+                self.report(f'{label} (html)', self.run(client, html_url, options['requests']))
+            self.report(f'{label} (api)', self.run(client, api_url, options['requests']))
+            etag = client.get(api_url)['ETag']
+            self.report(
+                f'{label} (api, If-None-Match)',
+                self.run(client, api_url, options['requests'], HTTP_IF_NONE_MATCH=etag, expect=304),
+            )
+
+    def run(self, client, url, count, expect=200, **headers):
+        timings = []
+        queries = None
+        for _ in range(count):
+            start = time.perf_counter()
+            response = client.get(url, **headers)
+            timings.append(time.perf_counter() - start)
+            if response.status_code != expect:
+                raise CommandError(f'GET {url} returned {response.status_code}, expected {expect}.')
+            queries = response.get('X-Query-Count', queries)
+        return timings, queries
+
+    def report(self, label, result):
+        timings, queries = result
+        timings.sort()
+        mean = statistics.mean(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{label:<40} {1 / mean:>8.1f} {mean * 1000:>8.2f} {p95 * 1000:>8.2f} {queries or "-":>8}'
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from library.recommender import build_neighbors
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute item-to-item recommendation neighbours. By default only resources '
+        'with new interactions since the last run are updated.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every resource.')
+        parser.add_argument('--top-k', type=int, help='Neighbours kept per resource.')
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total} resources')
+
+        run = build_neighbors(full=options['full'], top_k=options['top_k'], progress=progress)
+        elapsed = (run.finished_at - run.started_at).total_seconds()
+        kind = 'Full' if run.full else 'Incremental'
+        self.stdout.write(self.style.SUCCESS(
+            f'{kind} build updated {run.items_updated} resources in {elapsed:.1f}s.'
+        ))
@@ -0,0 +1,53 @@
+import urllib.request
+import uuid
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Write, read, sign and delete a test file to check that the configured file storage works.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--create-bucket', action='store_true', help='Create the S3 bucket if it does not exist.')
+        parser.add_argument(
+            '--cors-origin', action='append', default=[],
+            help='Allow browser uploads from this origin (e.g. https://studyhive.example); may be repeated.',
+        )
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        self.stdout.write(f'Storage: {storage.__class__.__module__}.{storage.__class__.__name__}')
+        client = getattr(storage, 'client', None)
+        if options['create_bucket'] or options['cors_origin']:
+            if client is None:
+                raise CommandError('--create-bucket and --cors-origin need S3 storage.')
+            if options['create_bucket'] and not storage.exists_bucket():
+                client.create_bucket(Bucket=storage.bucket_name)
+                self.stdout.write(f'Created bucket {storage.bucket_name}.')
+            if options['cors_origin']:
+                client.put_bucket_cors(Bucket=storage.bucket_name, CORSConfiguration={'CORSRules': [{
+                    'AllowedOrigins': options['cors_origin'],
+                    'AllowedMethods': ['GET', 'POST'],
+                    'AllowedHeaders': ['*'],
+                    'MaxAgeSeconds': 3600,
+                }]})
+                self.stdout.write(f'Allowed uploads from {", ".join(options["cors_origin"])}.')
+
+        payload = uuid.uuid4().hex.encode()
+        name = storage.save(f'storage-check/{uuid.uuid4().hex}.txt', ContentFile(payload))
+        try:
+            with storage.open(name) as fp:
+                if fp.read() != payload:
+                    raise CommandError(f'Read back different contents from {name}.')
+            if hasattr(storage, 'presigned_download_url'):
+                with urllib.request.urlopen(storage.presigned_download_url(name), timeout=30) as response:
+                    if response.read() != payload:
+                        raise CommandError('The presigned download URL returned different contents.')
+                self.stdout.write('Presigned downloads work.')
+        finally:
+            storage.delete(name)
+        if storage.exists(name):
+            raise CommandError(f'{name} was not deleted.')
+        self.stdout.write(self.style.SUCCESS('Storage works.'))
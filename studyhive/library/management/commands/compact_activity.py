@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from library.rollups import compact, retention_days
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete raw view and download rows older than the retention window. Their counts live on '
+        'in the daily rollups; rows are deleted in small batches so the tables stay writable.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Keep rows this many days old (default: ACTIVITY_RETENTION_DAYS).')
+        parser.add_argument('--batch-size', type=int, help='Rows per delete (default: ACTIVITY_COMPACT_BATCH_SIZE).')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches.')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else retention_days()
+        self.stdout.write(f'Deleting view and download rows older than {days} days...')
+
+        def progress(model, deleted):
+            self.stdout.write(f'  {deleted} {model.__name__} rows')
+
+        deleted = compact(days, options['batch_size'], options['pause'], progress)
+        summary = ', '.join(f'{count} {name} rows' for name, count in deleted.items())
+        self.stdout.write(self.style.SUCCESS(f'Deleted {summary}.'))
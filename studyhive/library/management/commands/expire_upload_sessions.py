@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library.uploads import expire_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked upload sessions, and their part files, that have been idle for too long.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, help='Idle seconds before a session expires (default: UPLOAD_SESSION_TTL).')
+
+    def handle(self, *args, **options):
+        count = expire_sessions(options['ttl'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {count} upload sessions.'))
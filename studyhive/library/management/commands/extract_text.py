@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from library.extraction import extract_all, pending_resources
+
+
+class Command(BaseCommand):
+    help = (
+        'Extract the text of document resources for search. Only resources whose text is missing '
+        'or out of date are processed, so an interrupted run can simply be started again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource_ids', nargs='*', type=int, help='Only these resources (default: all).')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry resources whose extraction failed.')
+        parser.add_argument('--force', action='store_true', help='Re-extract every resource.')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: TEXT_EXTRACTION_WORKERS).')
+
+    def handle(self, *args, **options):
+        resources = pending_resources(force=options['force'], retry_failed=options['retry_failed'])
+        if options['resource_ids']:
+            resources = resources.filter(pk__in=options['resource_ids'])
+        resources = list(resources)
+        self.stdout.write(f'Extracting text from {len(resources)} resources...')
+
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total} resources')
+
+        extracted, failed = extract_all(resources, workers=options['workers'], progress=progress)
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f'Extracted text from {extracted} resources, {failed} failed.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from library.models import Resource
+from library.previews import generate, needs_previews
+from library.thumbnails import RENDERED_TYPES
+
+
+class Command(BaseCommand):
+    help = (
+        'Render first-page preview thumbnails for document resources. By default only resources '
+        'whose previews are missing or out of date are rendered.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource_ids', nargs='*', type=int, help='Only these resources (default: all).')
+        parser.add_argument('--force', action='store_true', help='Re-render resources that already have previews.')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: PREVIEW_WORKERS).')
+
+    def handle(self, *args, **options):
+        resources = Resource.objects.filter(file_type__in=RENDERED_TYPES).exclude(file='').exclude(file__isnull=True)
+        if options['resource_ids']:
+            resources = resources.filter(pk__in=options['resource_ids'])
+        resources = resources.only('id', 'file', 'file_type', 'preview_source')
+        pending = [resource for resource in resources.iterator() if options['force'] or needs_previews(resource)]
+        self.stdout.write(f'Rendering previews for {len(pending)} resources...')
+
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total} resources')
+
+        rendered = generate(pending, workers=options['workers'], progress=progress)
+        style = self.style.SUCCESS if rendered == len(pending) else self.style.WARNING
+        self.stdout.write(style(f'Rendered previews for {rendered} of {len(pending)} resources.'))
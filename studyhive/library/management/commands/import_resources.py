@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from library.importer import ImportSourceError, import_resources, open_source, read_manifest
+
+
+class Command(BaseCommand):
+    help = 'Import resources in bulk from a ZIP archive or directory with a CSV/JSON manifest.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='ZIP archive or directory holding the files.')
+        parser.add_argument(
+            '--manifest', help='CSV or JSON manifest (default: manifest.csv or manifest.json in the source).',
+        )
+        parser.add_argument('--uploader', required=True, help='Username the resources are uploaded as.')
+
+    def handle(self, *args, **options):
+        try:
+            uploader = User.objects.get(username=options['uploader'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user named "{options["uploader"]}".')
+
+        try:
+            source = open_source(options['source'])
+        except (ImportSourceError, OSError) as exc:
+            raise CommandError(str(exc))
+        try:
+            rows = read_manifest(source, options['manifest'])
+            self.stdout.write(f'Importing {len(rows)} rows...')
+            result = import_resources(source, rows, uploader, progress=self.progress)
+        except (ImportSourceError, OSError) as exc:
+            raise CommandError(str(exc))
+        finally:
+            source.close()
+
+        for row, message in sorted(result.errors):
+            self.stderr.write(f'  row {row}: {message}')
+        style = self.style.SUCCESS if not result.errors else self.style.WARNING
+        self.stdout.write(style(
+            f'Imported {len(result.created)} of {result.total} resources, {len(result.errors)} rows failed.'
+        ))
+
+    def progress(self, done, total):
+        self.stdout.write(f'  {done}/{total}')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from library.media import pending_resources, probe_all
+
+
+class Command(BaseCommand):
+    help = (
+        'Record the file size, MIME type and page count of resources with files. By default only '
+        'resources whose file has not been probed yet are processed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource_ids', nargs='*', type=int, help='Only these resources (default: all).')
+        parser.add_argument('--force', action='store_true', help='Probe resources again even if their file was probed.')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: TEXT_EXTRACTION_WORKERS).')
+
+    def handle(self, *args, **options):
+        resources = pending_resources(force=options['force'])
+        if options['resource_ids']:
+            resources = resources.filter(pk__in=options['resource_ids'])
+        resources = list(resources)
+        self.stdout.write(f'Probing {len(resources)} resources...')
+
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total} resources')
+
+        probed = probe_all(resources, workers=options['workers'], progress=progress)
+        style = self.style.SUCCESS if probed == len(resources) else self.style.WARNING
+        self.stdout.write(style(f'Probed {probed} of {len(resources)} resources.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from library.models import Resource
+from library.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all resources.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {Resource.objects.count()} resources.'))
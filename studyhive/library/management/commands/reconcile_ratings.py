@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from library.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating aggregates on every resource and repair drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = reconcile_ratings(dry_run=options['dry_run'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All rating aggregates are correct.'))
+            return
+        action = 'would be repaired' if options['dry_run'] else 'repaired'
+        self.stdout.write(f'{len(drifted)} resources {action}: {", ".join(map(str, drifted[:50]))}')
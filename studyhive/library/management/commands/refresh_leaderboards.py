@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from library.leaderboards import METRICS, refresh
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored top-N resource lists used by the home page and recommendations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('metrics', nargs='*', help=f'Boards to refresh: {", ".join(METRICS)} (default: all).')
+
+    def handle(self, *args, **options):
+        metrics = options['metrics'] or list(METRICS)
+        unknown = set(metrics) - set(METRICS)
+        if unknown:
+            raise CommandError(f'Unknown leaderboard: {", ".join(sorted(unknown))}')
+        refresh(metrics)
+        self.stdout.write(self.style.SUCCESS(f'Refreshed leaderboards: {", ".join(metrics)}.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from library import leaderboards
+from library.trending import rebuild, renormalize
+
+
+class Command(BaseCommand):
+    help = (
+        'Rescale the trending scores to the current time so they stay small (run it daily), '
+        'or recompute them from the recorded activity with --rebuild.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every score from rollups, ratings and bookmarks.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            scored = rebuild()
+            message = f'Rebuilt trending scores: {scored} resources have one.'
+        else:
+            factor = renormalize()
+            message = f'Renormalised trending scores by a factor of {factor:.4g}.'
+        leaderboards.refresh(['trending'])
+        self.stdout.write(self.style.SUCCESS(message))
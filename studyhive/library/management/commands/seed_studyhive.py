@@ -0,0 +1,336 @@
+"""
+Generate synthetic data for scale testing.
+
+Popularity follows Zipf-like distributions: a few users do most of the
+uploading and interacting, and a few resources, subjects and tags receive
+most of the attention. The same ``--seed`` always produces the same data.
+
+Rows are written with batched ``bulk_create`` while model signals are
+disconnected, and the derived data that signals would normally maintain
+(counters, rating aggregates, search index, activity rollups, trending scores,
+leaderboards) is rebuilt once at the end.
+"""
+
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import signals
+from django.utils import timezone
+
+from library import leaderboards, media, rollups, search, trending
+from library.comments import path_segment
+from library.models import (
+    Bookmark,
+    Comment,
+    Download,
+    Profile,
+    Rating,
+    Resource,
+    ResourceTag,
+    Subject,
+    Tag,
+    View,
+)
+from library.ratings import reconcile_ratings
+
+WORDS = (
+    'introduction advanced applied linear discrete numerical statistical quantum organic '
+    'digital modern classical computational theoretical practical fundamentals principles '
+    'algebra calculus geometry probability statistics mechanics thermodynamics optics '
+    'genetics ecology chemistry economics accounting marketing history philosophy '
+    'databases networks algorithms compilers graphics security systems circuits signals '
+    'notes slides lecture tutorial summary cheatsheet handbook exercises solutions exam'
+).split()
+
+SIGNALS = (
+    signals.pre_init, signals.post_init, signals.pre_save, signals.post_save,
+    signals.pre_delete, signals.post_delete, signals.m2m_changed,
+)
+
+
+@contextmanager
+def signals_disabled():
+    saved = [(signal, signal.receivers) for signal in SIGNALS]
+    for signal in SIGNALS:
+        signal.receivers = []
+        signal.sender_receivers_cache.clear()
+    try:
+        yield
+    finally:
+        for signal, receivers in saved:
+            signal.receivers = receivers
+            signal.sender_receivers_cache.clear()
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Let generated timestamps through ``auto_now_add`` fields."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def zipf_weights(n, exponent):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with deterministic synthetic data for scale testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiply every volume below.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--subjects', type=int, default=20)
+        parser.add_argument('--tags', type=int, default=300)
+        parser.add_argument('--resources', type=int, default=10000)
+        parser.add_argument('--tags-per-resource', type=int, default=3)
+        parser.add_argument('--ratings', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--bookmarks', type=int, default=10000)
+        parser.add_argument('--views', type=int, default=200000)
+        parser.add_argument('--downloads', type=int, default=50000)
+        parser.add_argument('--zipf', type=float, default=1.1, help='Skew exponent for popularity.')
+        parser.add_argument('--days', type=int, default=730, help='Spread uploads over this many days.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = np.random.default_rng(options['seed'])
+        self.samplers = {}
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.exponent = options['zipf']
+        self.now = timezone.now()
+        self.days = options['days']
+        scale = options['scale']
+        volume = {key: max(1, int(options[key] * scale)) for key in (
+            'users', 'subjects', 'tags', 'resources', 'ratings', 'comments', 'bookmarks', 'views', 'downloads',
+        )}
+        volume['tags_per_resource'] = options['tags_per_resource']
+
+        if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+            with connection.cursor() as cursor:
+                # Crash safety is not a concern while generating throwaway data
+                cursor.execute('PRAGMA synchronous = OFF')
+
+        started = time.monotonic()
+        date_fields = [
+            model._meta.get_field(name) for model, name in (
+                (Resource, 'upload_date'), (Rating, 'rating_date'), (Comment, 'comment_date'),
+                (Bookmark, 'bookmark_date'), (View, 'view_date'), (Download, 'download_date'),
+            )
+        ]
+        with signals_disabled(), explicit_dates(*date_fields):
+            self.seed_catalogue(volume)
+            self.seed_interactions(volume)
+        self.rebuild_derived_data()
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s.'))
+
+    # Helpers
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def pick(self, count, size):
+        """Sample ``size`` Zipf-skewed indexes in ``range(count)``."""
+        if count not in self.samplers:
+            # Shuffle which index is popular so that popularity is not tied
+            # to id order, and keep the same ranking for the whole run
+            cdf = np.cumsum(zipf_weights(count, self.exponent))
+            cdf[-1] = 1.0
+            self.samplers[count] = (self.rng.permutation(count), cdf)
+        order, cdf = self.samplers[count]
+        return order[np.searchsorted(cdf, self.rng.random(size), side='right')]
+
+    def insert(self, model, objs, **kwargs):
+        created = []
+        for start in range(0, len(objs), self.batch_size):
+            with transaction.atomic():
+                created.extend(model.objects.bulk_create(objs[start:start + self.batch_size], **kwargs))
+        return created
+
+    def insert_stream(self, model, total, build):
+        """bulk_create ``total`` rows produced batch by batch by ``build(size)``."""
+        done = 0
+        while done < total:
+            size = min(self.batch_size, total - done)
+            with transaction.atomic():
+                model.objects.bulk_create(build(size), ignore_conflicts=True)
+            done += size
+        self.log(f'  {model.__name__}: {total} rows generated')
+
+    def dates_after(self, upload_indexes):
+        """Random timestamps between each resource's upload and now."""
+        seconds_ago = self.upload_seconds[upload_indexes] * self.rng.random(len(upload_indexes))
+        return [self.now - timedelta(seconds=float(seconds)) for seconds in seconds_ago]
+
+    def title(self, words=4):
+        return ' '.join(WORDS[i] for i in self.rng.integers(0, len(WORDS), words)).capitalize()
+
+    # Generators
+
+    def seed_catalogue(self, volume):
+        prefix = f's{self.seed}'
+        password = make_password('studyhive')
+
+        users = self.insert(User, [
+            User(username=f'{prefix}_user{i}', email=f'{prefix}_user{i}@example.com', password=password)
+            for i in range(volume['users'])
+        ])
+        self.insert(Profile, [Profile(user=user, bio=self.title(8)) for user in users])
+        self.user_ids = np.array([user.pk for user in users])
+        self.log(f'  User/Profile: {len(users)} rows')
+
+        subjects = self.insert(Subject, [
+            Subject(name=f'{self.title(2)} {prefix}-{i}', description=self.title(12)) for i in range(volume['subjects'])
+        ])
+        tags = self.insert(Tag, [Tag(name=f'{WORDS[i % len(WORDS)]}-{prefix}-{i}') for i in range(volume['tags'])])
+        self.log(f'  Subject: {len(subjects)} rows, Tag: {len(tags)} rows')
+
+        count = volume['resources']
+        uploaders = self.user_ids[self.pick(len(users), count)]
+        subject_ids = [subjects[i].pk for i in self.pick(len(subjects), count)]
+        # Seconds between upload and now, skewed towards recent uploads
+        self.upload_seconds = (1 - self.rng.power(3, count)) * self.days * 86400
+        is_video = self.rng.random(count) < 0.3
+        file_types = np.array(['PDF', 'PPT', 'DOC', 'DOCX'])[self.pick(4, count)]
+        alphabet = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'))
+
+        resources = []
+        for i in range(count):
+            resource = Resource(
+                title=self.title(), description=self.title(20), uploader_id=uploaders[i], subject_id=subject_ids[i],
+                upload_date=self.now - timedelta(seconds=float(self.upload_seconds[i])),
+            )
+            if is_video[i]:
+                resource.resource_type, resource.file_type = 'Video', 'YouTube'
+                resource.video_url = 'https://www.youtube.com/watch?v=' + ''.join(self.rng.choice(alphabet, 11))
+                # Signals are off, so set what the media receiver would
+                resource.video_id = media.youtube_video_id(resource.video_url) or ''
+            else:
+                resource.resource_type, resource.file_type = 'Document', file_types[i]
+                resource.file = f'resources/seed/{prefix}-{i}.{file_types[i].lower()}'
+            resources.append(resource)
+        resources = self.insert(Resource, resources)
+        self.resource_ids = np.array([resource.pk for resource in resources])
+        self.log(f'  Resource: {len(resources)} rows')
+
+        per_resource = volume['tags_per_resource']
+        tag_ids = np.array([tag.pk for tag in tags])
+        picked = tag_ids[self.pick(len(tags), count * per_resource)].reshape(count, per_resource)
+        self.insert(ResourceTag, [
+            ResourceTag(resource_id=resource_id, tag_id=tag_id)
+            for resource_id, row in zip(self.resource_ids, picked)
+            for tag_id in set(row.tolist())
+        ], ignore_conflicts=True)
+        self.log(f'  ResourceTag: up to {count * per_resource} rows')
+
+    def seed_interactions(self, volume):
+        n_users, n_resources = len(self.user_ids), len(self.resource_ids)
+
+        def pairs(size):
+            users = self.user_ids[self.pick(n_users, size)]
+            resources = self.pick(n_resources, size)
+            return users, resources, self.dates_after(resources)
+
+        def build_ratings(size):
+            users, resources, dates = pairs(size)
+            # Ratings skew positive, as they do on most sites
+            scores = self.rng.choice(5, size, p=[0.05, 0.08, 0.17, 0.35, 0.35]) + 1
+            return [
+                Rating(user_id=u, resource_id=self.resource_ids[r], rating=int(s), rating_date=d)
+                for u, r, s, d in zip(users, resources, scores, dates)
+            ]
+
+        def build_bookmarks(size):
+            users, resources, dates = pairs(size)
+            return [
+                Bookmark(user_id=u, resource_id=self.resource_ids[r], bookmark_date=d)
+                for u, r, d in zip(users, resources, dates)
+            ]
+
+        self.view_counts = np.zeros(n_resources, dtype=np.int64)
+        self.download_counts = np.zeros(n_resources, dtype=np.int64)
+
+        def events(model, date_field, counts):
+            def build(size):
+                users, resources, dates = pairs(size)
+                np.add.at(counts, resources, 1)
+                return [
+                    model(user_id=u, resource_id=self.resource_ids[r], **{date_field: d})
+                    for u, r, d in zip(users, resources, dates)
+                ]
+            return build
+
+        self.insert_stream(Rating, volume['ratings'], build_ratings)
+        self.insert_stream(Bookmark, volume['bookmarks'], build_bookmarks)
+        self.insert_stream(View, volume['views'], events(View, 'view_date', self.view_counts))
+        self.insert_stream(Download, volume['downloads'], events(Download, 'download_date', self.download_counts))
+        self.seed_comments(volume['comments'])
+
+    def seed_comments(self, total):
+        """Top-level comments first, then waves of replies to earlier comments."""
+        n_users, n_resources = len(self.user_ids), len(self.resource_ids)
+        waves = [int(total * share) for share in (0.5, 0.3, 0.2)]
+        waves[0] += total - sum(waves)
+
+        parents = []  # (id, resource index, date, path, depth, thread id) of every comment so far
+        for wave, size in enumerate(waves):
+            if size == 0:
+                continue
+            users = self.user_ids[self.pick(n_users, size)]
+            if wave == 0:
+                resources = self.pick(n_resources, size)
+                dates = self.dates_after(resources)
+                replying_to = [None] * size
+            else:
+                replying_to = [parents[i] for i in self.pick(len(parents), size)]
+                resources = np.array([parent[1] for parent in replying_to])
+                delays = self.rng.integers(1, 10000, size)
+                dates = [min(parent[2] + timedelta(minutes=int(m)), self.now) for parent, m in zip(replying_to, delays)]
+            created = self.insert(Comment, [
+                Comment(
+                    user_id=u, resource_id=self.resource_ids[r], comment_text=self.title(15),
+                    comment_date=d, parent_comment_id=parent[0] if parent else None,
+                )
+                for u, r, d, parent in zip(users, resources, dates, replying_to)
+            ])
+            # Signals are off, so the materialised paths are filled in here
+            for comment, parent in zip(created, replying_to):
+                if parent is None:
+                    comment.path, comment.depth, comment.thread_id = path_segment(comment.pk), 0, comment.pk
+                else:
+                    comment.path, comment.depth, comment.thread_id = parent[3] + path_segment(comment.pk), parent[4] + 1, parent[5]
+            Comment.objects.bulk_update(created, ['path', 'depth', 'thread'], batch_size=1000)
+            parents.extend(
+                (comment.pk, r, comment.comment_date, comment.path, comment.depth, comment.thread_id)
+                for comment, r in zip(created, resources)
+            )
+        self.log(f'  Comment: {total} rows')
+
+    def rebuild_derived_data(self):
+        self.log('Rebuilding derived data...')
+        changed = [
+            Resource(pk=resource_id, views_count=int(views), downloads_count=int(downloads))
+            for resource_id, views, downloads in zip(self.resource_ids, self.view_counts, self.download_counts)
+            if views or downloads
+        ]
+        Resource.objects.bulk_update(changed, ['views_count', 'downloads_count'], batch_size=1000)
+        reconcile_ratings()
+        with transaction.atomic():
+            search.rebuild_index()
+        # The raw View/Download rows went in without the tracking buffer
+        rollups.rebuild()
+        trending.rebuild()
+        leaderboards.refresh()
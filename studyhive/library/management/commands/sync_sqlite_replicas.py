@@ -0,0 +1,46 @@
+import sqlite3
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+def database_path(settings_dict):
+    name = str(settings_dict['NAME'])
+    # Replicas are named by a read-only file: URI
+    return unquote(urlparse(name).path) if name.startswith('file:') else name
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite primary into the SQLite files of DATABASE_REPLICAS, for trying out replica '
+        'routing locally. Uses the online backup API, so the site can keep running; run it from cron '
+        'for replicas that trail the primary by a few minutes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1024, help='Pages copied per step; readers get a turn between steps.')
+
+    def handle(self, *args, **options):
+        databases = settings.DATABASES
+        aliases = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not aliases:
+            raise CommandError('No replicas are configured; set STUDYHIVE_DB_REPLICAS.')
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if databases[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f'Database "{alias}" is not SQLite; replicate it with the database\'s own tools.')
+
+        source = sqlite3.connect(database_path(databases[DEFAULT_DB_ALIAS]))
+        try:
+            for alias in aliases:
+                path = database_path(databases[alias])
+                self.stdout.write(f'Copying to {alias} ({path})...')
+                target = sqlite3.connect(path, timeout=databases[alias].get('OPTIONS', {}).get('timeout', 20))
+                try:
+                    source.backup(target, pages=options['pages'])
+                finally:
+                    target.close()
+        finally:
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f'Copied the primary to {len(aliases)} replicas.'))
@@ -0,0 +1,157 @@
+"""
+Derived media fields on ``Resource``.
+
+Cards and detail pages used to pull the YouTube id out of ``video_url`` with
+a regex on every render, and nothing knew a file's size, type or length
+without opening it. These are now columns, worked out once:
+
+- ``video_id`` is parsed from ``video_url`` whenever a resource is saved;
+  ``Resource.embed_url`` is built from it.
+- ``file_size``, ``mime_type`` and ``page_count`` are probed from the file
+  (see ``library.mediainfo``) after the transaction commits, on the text
+  extraction pool, since the probe needs the whole file and possibly a tool
+  run. ``media_source`` is the file they were probed from, so a resource is
+  only probed again when its file changes.
+
+The migration that added the columns filled them in for existing rows on
+local storage; ``manage.py probe_media`` covers anything else.
+"""
+
+import logging
+import re
+from concurrent.futures import as_completed
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching
+from .extraction import pool
+from .mediainfo import probe
+from .models import Resource
+from .tools import Limits, ToolError
+from .workers import document_source
+
+logger = logging.getLogger(__name__)
+
+YOUTUBE_RE = re.compile(
+    r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
+    r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
+)
+
+
+def youtube_video_id(url):
+    """The 11 character video id in a YouTube URL, or None."""
+    match = YOUTUBE_RE.match(url or '')
+    return match.group(6) if match else None
+
+
+def _limits():
+    return Limits(
+        cpu_seconds=getattr(settings, 'MEDIA_PROBE_CPU_LIMIT', 10),
+        memory_bytes=getattr(settings, 'TEXT_EXTRACTION_MEMORY_LIMIT', 1024 ** 3),
+        timeout=getattr(settings, 'MEDIA_PROBE_TIMEOUT', 30),
+    )
+
+
+def needs_probe(resource):
+    return bool(resource.file) and resource.media_source != resource.file.name
+
+
+def pending_resources(force=False):
+    resources = Resource.objects.exclude(file='').exclude(file__isnull=True)
+    if not force:
+        resources = resources.exclude(media_source=F('file'))
+    return resources.only('id', 'file', 'file_type', 'media_source').order_by('id')
+
+
+def submit(executor, resource):
+    return executor.submit(probe, document_source(resource.file), resource.file_type, _limits())
+
+
+def queue(resources):
+    """Probe the files of ``resources`` in the background."""
+    if not pool.enabled:
+        return
+    executor = pool.get()
+    for resource in resources:
+        if not needs_probe(resource):
+            continue
+        try:
+            future = submit(executor, resource)
+        except Exception:
+            logger.exception('Could not queue media probe for resource %d', resource.pk)
+            continue
+        future.add_done_callback(partial(_store_from_pool, resource.pk, resource.file.name))
+
+
+def _store_from_pool(resource_id, source_name, future):
+    # Runs on the pool's result thread, which has its own connection
+    try:
+        store(resource_id, source_name, future)
+    except Exception:
+        logger.exception('Could not store media fields for resource %d', resource_id)
+    finally:
+        connection.close()
+
+
+def store(resource_id, source_name, future):
+    """
+    Save the result of a finished probe, unless the resource's file changed
+    meanwhile. Returns True if the fields were stored.
+    """
+    try:
+        fields = future.result()
+    except ToolError as exc:
+        logger.warning('Could not probe resource %d (%s): %s', resource_id, source_name, exc)
+        return False
+    # The API shows these, so its ETag must change
+    updated = Resource.objects.filter(pk=resource_id, file=source_name).update(
+        media_source=source_name, updated_at=timezone.now(), **fields,
+    )
+    if updated:
+        caching.invalidate_resources([resource_id])
+    return updated > 0
+
+
+def probe_all(resources, workers=None, progress=None):
+    """
+    Probe ``resources`` on a private pool and wait for them.
+    ``progress(done, total)`` is called as jobs finish. Returns the number
+    of resources probed.
+    """
+    resources = list(resources)
+    probed = 0
+    with pool.make(workers) as executor:
+        futures = {}
+        for resource in resources:
+            try:
+                futures[submit(executor, resource)] = resource
+            except Exception:
+                logger.exception('Could not queue media probe for resource %d', resource.pk)
+        for done, future in enumerate(as_completed(futures), 1):
+            resource = futures[future]
+            try:
+                if store(resource.pk, resource.file.name, future):
+                    probed += 1
+            except Exception:
+                logger.exception('Could not store media fields for resource %d', resource.pk)
+            if progress:
+                progress(done, len(futures))
+    return probed
+
+
+@receiver(pre_save, sender=Resource)
+def set_video_id(sender, instance, **kwargs):
+    # A save(update_fields=...) that changes video_url must list video_id too
+    instance.video_id = youtube_video_id(instance.video_url) or ''
+
+
+@receiver(post_save, sender=Resource)
+def queue_saved_resource(sender, instance, raw=False, **kwargs):
+    if not raw and needs_probe(instance):
+        transaction.on_commit(lambda: queue([instance]))
@@ -0,0 +1,108 @@
+"""
+File size, MIME type and page count of uploaded documents.
+
+Like ``library.textextract``, this module runs inside the extraction process
+pool (see ``library.media``) and imports nothing from Django.
+
+The MIME type is sniffed from the file's first bytes rather than trusted
+from the upload: ``%PDF`` is a PDF, a ZIP holding ``word/`` or ``ppt/`` is
+DOCX or PPTX, and an OLE2 compound file is a legacy DOC or PPT. Page counts
+come from ``pdfinfo`` for PDFs and from the document properties
+(``docProps/app.xml``) that Word and PowerPoint store inside DOCX and PPTX
+files. Legacy DOC and PPT files would need a full LibreOffice conversion to
+count pages, so theirs is left unknown.
+"""
+
+import mimetypes
+import os
+import re
+import tempfile
+import zipfile
+from xml.etree.ElementTree import ParseError, parse
+
+from .tools import Limits, ToolError, check, fetch, streaming
+
+PDFINFO = 'pdfinfo'
+SNIFF_BYTES = 8
+
+PDF_MAGIC = b'%PDF'
+ZIP_MAGIC = b'PK\x03\x04'
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+PPTX_MIME = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+OLE_MIMES = {'DOC': 'application/msword', 'PPT': 'application/vnd.ms-powerpoint'}
+
+EXTENDED_PROPERTIES_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}'
+PDF_PAGES_RE = re.compile(r'^Pages:\s+(\d+)\s*$', re.M)
+
+
+def sniff_mime(path, file_type):
+    """The MIME type of the file at ``path``, from its contents."""
+    with open(path, 'rb') as fp:
+        head = fp.read(SNIFF_BYTES)
+    if head.startswith(PDF_MAGIC):
+        return 'application/pdf'
+    if head.startswith(ZIP_MAGIC):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                names = archive.namelist()
+        except zipfile.BadZipFile:
+            return 'application/zip'
+        if 'word/document.xml' in names:
+            return DOCX_MIME
+        if 'ppt/presentation.xml' in names:
+            return PPTX_MIME
+        return 'application/zip'
+    if head.startswith(OLE_MAGIC):
+        return OLE_MIMES.get(file_type, 'application/x-ole-storage')
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def count_pdf_pages(path, limits):
+    args = [PDFINFO, path]
+    with streaming(args, limits) as process:
+        output = process.stdout.read().decode('utf-8', 'replace')
+        check(process, args, limits)
+    match = PDF_PAGES_RE.search(output)
+    return int(match.group(1)) if match else None
+
+
+def count_office_pages(path):
+    # Word stores <Pages>, PowerPoint <Slides>; both as of the last save
+    try:
+        with zipfile.ZipFile(path) as archive, archive.open('docProps/app.xml') as fp:
+            root = parse(fp).getroot()
+    except (KeyError, zipfile.BadZipFile, ParseError):
+        return None
+    for tag in ('Pages', 'Slides'):
+        element = root.find(EXTENDED_PROPERTIES_NS + tag)
+        if element is not None and (element.text or '').strip().isdigit():
+            return int(element.text)
+    return None
+
+
+def probe(path, file_type, limits=None):
+    """
+    ``{'file_size', 'mime_type', 'page_count'}`` for the document at
+    ``path`` (a local path or a URL). ``page_count`` is None when it cannot
+    be worked out; raises ``ToolError`` if the file cannot be read at all.
+    """
+    limits = limits or Limits()
+    with tempfile.TemporaryDirectory(prefix='studyhive-probe-') as workdir:
+        path = fetch(path, workdir, limits)
+        try:
+            file_size = os.path.getsize(path)
+            mime_type = sniff_mime(path, file_type)
+        except OSError as exc:
+            raise ToolError(f'Could not read the document: {exc}')
+        page_count = None
+        try:
+            if mime_type == 'application/pdf':
+                page_count = count_pdf_pages(path, limits)
+            elif mime_type in (DOCX_MIME, PPTX_MIME):
+                page_count = count_office_pages(path)
+        except ToolError:
+            # The size and type are still worth keeping
+            pass
+    return {'file_size': file_size, 'mime_type': mime_type, 'page_count': page_count}
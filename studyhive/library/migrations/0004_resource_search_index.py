@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE library_resource_fts USING fts5("
+    "title, description, tags, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO library_resource_fts (rowid, title, description, tags) "
+    "SELECT r.id, r.title, COALESCE(r.description, ''), "
+    "COALESCE((SELECT group_concat(t.name, ' ') FROM library_resourcetag rt "
+    "JOIN library_tag t ON t.id = rt.tag_id WHERE rt.resource_id = r.id), '') "
+    "FROM library_resource r",
+]
+SQLITE_DROP = ["DROP TABLE IF EXISTS library_resource_fts"]
+
+POSTGRES_CREATE = [
+    "CREATE TABLE library_resource_search ("
+    "resource_id bigint PRIMARY KEY REFERENCES library_resource (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX library_resource_search_document ON library_resource_search USING GIN (document)",
+    "INSERT INTO library_resource_search (resource_id, document) "
+    "SELECT r.id, "
+    "setweight(to_tsvector('simple', r.title), 'A') || "
+    "setweight(to_tsvector('simple', COALESCE(string_agg(t.name, ' '), '')), 'B') || "
+    "setweight(to_tsvector('simple', COALESCE(r.description, '')), 'C') "
+    "FROM library_resource r "
+    "LEFT JOIN library_resourcetag rt ON rt.resource_id = r.id "
+    "LEFT JOIN library_tag t ON t.id = rt.tag_id GROUP BY r.id",
+]
+POSTGRES_DROP = ["DROP TABLE IF EXISTS library_resource_search"]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_remove_resource_resource_file_or_video_url'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE}),
+            run_for_vendor({'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}),
+        ),
+    ]
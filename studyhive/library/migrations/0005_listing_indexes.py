@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-16 20:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_resource_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', 'bookmark_date', 'id'], name='bookmark_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='download',
+            index=models.Index(fields=['user', 'download_date', 'id'], name='download_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_active', 'upload_date', 'id'], name='resource_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_active', 'views_count', 'id'], name='resource_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['subject', 'is_active', 'upload_date', 'id'], name='resource_subject_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['uploader', 'upload_date', 'id'], name='resource_uploader_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='view',
+            index=models.Index(fields=['user', 'view_date', 'id'], name='view_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-16 20:46
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Rating = apps.get_model('library', 'Rating')
+    Resource = apps.get_model('library', 'Resource')
+    totals = Rating.objects.values('resource').annotate(total=Count('id'), score=Sum('rating'))
+    for row in totals:
+        Resource.objects.filter(pk=row['resource']).update(
+            total_ratings=row['total'],
+            rating_sum=row['score'],
+            average_rating=row['score'] / row['total'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_listing_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_active', 'average_rating', 'id'], name='resource_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
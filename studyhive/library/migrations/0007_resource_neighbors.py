@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-16 20:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_resource_rating_sum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommenderRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('full', models.BooleanField(default=False)),
+                ('items_updated', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResourceNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.resource')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='library.resource')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resource', '-score'], name='neighbor_resource_score_idx')],
+                'unique_together': {('resource', 'neighbor')},
+            },
+        ),
+    ]
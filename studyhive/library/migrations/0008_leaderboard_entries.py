@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-16 20:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_resource_neighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=20)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.resource')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['metric', 'subject', 'rank'], name='leaderboard_lookup_idx')],
+            },
+        ),
+    ]
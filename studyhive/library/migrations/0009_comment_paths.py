@@ -0,0 +1,89 @@
+# Generated by Django 5.1.1 on 2026-10-16 20:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+SEGMENT_WIDTH = 8
+MAX_DEPTH = 255 // SEGMENT_WIDTH - 1
+
+
+def path_segment(comment_id):
+    digits = []
+    while comment_id:
+        comment_id, digit = divmod(comment_id, 36)
+        digits.append('0123456789abcdefghijklmnopqrstuvwxyz'[digit])
+    return ''.join(reversed(digits)).rjust(SEGMENT_WIDTH, '0')
+
+
+def backfill_comment_paths(apps, schema_editor):
+    # Same layout as library.comments.tree_position
+    Comment = apps.get_model('library', 'Comment')
+    parents = dict(Comment.objects.values_list('id', 'parent_comment_id'))
+    placed = {}  # id -> (parent_id, path, depth, thread_id)
+
+    def place(comment_id):
+        chain = []
+        while comment_id is not None and comment_id not in placed:
+            chain.append(comment_id)
+            comment_id = parents.get(comment_id)
+        for comment_id in reversed(chain):
+            parent_id = parents.get(comment_id)
+            if parent_id is None or parent_id not in placed:
+                placed[comment_id] = (None, path_segment(comment_id), 0, comment_id)
+                continue
+            while placed[parent_id][2] >= MAX_DEPTH:
+                parent_id = placed[parent_id][0]
+            _, path, depth, thread_id = placed[parent_id]
+            placed[comment_id] = (parent_id, path + path_segment(comment_id), depth + 1, thread_id)
+
+    for comment_id in parents:
+        place(comment_id)
+    batch = []
+    for comment_id, (parent_id, path, depth, thread_id) in placed.items():
+        batch.append(Comment(
+            pk=comment_id, parent_comment_id=parent_id, path=path, depth=depth, thread_id=thread_id,
+        ))
+        if len(batch) >= 1000:
+            Comment.objects.bulk_update(batch, ['parent_comment', 'path', 'depth', 'thread'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['parent_comment', 'path', 'depth', 'thread'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_leaderboard_entries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='thread',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['resource', 'path'], name='comment_resource_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['resource', 'depth', 'id'], name='comment_resource_roots_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['thread', 'path'], name='comment_thread_path_idx'),
+        ),
+        migrations.RunPython(backfill_comment_paths, migrations.RunPython.noop),
+    ]
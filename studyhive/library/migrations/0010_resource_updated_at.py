@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-16 21:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_from_upload_date(apps, schema_editor):
+    Resource = apps.get_model('library', 'Resource')
+    Resource.objects.update(updated_at=F('upload_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_comment_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(start_from_upload_date, migrations.RunPython.noop),
+    ]
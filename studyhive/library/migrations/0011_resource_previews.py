@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_resource_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='preview_source',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='previews',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The FTS5 table gets a fourth column, body, for the extracted text. FTS5
+# columns cannot be altered, so the table is rebuilt; bodies stay empty
+# until text is extracted.
+SQLITE_TAGS = (
+    "COALESCE((SELECT group_concat(t.name, ' ') FROM library_resourcetag rt "
+    "JOIN library_tag t ON t.id = rt.tag_id WHERE rt.resource_id = r.id), '')"
+)
+SQLITE_FORWARD = [
+    "DROP TABLE IF EXISTS library_resource_fts",
+    "CREATE VIRTUAL TABLE library_resource_fts USING fts5("
+    "title, description, tags, body, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO library_resource_fts (rowid, title, description, tags, body) "
+    f"SELECT r.id, r.title, COALESCE(r.description, ''), {SQLITE_TAGS}, '' FROM library_resource r",
+]
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS library_resource_fts",
+    "CREATE VIRTUAL TABLE library_resource_fts USING fts5("
+    "title, description, tags, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO library_resource_fts (rowid, title, description, tags) "
+    f"SELECT r.id, r.title, COALESCE(r.description, ''), {SQLITE_TAGS} FROM library_resource r",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_resource_previews'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceText',
+            fields=[
+                ('resource', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='extracted_text', serialize=False, to='library.resource')),
+                ('source', models.CharField(max_length=255)),
+                ('text', models.TextField(blank=True)),
+                ('pages', models.PositiveIntegerField(default=0)),
+                ('truncated', models.BooleanField(default=False)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        # PostgreSQL builds its tsvector in library.search, no schema change
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
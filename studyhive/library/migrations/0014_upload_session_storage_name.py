@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='storage_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_upload_session_storage_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='card_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
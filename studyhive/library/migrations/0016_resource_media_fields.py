@@ -0,0 +1,64 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:35
+
+import re
+
+from django.db import migrations, models
+
+# Video ids are backfilled from the existing URLs here. Size, MIME type and
+# page count need the files themselves, which `manage.py probe_media` reads
+# after the migration; the regex is copied so the migration doesn't depend
+# on the app code.
+YOUTUBE_RE = re.compile(
+    r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
+    r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
+)
+BATCH_SIZE = 500
+
+
+def backfill(apps, schema_editor):
+    Resource = apps.get_model('library', 'Resource')
+    batch = []
+    for resource in Resource.objects.exclude(video_url='').only('id', 'video_url').iterator(chunk_size=BATCH_SIZE):
+        match = YOUTUBE_RE.match(resource.video_url or '')
+        resource.video_id = match.group(6) if match else ''
+        batch.append(resource)
+        if len(batch) >= BATCH_SIZE:
+            Resource.objects.bulk_update(batch, ['video_id'])
+            batch = []
+    Resource.objects.bulk_update(batch, ['video_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_resource_card_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='media_source',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='mime_type',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='video_id',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=11),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,115 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+# Rolls up the existing View/Download rows. Only what they recorded can be
+# recovered: downloads by logged-in users and each user's first view of a
+# resource; anonymous hits before this migration stay in the counters only.
+BATCH_SIZE = 2000
+
+
+def backfill(apps, schema_editor):
+    ResourceActivityDay = apps.get_model('library', 'ResourceActivityDay')
+    UserActivityDay = apps.get_model('library', 'UserActivityDay')
+    by_resource, by_user = {}, {}
+    for model_name, date_field, column in (('View', 'view_date', 'views'), ('Download', 'download_date', 'downloads')):
+        rows = (
+            apps.get_model('library', model_name).objects
+            .annotate(day=TruncDate(date_field)).values('user_id', 'resource_id', 'day')
+            .annotate(hits=Count('id')).order_by()
+        )
+        for row in rows.iterator():
+            totals = by_user.setdefault((row['user_id'], row['resource_id'], row['day']), {'views': 0, 'downloads': 0})
+            totals[column] += row['hits']
+            totals = by_resource.setdefault((row['resource_id'], row['day']), {'views': 0, 'downloads': 0})
+            totals[column] += row['hits']
+    ResourceActivityDay.objects.bulk_create(
+        [ResourceActivityDay(resource_id=resource_id, day=day, **totals) for (resource_id, day), totals in by_resource.items()],
+        batch_size=BATCH_SIZE,
+    )
+    UserActivityDay.objects.bulk_create(
+        [UserActivityDay(user_id=user_id, resource_id=resource_id, day=day, **totals) for (user_id, resource_id, day), totals in by_user.items()],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def clear(apps, schema_editor):
+    apps.get_model('library', 'ResourceActivityDay').objects.all().delete()
+    apps.get_model('library', 'UserActivityDay').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0016_resource_media_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceActivityDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('downloads', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserActivityDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('downloads', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='download',
+            index=models.Index(fields=['download_date'], name='download_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='view',
+            index=models.Index(fields=['view_date'], name='view_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='resourceactivityday',
+            name='resource',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_days', to='library.resource'),
+        ),
+        migrations.AddField(
+            model_name='useractivityday',
+            name='resource',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_activity_days', to='library.resource'),
+        ),
+        migrations.AddField(
+            model_name='useractivityday',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_days', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='resourceactivityday',
+            index=models.Index(fields=['day'], name='resource_activity_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='resourceactivityday',
+            constraint=models.UniqueConstraint(fields=('resource', 'day'), name='resource_activity_day_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivityday',
+            index=models.Index(fields=['user', 'day', 'id'], name='user_activity_user_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivityday',
+            index=models.Index(fields=['day'], name='user_activity_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='useractivityday',
+            constraint=models.UniqueConstraint(fields=('user', 'resource', 'day'), name='user_activity_day_unique'),
+        ),
+        migrations.RunPython(backfill, clear),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0017_activity_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='trending_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_active', 'trending_score', 'id'], name='resource_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['subject', 'is_active', 'trending_score', 'id'], name='resource_subject_trending_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:20
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+# Existing rows would otherwise all look changed at migrate time, and the next
+# incremental recommender run would redo every rated resource.
+def backfill(apps, schema_editor):
+    Rating = apps.get_model('library', 'Rating')
+    Rating.objects.update(updated_at=F('rating_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0018_trending_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rating',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -58,19 +60,56 @@ class Resource(models.Model):
     file = models.FileField(upload_to='resources/', blank=True, null=True)
     video_url = models.URLField(blank=True, null=True)
     upload_date = models.DateTimeField(auto_now_add=True)
+    # Also bumped by counter, rating and tag updates, see library/timestamps.py
+    updated_at = models.DateTimeField(auto_now=True)
     uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploaded_resources')
     subject = models.ForeignKey(Subject, on_delete=models.SET_NULL, null=True, blank=True, related_name='resources')
     views_count = models.IntegerField(default=0)
     downloads_count = models.IntegerField(default=0)
+    # Maintained from Rating signals, see library/ratings.py
     average_rating = models.FloatField(default=0.0)
     total_ratings = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
     bookmarks = models.ManyToManyField(User, through='Bookmark', related_name='bookmarked_resources')
     is_active = models.BooleanField(default=True)
     tags = models.ManyToManyField(Tag, through='ResourceTag', related_name='resources')
+    # First-page thumbnails by width and the file they were rendered from, see library/previews.py
+    previews = models.JSONField(default=dict, blank=True, editable=False)
+    preview_source = models.CharField(max_length=255, blank=True, default='', editable=False)
+    # Derived from video_url and the file, see library/media.py
+    video_id = models.CharField(max_length=11, blank=True, default='', db_index=True, editable=False)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True, db_index=True, editable=False)
+    mime_type = models.CharField(max_length=100, blank=True, default='', db_index=True, editable=False)
+    page_count = models.PositiveIntegerField(null=True, blank=True, db_index=True, editable=False)
+    media_source = models.CharField(max_length=255, blank=True, default='', editable=False)
+    # Bumped when anything shown on the resource's card changes, see library/cards.py
+    card_version = models.PositiveIntegerField(default=0, editable=False)
+    # Decayed activity score relative to TrendingState.epoch, see library/trending.py
+    trending_score = models.FloatField(default=0.0, editable=False)
 
     def __str__(self):
         return self.title
 
+    def preview_urls(self):
+        """``[(width, url), ...]`` of the stored previews, smallest first."""
+        storage = self._meta.get_field('file').storage
+        return [(int(width), storage.url(name)) for width, name in sorted(self.previews.items(), key=lambda item: int(item[0]))]
+
+    @property
+    def preview_url(self):
+        urls = self.preview_urls()
+        return urls[len(urls) // 2][1] if urls else None
+
+    @property
+    def preview_srcset(self):
+        return ', '.join(f'{url} {width}w' for width, url in self.preview_urls())
+
+    @property
+    def embed_url(self):
+        if not self.video_id:
+            return self.video_url
+        return f'https://www.youtube.com/embed/{self.video_id}'
+
     def clean(self):
         # Ensure that either file or video_url is provided, but not both
         if not self.file and not self.video_url:
@@ -84,7 +123,30 @@ class Resource(models.Model):
             raise ValidationError('Resource type must be "Video" when a video URL is provided.')
 
     class Meta:
-        pass
+        # Keyset pagination sorts, see library/pagination.py
+        indexes = [
+            models.Index(fields=['is_active', 'upload_date', 'id'], name='resource_recent_idx'),
+            models.Index(fields=['is_active', 'views_count', 'id'], name='resource_popular_idx'),
+            models.Index(fields=['is_active', 'average_rating', 'id'], name='resource_rating_idx'),
+            models.Index(fields=['is_active', 'trending_score', 'id'], name='resource_trending_idx'),
+            models.Index(fields=['subject', 'is_active', 'upload_date', 'id'], name='resource_subject_recent_idx'),
+            models.Index(fields=['subject', 'is_active', 'trending_score', 'id'], name='resource_subject_trending_idx'),
+            models.Index(fields=['uploader', 'upload_date', 'id'], name='resource_uploader_recent_idx'),
+        ]
+
+# Text extracted from a resource's file, kept out of Resource so its rows stay narrow, see library/extraction.py
+class ResourceText(models.Model):
+    resource = models.OneToOneField(Resource, on_delete=models.CASCADE, primary_key=True, related_name='extracted_text')
+    # File the text was extracted from; a mismatch means it is out of date
+    source = models.CharField(max_length=255)
+    text = models.TextField(blank=True)
+    pages = models.PositiveIntegerField(default=0)
+    truncated = models.BooleanField(default=False)
+    error = models.CharField(max_length=255, blank=True)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Text of {self.resource_id} ({len(self.text)} chars)'
 
 # Through model for Resource-Tag many-to-many relationship
 class ResourceTag(models.Model):
@@ -103,6 +165,8 @@ class Rating(models.Model):
     resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='ratings')
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     rating_date = models.DateTimeField(auto_now_add=True)
+    # Changes when the score does; incremental recommender runs look for it
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('user', 'resource')
@@ -117,6 +181,19 @@ class Comment(models.Model):
     comment_text = models.TextField()
     comment_date = models.DateTimeField(auto_now_add=True)
     parent_comment = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
+    # Materialised path, maintained from signals, see library/comments.py
+    path = models.CharField(max_length=255, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    thread = models.ForeignKey(
+        'self', null=True, blank=True, editable=False, db_index=False, on_delete=models.CASCADE, related_name='+',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'path'], name='comment_resource_path_idx'),
+            models.Index(fields=['resource', 'depth', 'id'], name='comment_resource_roots_idx'),
+            models.Index(fields=['thread', 'path'], name='comment_thread_path_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.user.username} on {self.resource.title}'
@@ -129,6 +206,9 @@ class Bookmark(models.Model):
 
     class Meta:
         unique_together = ('user', 'resource')
+        indexes = [
+            models.Index(fields=['user', 'bookmark_date', 'id'], name='bookmark_user_date_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} bookmarked {self.resource.title}'
@@ -139,6 +219,13 @@ class Download(models.Model):
     resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='downloads')
     download_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'download_date', 'id'], name='download_user_date_idx'),
+            # For compacting old rows, see library/rollups.py
+            models.Index(fields=['download_date'], name='download_date_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user.username} downloaded {self.resource.title}'
 
@@ -148,6 +235,119 @@ class View(models.Model):
     resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='views')
     view_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'view_date', 'id'], name='view_user_date_idx'),
+            models.Index(fields=['view_date'], name='view_date_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user.username} viewed {self.resource.title}'
 
+
+# Daily view/download totals per resource, including anonymous hits, see library/rollups.py
+class ResourceActivityDay(models.Model):
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='activity_days')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    downloads = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['resource', 'day'], name='resource_activity_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='resource_activity_day_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.resource_id} on {self.day}: {self.views} views, {self.downloads} downloads'
+
+# Daily views/downloads of a resource by one user, see library/rollups.py
+class UserActivityDay(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_days')
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='user_activity_days')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    downloads = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'resource', 'day'], name='user_activity_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day', 'id'], name='user_activity_user_day_idx'),
+            models.Index(fields=['day'], name='user_activity_day_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} on {self.day}: {self.resource_id} ({self.views} views, {self.downloads} downloads)'
+
+# Precomputed item-to-item similarities, built by library/recommender.py
+class ResourceNeighbor(models.Model):
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('resource', 'neighbor')
+        indexes = [
+            models.Index(fields=['resource', '-score'], name='neighbor_resource_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.resource_id} ~ {self.neighbor_id} ({self.score:.3f})'
+
+# Bookkeeping for incremental recommender builds
+class RecommenderRun(models.Model):
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    full = models.BooleanField(default=False)
+    items_updated = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'Recommender run at {self.started_at:%Y-%m-%d %H:%M}'
+
+# Precomputed top-N lists per metric, see library/leaderboards.py
+class LeaderboardEntry(models.Model):
+    metric = models.CharField(max_length=20)
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['metric', 'subject', 'rank'], name='leaderboard_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.metric} #{self.rank}: {self.resource_id}'
+
+# Reference time of Resource.trending_score, a single row, see library/trending.py
+class TrendingState(models.Model):
+    epoch = models.DateTimeField()
+
+    def __str__(self):
+        return f'Trending scores relative to {self.epoch:%Y-%m-%d %H:%M}'
+
+# Resumable chunked upload, see library/uploads.py
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    # Object the browser uploads to directly on object storage, else empty
+    storage_name = models.CharField(max_length=255, blank=True)
+    resource = models.ForeignKey(Resource, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='upload_session_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f'Upload of {self.filename} by {self.user_id} ({self.offset}/{self.length})'
@@ -0,0 +1,218 @@
+"""
+Keyset (cursor) pagination for resource listings.
+
+Pages are addressed by an opaque cursor holding the sort key of the row on
+either side of the page, and each page is fetched with a ``WHERE`` on that
+key plus ``LIMIT``. Unlike OFFSET pagination a deep page costs the same as
+the first one, and rows inserted while a user is paging do not shift later
+pages around.
+
+Every ordering must end with a unique column (normally ``id``) so the sort
+key is a total order.
+"""
+
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+
+from . import search
+from .models import Resource
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['v'], payload['d']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values, direction
+
+
+def page_size_from(request):
+    default = settings.PAGINATION_PAGE_SIZE
+    try:
+        size = int(request.GET.get('page_size', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, settings.PAGINATION_MAX_PAGE_SIZE))
+
+
+class CursorPage:
+    """One page of results plus the links to its neighbours."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, request=None, param='cursor'):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.request = request
+        self.param = param
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def _url(self, cursor):
+        query = self.request.GET.copy() if self.request is not None else {}
+        query[self.param] = cursor
+        return '?' + query.urlencode()
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor) if self.has_next else None
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor) if self.has_previous else None
+
+
+class CursorPaginator:
+    """
+    Paginates a queryset by ``ordering``, e.g. ``('-upload_date', '-id')``.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.page_size = page_size
+        self.fields = [name.lstrip('-') for name in ordering]
+        self.descending = [name.startswith('-') for name in ordering]
+
+    def _to_python(self, values):
+        if len(values) != len(self.fields):
+            raise InvalidCursor(values)
+        opts = self.queryset.model._meta
+        converted = []
+        for name, value in zip(self.fields, values):
+            field = opts.get_field(name)
+            try:
+                converted.append(field.to_python(value))
+            except Exception:
+                raise InvalidCursor(values)
+        return converted
+
+    def _keyset_filter(self, values, forward):
+        # (a, b, id) > (x, y, z) written out as nested ORs so every
+        # database can use the index, whatever the mix of directions
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            after = self.descending[i] != forward
+            step = Q(**{f'{name}__{"gt" if after else "lt"}': values[i]})
+            for j in range(i):
+                step &= Q(**{self.fields[j]: values[j]})
+            condition |= step
+        return condition
+
+    def _key(self, obj):
+        return [getattr(obj, name) for name in self.fields]
+
+    def window(self, cursor=None):
+        """
+        The rows of the page at ``cursor`` plus one (to tell whether there
+        are more), as a sliced queryset, and the direction of travel. Rows of
+        a "prev" window come in reverse order.
+        """
+        direction = 'next'
+        queryset = self.queryset
+        ordering = list(self.ordering)
+        if cursor:
+            values, direction = decode_cursor(cursor)
+            values = self._to_python(values)
+            queryset = queryset.filter(self._keyset_filter(values, forward=direction == 'next'))
+        if direction == 'prev':
+            # Walk backwards from the cursor, then flip the rows back round
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+        return queryset.order_by(*ordering)[:self.page_size + 1], direction
+
+    def page(self, cursor=None, request=None, param='cursor'):
+        window, direction = self.window(cursor)
+        rows = list(window)
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if direction == 'prev':
+            rows.reverse()
+        return _build_page(rows, [self._key(row) for row in rows], direction, has_more, cursor, request, param)
+
+
+def _build_page(rows, keys, direction, has_more, cursor, request, param):
+    # Going forwards there is a previous page whenever we came from one;
+    # going backwards there is always a next page, the one we came from.
+    if direction == 'next':
+        has_next, has_previous = has_more, bool(cursor)
+    else:
+        has_next, has_previous = True, has_more
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_next:
+            next_cursor = encode_cursor(keys[-1], 'next')
+        if has_previous:
+            previous_cursor = encode_cursor(keys[0], 'prev')
+    return CursorPage(rows, next_cursor, previous_cursor, request, param)
+
+
+def paginate(request, queryset, ordering, param='cursor'):
+    """Return the page of ``queryset`` selected by ``request.GET[param]``."""
+    paginator = CursorPaginator(queryset, ordering, page_size_from(request))
+    try:
+        return paginator.page(request.GET.get(param), request, param)
+    except InvalidCursor:
+        raise Http404('Invalid page cursor.')
+
+
+def paginate_search(request, query, filters, param='cursor'):
+    """
+    Page through full-text search hits, keyed on ``(score, id)`` so that
+    results stay in relevance order.
+    """
+    page_size = page_size_from(request)
+    cursor = request.GET.get(param)
+    after = before = None
+    direction = 'next'
+    if cursor:
+        try:
+            values, direction = decode_cursor(cursor)
+            score, resource_id = float(values[0]), int(values[1])
+        except (InvalidCursor, ValueError, TypeError, IndexError):
+            raise Http404('Invalid page cursor.')
+        if direction == 'next':
+            after = (score, resource_id)
+        else:
+            before = (score, resource_id)
+
+    hits = search.search(query, filters, limit=page_size + 1, after=after, before=before)
+    has_more = len(hits) > page_size
+    hits = hits[:page_size]
+    if direction == 'prev':
+        hits.reverse()
+
+    found = Resource.objects.select_related('uploader').in_bulk([resource_id for resource_id, _ in hits])
+    rows = [found[resource_id] for resource_id, _ in hits if resource_id in found]
+    keys = [[score, resource_id] for resource_id, score in hits if resource_id in found]
+    return _build_page(rows, keys, direction, has_more, cursor, request, param)
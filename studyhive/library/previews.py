@@ -0,0 +1,180 @@
+"""
+Preview thumbnails for document resources.
+
+When a resource is saved with a PDF/PPT/DOC/DOCX file that has no previews
+yet, ``queue()`` hands it to a process pool once the transaction commits, so
+the upload request never waits for rendering. A pool worker renders the
+first page at every width in ``PREVIEW_SIZES`` (see ``library.thumbnails``)
+and returns the PNGs; they are stored next to the media under
+``PREVIEW_DIR`` and their names recorded in ``Resource.previews``.
+
+Jobs are bounded by ``PREVIEW_CPU_LIMIT`` seconds of CPU and
+``PREVIEW_MEMORY_LIMIT`` bytes per external tool plus a ``PREVIEW_TIMEOUT``
+wall clock, and workers are replaced after ``PREVIEW_TASKS_PER_CHILD`` jobs.
+
+Jobs are idempotent: ``Resource.preview_source`` is the file the previews
+were made from, and a resource whose previews match its file is skipped.
+Failures are recorded the same way with no previews, so a broken file is not
+retried on every save. The queue lives in memory; ``manage.py
+generate_previews`` renders whatever it missed, and ``--force`` re-renders.
+"""
+
+import logging
+import posixpath
+from concurrent.futures import as_completed
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching
+from .models import Resource
+from .thumbnails import RENDERED_TYPES, render_first_page
+from .tools import Limits, ToolError
+from .workers import WorkerPool, document_source
+
+logger = logging.getLogger(__name__)
+
+pool = WorkerPool('PREVIEW')
+
+
+def preview_sizes():
+    return sorted(getattr(settings, 'PREVIEW_SIZES', (160, 320, 640)))
+
+
+def _limits():
+    return Limits(
+        cpu_seconds=getattr(settings, 'PREVIEW_CPU_LIMIT', 30),
+        memory_bytes=getattr(settings, 'PREVIEW_MEMORY_LIMIT', 1024 ** 3),
+        timeout=getattr(settings, 'PREVIEW_TIMEOUT', 60),
+    )
+
+
+def needs_previews(resource):
+    return bool(
+        resource.file
+        and resource.file_type in RENDERED_TYPES
+        and resource.preview_source != resource.file.name
+    )
+
+
+def submit(executor, resource):
+    """Start rendering ``resource`` on ``executor``; returns the future."""
+    return executor.submit(render_first_page, document_source(resource.file), resource.file_type, preview_sizes(), _limits())
+
+
+def queue(resources):
+    """Render previews for ``resources`` in the background."""
+    if not pool.enabled:
+        return
+    executor = pool.get()
+    for resource in resources:
+        if not needs_previews(resource):
+            continue
+        try:
+            future = submit(executor, resource)
+        except Exception:
+            logger.exception('Could not queue previews for resource %d', resource.pk)
+            continue
+        future.add_done_callback(partial(_store_from_pool, resource.pk, resource.file.name))
+
+
+def _store_from_pool(resource_id, source_name, future):
+    # Runs on the pool's result thread, which has its own connection
+    try:
+        store(resource_id, source_name, future)
+    except Exception:
+        logger.exception('Could not store previews for resource %d', resource_id)
+    finally:
+        connection.close()
+
+
+def _preview_name(resource_id, source_name, width):
+    stem = posixpath.splitext(posixpath.basename(source_name))[0]
+    return posixpath.join(getattr(settings, 'PREVIEW_DIR', 'previews/'), str(resource_id), f'{stem}-{width}.png')
+
+
+def store(resource_id, source_name, future):
+    """
+    Save the PNGs of a finished job and record them on the resource, unless
+    its file changed while the job ran. Returns True if the resource was
+    updated.
+    """
+    storage = Resource._meta.get_field('file').storage
+    try:
+        rendered = future.result()
+    except ToolError as exc:
+        logger.warning('No previews for resource %d (%s): %s', resource_id, source_name, exc)
+        rendered = {}
+
+    previews = {}
+    for width, png in rendered.items():
+        name = _preview_name(resource_id, source_name, width)
+        # Fixed names, so a re-render replaces rather than piles up
+        storage.delete(name)
+        previews[str(width)] = storage.save(name, ContentFile(png))
+
+    with transaction.atomic():
+        current = Resource.objects.select_for_update().filter(pk=resource_id, file=source_name).first()
+        if current is None:
+            stale = previews.values()
+        else:
+            stale = set(current.previews.values()) - set(previews.values())
+            Resource.objects.filter(pk=resource_id).update(
+                previews=previews, preview_source=source_name, updated_at=timezone.now(),
+                card_version=F('card_version') + 1,
+            )
+            caching.invalidate_resources([resource_id])
+    for name in stale:
+        storage.delete(name)
+    return current is not None
+
+
+def generate(resources, workers=None, progress=None):
+    """
+    Render previews for ``resources`` on a private pool and wait for them.
+    ``progress(done, total)`` is called as jobs finish. Returns the number
+    of resources that got previews.
+    """
+    resources = list(resources)
+    rendered = 0
+    with pool.make(workers) as executor:
+        futures = {}
+        for resource in resources:
+            try:
+                futures[submit(executor, resource)] = resource
+            except Exception:
+                logger.exception('Could not queue previews for resource %d', resource.pk)
+        for done, future in enumerate(as_completed(futures), 1):
+            resource = futures[future]
+            try:
+                if store(resource.pk, resource.file.name, future) and future.exception() is None:
+                    rendered += 1
+            except Exception:
+                logger.exception('Could not store previews for resource %d', resource.pk)
+            if progress:
+                progress(done, len(futures))
+    return rendered
+
+
+@receiver(post_save, sender=Resource)
+def queue_saved_resource(sender, instance, **kwargs):
+    if needs_previews(instance):
+        transaction.on_commit(lambda: queue([instance]))
+
+
+@receiver(post_delete, sender=Resource)
+def delete_resource_previews(sender, instance, **kwargs):
+    storage = Resource._meta.get_field('file').storage
+    names = list(instance.previews.values())
+
+    def delete_files():
+        for name in names:
+            storage.delete(name)
+
+    transaction.on_commit(delete_files)
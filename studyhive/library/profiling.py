@@ -0,0 +1,218 @@
+"""
+Per-request database query profiling.
+
+``QueryProfilingMiddleware`` watches every database query run on behalf of
+a request, including those fanned out to worker threads by async views (see
+``library.aio``), and records the number of queries, the total time spent in
+the database and any SQL statement executed more than once (the signature of
+an N+1 loop). The figures are sent back in ``X-Query-Count``,
+``X-Query-Time-ms`` and ``X-Query-Duplicates`` headers and folded into a
+rolling per-URL-name report kept in this process, which staff can read at
+``/debug/queries/``.
+
+Views may declare how many queries they are allowed with ``@query_budget(n)``
+(or ``QUERY_BUDGETS = {url_name: n}`` in settings). Going over budget logs a
+warning here and fails the tests that use ``library.testing``.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+BUDGET_ATTR = 'query_budget'
+
+
+def query_budget(limit):
+    """Declare the maximum number of queries a view may run per request."""
+    def decorator(view_func):
+        setattr(view_func, BUDGET_ATTR, limit)
+        return view_func
+    return decorator
+
+
+# The recorder of the request being handled. Context variables follow the
+# request into sync_to_async threads, which thread-local connections do not.
+_current_recorder = ContextVar('query_recorder', default=None)
+
+
+def _execute_hook(execute, sql, params, many, context):
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add(sql, time.perf_counter() - start)
+
+
+def _install(connection):
+    if _execute_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_hook)
+
+
+@receiver(connection_created)
+def install_on_new_connection(sender, connection, **kwargs):
+    _install(connection)
+
+
+class QueryRecorder:
+    """Collects the queries run while it is active, from any thread."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, sql, duration):
+        with self._lock:
+            self.duration += duration
+            self.count += 1
+            # Parameters are kept apart from the SQL, so the same statement
+            # with different ids counts as a repeat
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.statements.items() if count > 1}
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.duplicates.values())
+
+    @contextmanager
+    def record(self):
+        """Make this the recorder for the current context."""
+        # Connections opened before this module was imported have no hook yet
+        for alias in connections:
+            _install(connections[alias])
+        token = _current_recorder.set(self)
+        try:
+            yield self
+        finally:
+            _current_recorder.reset(token)
+
+
+class QueryReport:
+    """Rolling window of the last ``size`` requests per URL name."""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._budgets = {}
+
+    def add(self, url_name, recorder, budget=None):
+        sample = (recorder.count, recorder.duration, recorder.duplicate_count)
+        with self._lock:
+            self._samples.setdefault(url_name, deque(maxlen=self.size)).append(sample)
+            self._budgets[url_name] = budget
+
+    def summary(self):
+        with self._lock:
+            samples = {name: list(window) for name, window in self._samples.items()}
+            budgets = dict(self._budgets)
+        report = {}
+        for name, window in samples.items():
+            counts = sorted(count for count, _, _ in window)
+            report[name] = {
+                'requests': len(window),
+                'queries_avg': round(sum(counts) / len(counts), 1),
+                'queries_p95': counts[min(len(counts) - 1, int(len(counts) * 0.95))],
+                'queries_max': counts[-1],
+                'time_ms_avg': round(sum(duration for _, duration, _ in window) * 1000 / len(window), 2),
+                'duplicates_max': max(duplicates for _, _, duplicates in window),
+                'budget': budgets.get(name),
+            }
+        return dict(sorted(report.items(), key=lambda item: -item[1]['queries_avg']))
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._budgets.clear()
+
+
+report = QueryReport(getattr(settings, 'QUERY_PROFILING_WINDOW', 200))
+
+
+def budget_for(request):
+    """The query budget of the view that handled ``request``, if any."""
+    match = request.resolver_match
+    if match is None:
+        return None
+    budget = getattr(settings, 'QUERY_BUDGETS', {}).get(match.url_name)
+    if budget is None:
+        budget = getattr(match.func, BUDGET_ATTR, None)
+    return budget
+
+
+class QueryProfilingMiddleware:
+    """
+    Put first in ``MIDDLEWARE`` so the session and user lookups of other
+    middleware are counted too. Does nothing unless ``QUERY_PROFILING`` is on.
+    Works in both sync and async stacks.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_PROFILING', False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.process(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = await self.get_response(request)
+        return self.process(request, response, recorder)
+
+    def process(self, request, response, recorder):
+        match = request.resolver_match
+        url_name = (match.url_name if match else None) or request.path
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time-ms'] = f'{recorder.duration * 1000:.2f}'
+        response['X-Query-Duplicates'] = str(recorder.duplicate_count)
+        # Kept on the response for library.testing
+        response.query_recorder = recorder
+        budget = budget_for(request)
+        report.add(url_name, recorder, budget)
+
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                '%s ran %d queries (budget %d, %d repeated): %s',
+                url_name, recorder.count, budget, recorder.duplicate_count, request.path,
+            )
+        return response
+
+
+@staff_member_required
+def query_report_view(request):
+    return JsonResponse(report.summary())
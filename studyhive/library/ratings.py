@@ -0,0 +1,87 @@
+"""
+Denormalised rating aggregates on Resource.
+
+``Resource.total_ratings``, ``rating_sum`` and ``average_rating`` are kept up
+to date from Rating signals with a single relative UPDATE per change, so
+pages read the stored columns instead of aggregating over ``Rating``. Writes
+that bypass signals (``QuerySet.update``, raw SQL) can make them drift;
+``manage.py reconcile_ratings`` recomputes them from scratch.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching
+from .models import Rating, Resource
+
+
+def apply_rating_delta(resource_id, count_delta, sum_delta):
+    """Shift one resource's aggregates by the given deltas in one UPDATE."""
+    # The right-hand side of an UPDATE sees the old row, so the average is
+    # computed from the new totals explicitly.
+    new_total = F('total_ratings') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    Resource.objects.filter(pk=resource_id).update(
+        total_ratings=new_total,
+        rating_sum=new_sum,
+        average_rating=Coalesce(Cast(new_sum, FloatField()) / NullIf(new_total, 0), 0.0),
+        updated_at=timezone.now(),
+    )
+    caching.invalidate_resources([resource_id])
+
+
+@receiver(post_init, sender=Rating)
+def remember_original_rating(sender, instance, **kwargs):
+    # What the database holds, so an update can apply the difference
+    instance._original = (instance.resource_id, instance.rating) if instance.pk else None
+
+
+@receiver(post_save, sender=Rating)
+def add_rating_to_aggregates(sender, instance, created, **kwargs):
+    original = None if created else instance._original
+    with transaction.atomic():
+        if original is None:
+            apply_rating_delta(instance.resource_id, 1, instance.rating)
+        elif original[0] != instance.resource_id:
+            apply_rating_delta(original[0], -1, -original[1])
+            apply_rating_delta(instance.resource_id, 1, instance.rating)
+        elif original[1] != instance.rating:
+            apply_rating_delta(instance.resource_id, 0, instance.rating - original[1])
+    instance._original = (instance.resource_id, instance.rating)
+
+
+@receiver(post_delete, sender=Rating)
+def remove_rating_from_aggregates(sender, instance, **kwargs):
+    resource_id, rating = instance._original or (instance.resource_id, instance.rating)
+    apply_rating_delta(resource_id, -1, -rating)
+
+
+def reconcile_ratings(dry_run=False):
+    """
+    Recompute every resource's aggregates from the Rating table and fix any
+    that drifted. Returns the ids of the resources that were wrong.
+    """
+    actual = {
+        row['resource']: (row['total'], row['score'])
+        for row in Rating.objects.values('resource').annotate(total=Count('id'), score=Sum('rating'))
+    }
+    drifted = []
+    now = timezone.now()
+    stored = Resource.objects.only('id', 'total_ratings', 'rating_sum', 'average_rating')
+    for resource in stored.iterator(chunk_size=2000):
+        total, score = actual.get(resource.id, (0, 0))
+        average = score / total if total else 0.0
+        if (resource.total_ratings, resource.rating_sum) != (total, score) or abs(resource.average_rating - average) > 1e-9:
+            resource.total_ratings, resource.rating_sum, resource.average_rating = total, score, average
+            resource.updated_at = now
+            drifted.append(resource)
+    if drifted and not dry_run:
+        Resource.objects.bulk_update(
+            drifted, ['total_ratings', 'rating_sum', 'average_rating', 'updated_at'], batch_size=500,
+        )
+        caching.invalidate_resources(resource.id for resource in drifted)
+    return [resource.id for resource in drifted]
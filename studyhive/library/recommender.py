@@ -0,0 +1,195 @@
+"""
+Offline item-to-item collaborative filtering.
+
+``build_neighbors()`` turns every view, download (from the daily rollups, see
+``library.rollups``), rating and bookmark into a sparse user x resource matrix, computes cosine similarities between resource
+columns and keeps the top ``RECOMMENDER_TOP_K`` neighbours of each resource
+in ``ResourceNeighbor``. At request time recommendations are just a lookup of
+the neighbours of what the user recently touched (see
+``library.views.get_user_activity_recommendations``).
+
+Incremental runs only recompute the neighbour lists of resources that gained
+interactions since the previous run. Other resources keep their lists until
+the next ``--full`` run, which is what makes an incremental run cheap.
+Ratings are found by ``Rating.updated_at``, which ``auto_now`` moves on
+every save, so a changed score counts as new; ``rating_date`` keeps the
+time of the first rating. Removed interactions (deleted ratings and
+bookmarks) leave no trace and wait for the next full run.
+
+Needs NumPy and SciPy; the web process never imports this module.
+"""
+
+import logging
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum, Value
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Bookmark, Rating, RecommenderRun, ResourceNeighbor, UserActivityDay
+
+logger = logging.getLogger(__name__)
+
+# How much each kind of interaction says about a user's interest. A rating
+# contributes its score (1-5) times the rating weight.
+DEFAULT_WEIGHTS = {
+    'view': 1.0,
+    'download': 2.0,
+    'bookmark': 3.0,
+    'rating': 1.0,
+}
+
+# Interaction sources: model, date field used for incremental runs. Ratings
+# can be changed, so theirs is the one a re-rating moves.
+SOURCES = {
+    'bookmark': (Bookmark, 'bookmark_date'),
+    'rating': (Rating, 'updated_at'),
+}
+# Rolled-up interactions: UserActivityDay column. A view counts once per
+# user and resource, like the raw View rows did; every download counts.
+ACTIVITY = {
+    'view': 'views',
+    'download': 'downloads',
+}
+
+BLOCK_SIZE = 1000
+
+
+def _weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, 'RECOMMENDER_WEIGHTS', {})}
+
+
+def load_interactions():
+    """Return parallel ``(user_ids, resource_ids, weights)`` arrays."""
+    weights = _weights()
+    queries = {
+        kind: (
+            UserActivityDay.objects.filter(**{f'{column}__gt': 0})
+            .values('user_id', 'resource_id').annotate(total=Sum(column))
+            .values_list('user_id', 'resource_id', 'total').order_by()
+        )
+        for kind, column in ACTIVITY.items()
+    }
+    queries['bookmark'] = Bookmark.objects.values_list('user_id', 'resource_id', Value(1))
+    queries['rating'] = Rating.objects.values_list('user_id', 'resource_id', 'rating')
+    users, resources, values = [], [], []
+    for kind, rows in queries.items():
+        flat = np.fromiter(chain.from_iterable(rows.iterator(chunk_size=20000)), dtype=np.int64)
+        data = flat.reshape(-1, 3)
+        users.append(data[:, 0])
+        resources.append(data[:, 1])
+        if kind in ('rating', 'download'):
+            values.append(data[:, 2].astype(np.float32) * weights[kind])
+        else:
+            values.append(np.full(len(data), weights[kind], dtype=np.float32))
+    return np.concatenate(users), np.concatenate(resources), np.concatenate(values)
+
+
+def touched_resources(since):
+    """Ids of resources with any interaction recorded after ``since``."""
+    touched = set()
+    for model, date_field in SOURCES.values():
+        touched.update(model.objects.filter(**{f'{date_field}__gte': since}).values_list('resource_id', flat=True).distinct())
+    # Rollups are by day, so this includes the rest of the day of ``since``
+    touched.update(
+        UserActivityDay.objects.filter(day__gte=timezone.localdate(since)).values_list('resource_id', flat=True).distinct()
+    )
+    return touched
+
+
+def build_matrix(user_ids, resource_ids, values):
+    """
+    Build the column-normalised users x resources CSC matrix. Returns it with
+    the array mapping column index to resource id.
+    """
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    items, item_index = np.unique(resource_ids, return_inverse=True)
+    # Duplicate (user, resource) pairs are summed by the COO -> CSC conversion
+    matrix = sparse.coo_matrix(
+        (values, (user_index, item_index)), shape=(len(users), len(items)), dtype=np.float32,
+    ).tocsc()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    norms[norms == 0] = 1.0
+    return matrix @ sparse.diags(1.0 / norms), items
+
+
+def top_k_neighbors(matrix, items, columns, top_k, min_score=0.0):
+    """
+    Yield ``(resource_id, [(neighbor_id, score), ...])`` for the given column
+    indexes, computing similarities ``BLOCK_SIZE`` columns at a time so memory
+    stays bounded however many resources are touched.
+    """
+    matrix_t = matrix.T.tocsr()
+    for start in range(0, len(columns), BLOCK_SIZE):
+        block = columns[start:start + BLOCK_SIZE]
+        similarities = (matrix_t[block] @ matrix).tocsr()
+        for row, column in enumerate(block):
+            begin, end = similarities.indptr[row], similarities.indptr[row + 1]
+            indices = similarities.indices[begin:end]
+            scores = similarities.data[begin:end]
+            keep = (indices != column) & (scores > min_score)
+            indices, scores = indices[keep], scores[keep]
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k)[:top_k]
+                indices, scores = indices[best], scores[best]
+            order = np.argsort(-scores, kind='stable')
+            yield int(items[column]), [(int(items[indices[i]]), float(scores[i])) for i in order]
+
+
+def save_neighbors(rows):
+    """Replace the stored neighbour lists of the resources in ``rows``."""
+    with transaction.atomic():
+        ResourceNeighbor.objects.filter(resource_id__in=[resource_id for resource_id, _ in rows]).delete()
+        ResourceNeighbor.objects.bulk_create(
+            [
+                ResourceNeighbor(resource_id=resource_id, neighbor_id=neighbor_id, score=score)
+                for resource_id, neighbors in rows
+                for neighbor_id, score in neighbors
+            ],
+            batch_size=2000,
+        )
+
+
+def build_neighbors(full=False, top_k=None, progress=None):
+    """
+    Recompute neighbour lists, for every resource when ``full`` is set or
+    there has been no previous run, otherwise only for resources touched
+    since the last successful run. Returns the ``RecommenderRun``.
+    """
+    top_k = top_k or getattr(settings, 'RECOMMENDER_TOP_K', 20)
+    min_score = getattr(settings, 'RECOMMENDER_MIN_SCORE', 0.01)
+    previous = RecommenderRun.objects.filter(finished_at__isnull=False).order_by('-started_at').first()
+    full = full or previous is None
+    run = RecommenderRun.objects.create(started_at=timezone.now(), full=full)
+
+    matrix, items = build_matrix(*load_interactions())
+    if full:
+        columns = np.arange(len(items))
+        # Resources that lost all their interactions keep no neighbours
+        stale = set(ResourceNeighbor.objects.values_list('resource_id', flat=True).distinct()) - set(items.tolist())
+        stale = list(stale)
+        for start in range(0, len(stale), BLOCK_SIZE):
+            ResourceNeighbor.objects.filter(resource_id__in=stale[start:start + BLOCK_SIZE]).delete()
+    else:
+        touched = np.fromiter(touched_resources(previous.started_at), dtype=np.int64)
+        columns = np.flatnonzero(np.isin(items, touched))
+    logger.info('Recomputing neighbours for %d of %d resources', len(columns), len(items))
+
+    batch = []
+    for done, row in enumerate(top_k_neighbors(matrix, items, columns, top_k, min_score), 1):
+        batch.append(row)
+        if len(batch) >= BLOCK_SIZE:
+            save_neighbors(batch)
+            batch = []
+        if progress and done % BLOCK_SIZE == 0:
+            progress(done, len(columns))
+    if batch:
+        save_neighbors(batch)
+
+    run.items_updated = len(columns)
+    run.finished_at = timezone.now()
+    run.save(update_fields=['items_updated', 'finished_at'])
+    return run
@@ -0,0 +1,165 @@
+"""
+Daily activity rollups and retention for ``View``/``Download`` history.
+
+Raw event rows grow with every hit, so everything that reads history reads
+two rollup tables instead, whose size grows with days:
+
+- ``ResourceActivityDay``: views and downloads of a resource per day,
+  anonymous hits included. Served by the API at ``/api/v1/activity/``.
+- ``UserActivityDay``: views and downloads of a resource by a user per day.
+  The profile's activity history, "recently touched" recommendations and the
+  recommender's interaction matrix come from here.
+
+``library.tracking`` adds each flush to both tables in the same transaction
+as the raw rows, with one ``INSERT ... ON CONFLICT DO UPDATE`` per table
+that adds to the day's totals. The rollups are therefore exact even though
+``View`` keeps only a user's first view of a resource.
+
+Raw rows are kept for ``ACTIVITY_RETENTION_DAYS`` (for auditing and the
+admin) and then removed by ``manage.py compact_activity``, which deletes in
+batches of ``ACTIVITY_COMPACT_BATCH_SIZE`` rows, each in its own short
+transaction, so no lock is held for long. Rollups are kept indefinitely.
+
+Rows written without the buffer (``manage.py seed_studyhive`` bulk-inserts
+them with signals off) are rolled up by ``rebuild()``, as migration 0017
+did for the rows that predate the rollups.
+"""
+
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Download, ResourceActivityDay, UserActivityDay, View
+
+COLUMNS = ('views', 'downloads')
+BATCH_SIZE = 2000
+
+
+def _upsert(model, key_fields, rows, column):
+    """Add ``rows`` of ``(*key, day, count)`` to ``column`` of ``model``'s rows."""
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    keys = [quote(model._meta.get_field(name).column) for name in key_fields]
+    target = quote(column)
+    # SQLite (3.24+) and PostgreSQL both support this form
+    sql = (
+        f'INSERT INTO {table} ({", ".join(keys)}, {", ".join(quote(name) for name in COLUMNS)}) '
+        f'VALUES ({", ".join(["%s"] * (len(keys) + len(COLUMNS)))}) '
+        f'ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {target} = {table}.{target} + excluded.{target}'
+    )
+    params = [
+        (*key[:-1], connection.ops.adapt_datefield_value(key[-1]), *(count if name == column else 0 for name in COLUMNS))
+        for *key, count in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def add_events(column, events, day=None):
+    """
+    Add ``(user_id, resource_id)`` hits to the rollups' ``column``
+    (``'views'`` or ``'downloads'``) for ``day`` (default: today).
+    ``user_id`` is None for anonymous hits.
+    """
+    if column not in COLUMNS:
+        raise ValueError(f'Unknown activity column "{column}"')
+    day = day or timezone.localdate()
+    by_resource = Counter(resource_id for _, resource_id in events)
+    by_user = Counter((user_id, resource_id) for user_id, resource_id in events if user_id is not None)
+    _upsert(ResourceActivityDay, ('resource', 'day'), [(resource_id, day, count) for resource_id, count in by_resource.items()], column)
+    _upsert(
+        UserActivityDay, ('user', 'resource', 'day'),
+        [(user_id, resource_id, day, count) for (user_id, resource_id), count in by_user.items()], column,
+    )
+
+
+def rebuild():
+    """
+    Replace both rollup tables with totals computed from the raw ``View`` and
+    ``Download`` rows. Whatever ``compact()`` already deleted is lost, and
+    anonymous views (never kept as rows) are not counted, so only use this
+    while the raw rows are complete, e.g. right after seeding.
+    """
+    by_resource, by_user = {}, {}
+    for model, date_field, column in ((View, 'view_date', 'views'), (Download, 'download_date', 'downloads')):
+        rows = (
+            model.objects.annotate(day=TruncDate(date_field)).values('user_id', 'resource_id', 'day')
+            .annotate(hits=Count('id')).order_by()
+        )
+        for row in rows.iterator():
+            totals = by_user.setdefault((row['user_id'], row['resource_id'], row['day']), dict.fromkeys(COLUMNS, 0))
+            totals[column] += row['hits']
+            totals = by_resource.setdefault((row['resource_id'], row['day']), dict.fromkeys(COLUMNS, 0))
+            totals[column] += row['hits']
+    with transaction.atomic():
+        ResourceActivityDay.objects.all().delete()
+        UserActivityDay.objects.all().delete()
+        ResourceActivityDay.objects.bulk_create(
+            [ResourceActivityDay(resource_id=resource_id, day=day, **totals) for (resource_id, day), totals in by_resource.items()],
+            batch_size=BATCH_SIZE,
+        )
+        UserActivityDay.objects.bulk_create(
+            [
+                UserActivityDay(user_id=user_id, resource_id=resource_id, day=day, **totals)
+                for (user_id, resource_id, day), totals in by_user.items() if user_id is not None
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+
+def user_history(user, column):
+    """``UserActivityDay`` rows of ``user`` with any ``column`` activity."""
+    return UserActivityDay.objects.filter(user=user, **{f'{column}__gt': 0})
+
+
+def recent_resource_ids(user, column, limit):
+    """Ids of the resources ``user`` most recently viewed or downloaded."""
+    ids = (
+        user_history(user, column).order_by('-day', '-id').values_list('resource_id', flat=True)[:limit]
+    )
+    return list(dict.fromkeys(ids))
+
+
+def retention_days():
+    return getattr(settings, 'ACTIVITY_RETENTION_DAYS', 90)
+
+
+def compact(days=None, batch_size=None, pause=0, progress=None):
+    """
+    Delete raw ``View`` and ``Download`` rows older than ``days`` (default:
+    ``ACTIVITY_RETENTION_DAYS``), ``batch_size`` rows per transaction,
+    sleeping ``pause`` seconds between batches. ``progress(model, deleted)``
+    is called after each batch. Returns ``{model name: rows deleted}``.
+    """
+    days = retention_days() if days is None else days
+    batch_size = batch_size or getattr(settings, 'ACTIVITY_COMPACT_BATCH_SIZE', 5000)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = {}
+    for model, date_field in ((View, 'view_date'), (Download, 'download_date')):
+        old = model.objects.filter(**{f'{date_field}__lt': cutoff})
+        total = 0
+        while True:
+            # Ids first: DELETE ... LIMIT is not portable, and a bounded
+            # id list keeps each transaction and its locks short
+            with transaction.atomic():
+                ids = list(old.order_by(date_field, 'id').values_list('id', flat=True)[:batch_size])
+                if ids:
+                    # Nothing references these rows, so this is a single DELETE
+                    model.objects.filter(id__in=ids).delete()
+            total += len(ids)
+            if progress and ids:
+                progress(model, total)
+            if len(ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+        deleted[model.__name__] = total
+    return deleted
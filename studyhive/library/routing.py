@@ -0,0 +1,157 @@
+"""
+Read replica routing.
+
+Writes always go to the ``default`` database. Reads go there too, except in
+views marked with ``@replica_reads`` (listings, search, resource pages and
+the JSON API): their ``GET``/``HEAD`` requests read from one of the
+``DATABASE_REPLICAS``, picked per request so that every query of a page sees
+the same copy.
+
+Replicas lag behind, so a client that has just written must not be sent
+there. ``ReplicaPinningMiddleware`` notices when a request writes (the
+router is asked for a write database) and sets a cookie that keeps the
+client on the primary for ``REPLICA_PIN_SECONDS``. A write partway through
+a request also sends the rest of that request's reads to the primary, and
+so does an open transaction on the primary, whose reads must see its own
+uncommitted rows. Sessions are always read from the primary.
+
+The request's routing state is kept in a context variable, so it follows
+the request into ``gather_queries`` worker threads (see ``library.aio``).
+Background threads (tracking flushes, the pools' result threads) have no
+state and use the primary.
+
+Locally, ``STUDYHIVE_DB_REPLICAS`` can name SQLite files that
+``manage.py sync_sqlite_replicas`` fills with copies of the primary.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+# Apps whose rows a client expects to read back at once
+PRIMARY_APPS = {'sessions'}
+
+
+class RequestRouting:
+    """Where the current request reads from, and whether it has written."""
+
+    def __init__(self, alias=None):
+        self.alias = alias
+        self.wrote = False
+
+
+_current = ContextVar('request_routing', default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+@contextmanager
+def routing_for(request):
+    """Track the writes of ``request``; reads stay on the primary."""
+    state = _current.get()
+    if state is not None:
+        yield state
+        return
+    token = _current.set(RequestRouting())
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def reading_from_replicas(request):
+    """Send the reads of ``request`` to a replica, unless the client is pinned to the primary."""
+    with routing_for(request) as state:
+        aliases = replica_aliases()
+        if aliases and request.method in SAFE_METHODS and not request.COOKIES.get(PIN_COOKIE) and not state.wrote:
+            state.alias = random.choice(aliases)
+        try:
+            yield state
+        finally:
+            state.alias = None
+
+
+def replica_reads(view_func):
+    """Let ``GET``/``HEAD`` requests to ``view_func`` read from a replica."""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            with reading_from_replicas(request):
+                return await view_func(request, *args, **kwargs)
+    else:
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            with reading_from_replicas(request):
+                return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or state.alias is None or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+            state.alias = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keeps clients that have just written on the primary. Put it before the
+    session middleware so the session's own writes are noticed too. Works in
+    both sync and async stacks.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_for(request) as state:
+            response = self.get_response(request)
+        return self.process(response, state)
+
+    async def __acall__(self, request):
+        with routing_for(request) as state:
+            response = await self.get_response(request)
+        return self.process(response, state)
+
+    def process(self, response, state):
+        if state.wrote and replica_aliases():
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(), httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,297 @@
+"""
+Full-text search over resources.
+
+Each resource's title, description, tag names and the text extracted from
+its file (see ``library.extraction``) are kept in an inverted index: an FTS5
+virtual table on SQLite, or a ``tsvector`` column with a GIN index on
+PostgreSQL (created by migration 0004; 0012 adds the SQLite ``body``
+column). The index is updated incrementally from model signals and can be
+rebuilt from scratch with ``manage.py rebuild_search_index``.
+
+``search()`` returns ``(resource_id, score)`` pairs best match first. Scores
+are normalised so that lower is better on every backend (BM25 on SQLite,
+negated ``ts_rank_cd`` on PostgreSQL), and ``after``/``before`` continue from
+a ``(score, id)`` key for cursor pagination. ``facet_rows()`` counts every
+match by filter values in one grouped query, see ``library.facets``. Both
+read from a replica where the request allows it (see ``library.routing``);
+the index is only ever written on the primary.
+"""
+
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Resource, ResourceTag, Tag
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+BATCH_SIZE = 500
+
+# Filters accepted by search(), mapped to columns of library_resource
+FILTER_COLUMNS = {
+    'subject_id': 'subject_id',
+    'resource_type': 'resource_type',
+    'file_type': 'file_type',
+}
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), BATCH_SIZE):
+        yield ids[i:i + BATCH_SIZE]
+
+
+def _keyset_sql(score_expr, after, before):
+    # Continue from (score, id) in either direction, see library.pagination
+    if after:
+        return (
+            f' AND ({score_expr} > %s OR ({score_expr} = %s AND r.id > %s))',
+            [after[0], after[0], after[1]],
+            'ORDER BY score, r.id',
+        )
+    if before:
+        return (
+            f' AND ({score_expr} < %s OR ({score_expr} = %s AND r.id < %s))',
+            [before[0], before[0], before[1]],
+            'ORDER BY score DESC, r.id DESC',
+        )
+    return '', [], 'ORDER BY score, r.id'
+
+
+# One row per combination of filter values among the matches
+FACET_SQL = (
+    f'SELECT {", ".join(f"r.{column}" for column in FILTER_COLUMNS.values())}, COUNT(*) '
+    '{from_sql} GROUP BY ' + ', '.join(f'r.{column}' for column in FILTER_COLUMNS.values())
+)
+
+
+def _filter_sql(filters):
+    clauses, params = [], []
+    for key, value in (filters or {}).items():
+        if value in (None, ''):
+            continue
+        clauses.append(f' AND r.{FILTER_COLUMNS[key]} = %s')
+        params.append(value)
+    return ''.join(clauses), params
+
+
+class Backend:
+    def __init__(self, connection):
+        self.connection = connection
+
+
+class SQLiteBackend(Backend):
+    table = 'library_resource_fts'
+    # Column weights for bm25(): title, description, tags, body
+    weights = (10.0, 1.0, 5.0, 0.5)
+
+    document_sql = (
+        'SELECT r.id, r.title, COALESCE(r.description, \'\'), '
+        'COALESCE((SELECT group_concat(t.name, \' \') FROM library_resourcetag rt '
+        'JOIN library_tag t ON t.id = rt.tag_id WHERE rt.resource_id = r.id), \'\'), '
+        'COALESCE((SELECT x.text FROM library_resourcetext x WHERE x.resource_id = r.id), \'\') '
+        'FROM library_resource r'
+    )
+
+    def index(self, resource_ids):
+        with self.connection.cursor() as cursor:
+            for chunk in _chunks(resource_ids):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', chunk)
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, title, description, tags, body) '
+                    f'{self.document_sql} WHERE r.id IN ({placeholders})',
+                    chunk,
+                )
+
+    def remove(self, resource_ids):
+        with self.connection.cursor() as cursor:
+            for chunk in _chunks(resource_ids):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', chunk)
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(f'INSERT INTO {self.table} (rowid, title, description, tags, body) {self.document_sql}')
+
+    def search(self, query, filters=None, limit=100, after=None, before=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Every term must match; the trailing * lets a half-typed word match
+        match = ' '.join(f'"{term}"*' for term in terms)
+        filter_sql, filter_params = _filter_sql(filters)
+        weights = ', '.join(str(w) for w in self.weights)
+        score_expr = f'bm25({self.table}, {weights})'
+        keyset_sql, keyset_params, order_sql = _keyset_sql(score_expr, after, before)
+        sql = (
+            f'SELECT r.id, {score_expr} AS score '
+            f'FROM {self.table} JOIN library_resource r ON r.id = {self.table}.rowid '
+            f'WHERE {self.table} MATCH %s AND r.is_active{filter_sql}{keyset_sql} '
+            f'{order_sql} LIMIT %s'
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, [match, *filter_params, *keyset_params, limit])
+            return cursor.fetchall()
+
+    def facet_rows(self, query):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"*' for term in terms)
+        from_sql = (
+            f'FROM {self.table} JOIN library_resource r ON r.id = {self.table}.rowid '
+            f'WHERE {self.table} MATCH %s AND r.is_active'
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(FACET_SQL.format(from_sql=from_sql), [match])
+            return cursor.fetchall()
+
+
+class PostgresBackend(Backend):
+    table = 'library_resource_search'
+
+    # 'simple' skips stemming so that prefix matches behave like SQLite's
+    document_sql = (
+        'SELECT r.id, '
+        'setweight(to_tsvector(\'simple\', r.title), \'A\') || '
+        'setweight(to_tsvector(\'simple\', COALESCE(string_agg(t.name, \' \'), \'\')), \'B\') || '
+        'setweight(to_tsvector(\'simple\', COALESCE(r.description, \'\')), \'C\') || '
+        'setweight(to_tsvector(\'simple\', COALESCE(x.text, \'\')), \'D\') '
+        'FROM library_resource r '
+        'LEFT JOIN library_resourcetag rt ON rt.resource_id = r.id '
+        'LEFT JOIN library_tag t ON t.id = rt.tag_id '
+        'LEFT JOIN library_resourcetext x ON x.resource_id = r.id'
+    )
+
+    def index(self, resource_ids):
+        with self.connection.cursor() as cursor:
+            for chunk in _chunks(resource_ids):
+                cursor.execute(f'DELETE FROM {self.table} WHERE resource_id = ANY(%s)', [chunk])
+                cursor.execute(
+                    f'INSERT INTO {self.table} (resource_id, document) '
+                    f'{self.document_sql} WHERE r.id = ANY(%s) GROUP BY r.id, x.text',
+                    [chunk],
+                )
+
+    def remove(self, resource_ids):
+        with self.connection.cursor() as cursor:
+            for chunk in _chunks(resource_ids):
+                cursor.execute(f'DELETE FROM {self.table} WHERE resource_id = ANY(%s)', [chunk])
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+            cursor.execute(f'INSERT INTO {self.table} (resource_id, document) {self.document_sql} GROUP BY r.id, x.text')
+
+    def search(self, query, filters=None, limit=100, after=None, before=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        filter_sql, filter_params = _filter_sql(filters)
+        score_expr = '-ts_rank_cd(s.document, q)'
+        keyset_sql, keyset_params, order_sql = _keyset_sql(score_expr, after, before)
+        sql = (
+            f'SELECT r.id, {score_expr} AS score '
+            f'FROM {self.table} s JOIN library_resource r ON r.id = s.resource_id, '
+            'to_tsquery(\'simple\', %s) q '
+            f'WHERE s.document @@ q AND r.is_active{filter_sql}{keyset_sql} '
+            f'{order_sql} LIMIT %s'
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, [tsquery, *filter_params, *keyset_params, limit])
+            return cursor.fetchall()
+
+    def facet_rows(self, query):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        from_sql = (
+            f'FROM {self.table} s JOIN library_resource r ON r.id = s.resource_id '
+            'WHERE s.document @@ to_tsquery(\'simple\', %s) AND r.is_active'
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(FACET_SQL.format(from_sql=from_sql), [tsquery])
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    try:
+        return BACKENDS[connection.vendor](connection)
+    except KeyError:
+        raise NotImplementedError(f'Full-text search is not available on {connection.vendor}')
+
+
+def _reader():
+    # A replica when the request may read from one, see library.routing
+    return get_backend(router.db_for_read(Resource))
+
+
+def search(query, filters=None, limit=100, after=None, before=None):
+    return _reader().search(query, filters, limit, after, before)
+
+
+def facet_rows(query):
+    """``(subject_id, resource_type, file_type, count)`` for the matches of ``query``."""
+    return _reader().facet_rows(query)
+
+
+def index_resources(resource_ids):
+    get_backend().index(resource_ids)
+
+
+def rebuild_index():
+    get_backend().rebuild()
+
+
+# Keep the index in sync with resources and their tags
+
+@receiver(post_save, sender=Resource)
+def index_saved_resource(sender, instance, **kwargs):
+    index_resources([instance.pk])
+
+
+@receiver(post_delete, sender=Resource)
+def unindex_deleted_resource(sender, instance, **kwargs):
+    get_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=ResourceTag)
+@receiver(post_delete, sender=ResourceTag)
+def index_tagged_resource(sender, instance, **kwargs):
+    index_resources([instance.resource_id])
+
+
+@receiver(m2m_changed, sender=Resource.tags.through)
+def index_retagged_resources(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            index_resources([instance.pk])
+    elif action == 'pre_clear':
+        # tag.resources.clear(): remember who loses the tag before it is gone
+        instance._search_cleared_ids = list(instance.resources.values_list('id', flat=True))
+    elif action == 'post_clear':
+        index_resources(getattr(instance, '_search_cleared_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        index_resources(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def index_renamed_tag(sender, instance, created, **kwargs):
+    if not created:
+        index_resources(instance.resource_tags.values_list('resource_id', flat=True))
@@ -0,0 +1,57 @@
+// Suggestions from /autocomplete/ for inputs with data-autocomplete-url, see library/autocomplete.py.
+// data-autocomplete="tags" completes the last name of a comma-separated list
+// of tags; "search" offers matching titles and tags for the whole input.
+(function () {
+    function attach(input) {
+        var list = document.createElement('datalist');
+        list.id = input.id + '-suggestions';
+        input.parentNode.appendChild(list);
+        input.setAttribute('list', list.id);
+        input.setAttribute('autocomplete', 'off');
+        var tagsOnly = input.dataset.autocomplete === 'tags';
+        var timer = null;
+        var controller = null;
+
+        function show(values) {
+            list.innerHTML = '';
+            values.forEach(function (value) {
+                var option = document.createElement('option');
+                option.value = value;
+                list.appendChild(option);
+            });
+        }
+
+        function lookup() {
+            var parts = input.value.split(',');
+            var prefix = (tagsOnly ? parts[parts.length - 1] : input.value).trim();
+            if (!prefix) {
+                show([]);
+                return;
+            }
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            fetch(input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(prefix), {signal: controller.signal})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    var names = data.tags.map(function (tag) { return tag.name; });
+                    if (tagsOnly) {
+                        // Keep the names already typed in front of each suggestion
+                        var head = parts.slice(0, -1).map(function (part) { return part.trim(); }).filter(Boolean);
+                        show(names.map(function (name) { return head.concat([name]).join(', '); }));
+                    } else {
+                        show(data.resources.map(function (resource) { return resource.title; }).concat(names));
+                    }
+                })
+                .catch(function () {});
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(lookup, 100);
+        });
+    }
+
+    document.querySelectorAll('input[data-autocomplete-url]').forEach(attach);
+})();
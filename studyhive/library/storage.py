@@ -0,0 +1,241 @@
+"""
+S3-compatible file storage.
+
+``S3Storage`` keeps ``Resource.file``, ``Profile.avatar`` and the preview
+thumbnails in a bucket on AWS S3 or anything that speaks its API (MinIO,
+Ceph, moto's server). It is enabled through ``STORAGES['default']`` when
+``STORAGE_BACKEND`` is ``'s3'``; ``FileSystemStorage`` under ``MEDIA_ROOT``
+stays the default.
+
+On top of Django's ``Storage`` API it signs URLs that let browsers move the
+bytes themselves: ``presigned_download_url()`` for downloads (the download
+view redirects to it, see ``library.downloads``) and ``presigned_upload()``
+for a form POST straight to the bucket (see ``library.uploads``). Signing is
+local, so neither costs a request to the bucket.
+
+Built on botocore and s3transfer directly; ``_save`` goes through
+s3transfer's manager so large files are sent as concurrent multipart
+uploads.
+"""
+
+import mimetypes
+import posixpath
+import threading
+
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from botocore.session import get_session
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.encoding import filepath_to_uri
+from django.utils.http import content_disposition_header
+from s3transfer.manager import TransferConfig, TransferManager
+
+NOT_FOUND_CODES = {'404', 'NoSuchKey', 'NotFound'}
+
+
+def _not_found(exc):
+    return exc.response.get('Error', {}).get('Code') in NOT_FOUND_CODES
+
+
+class S3File(File):
+    """
+    Read-only file over an object. Reads stream from a GET that starts at
+    the current position, so ``seek()`` followed by ``read()`` fetches just
+    that range.
+    """
+
+    def __init__(self, storage, name):
+        self._storage = storage
+        self.name = name
+        self.mode = 'rb'
+        self._body = None
+        self._position = 0
+        self._size = None
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = self._storage.size(self.name)
+        return self._size
+
+    @property
+    def closed(self):
+        return False
+
+    def _stream(self):
+        if self._body is None:
+            params = {'Bucket': self._storage.bucket_name, 'Key': self._storage._key(self.name)}
+            if self._position:
+                params['Range'] = f'bytes={self._position}-'
+            self._body = self._storage.client.get_object(**params)['Body']
+        return self._body
+
+    def read(self, size=-1):
+        if self._size is not None and self._position >= self._size:
+            return b''
+        data = self._stream().read(None if size is None or size < 0 else size)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        position = {0: offset, 1: self._position + offset, 2: self.size + offset}[whence]
+        if position != self._position:
+            self.close()
+            self._position = position
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def open(self, mode=None):
+        self.seek(0)
+        return self
+
+    def close(self):
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+
+@deconstructible(path='library.storage.S3Storage')
+class S3Storage(Storage):
+
+    def __init__(
+        self, bucket_name=None, endpoint_url=None, region_name=None, access_key=None, secret_key=None,
+        location='', addressing_style='auto', url_expiry=3600, querystring_auth=True, public_url=None,
+    ):
+        if not bucket_name:
+            raise ImproperlyConfigured('S3Storage needs a bucket_name.')
+        self.bucket_name = bucket_name
+        self.endpoint_url = endpoint_url
+        self.region_name = region_name
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.location = location.strip('/')
+        self.addressing_style = addressing_style
+        self.url_expiry = url_expiry
+        self.querystring_auth = querystring_auth
+        self.public_url = public_url
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # botocore clients are thread-safe; one per storage is enough
+        with self._client_lock:
+            if self._client is None:
+                self._client = get_session().create_client(
+                    's3',
+                    endpoint_url=self.endpoint_url,
+                    region_name=self.region_name,
+                    aws_access_key_id=self.access_key,
+                    aws_secret_access_key=self.secret_key,
+                    config=Config(signature_version='s3v4', s3={'addressing_style': self.addressing_style}),
+                )
+            return self._client
+
+    def exists_bucket(self):
+        try:
+            self.client.head_bucket(Bucket=self.bucket_name)
+        except ClientError as exc:
+            if _not_found(exc) or exc.response.get('Error', {}).get('Code') == 'NoSuchBucket':
+                return False
+            raise
+        return True
+
+    def _key(self, name):
+        name = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+        return posixpath.join(self.location, name) if self.location else name
+
+    def _head(self, name):
+        return self.client.head_object(Bucket=self.bucket_name, Key=self._key(name))
+
+    # Storage API
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise ValueError('S3Storage files are read-only; use save().')
+        return S3File(self, name)
+
+    def _save(self, name, content):
+        content_type = getattr(content, 'content_type', None) or mimetypes.guess_type(name)[0]
+        extra_args = {'ContentType': content_type} if content_type else {}
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        with TransferManager(self.client, TransferConfig()) as manager:
+            manager.upload(content, self.bucket_name, self._key(name), extra_args=extra_args).result()
+        return name
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket_name, Key=self._key(name))
+
+    def exists(self, name):
+        try:
+            self._head(name)
+        except ClientError as exc:
+            if _not_found(exc):
+                return False
+            raise
+        return True
+
+    def size(self, name):
+        try:
+            return self._head(name)['ContentLength']
+        except ClientError as exc:
+            if _not_found(exc):
+                raise FileNotFoundError(name)
+            raise
+
+    def get_modified_time(self, name):
+        try:
+            return self._head(name)['LastModified']
+        except ClientError as exc:
+            if _not_found(exc):
+                raise FileNotFoundError(name)
+            raise
+
+    def listdir(self, path):
+        prefix = self._key(path).rstrip('/') + '/' if path else (self.location + '/' if self.location else '')
+        directories, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, Delimiter='/'):
+            directories.extend(entry['Prefix'][len(prefix):].rstrip('/') for entry in page.get('CommonPrefixes', []))
+            files.extend(entry['Key'][len(prefix):] for entry in page.get('Contents', []))
+        return directories, files
+
+    def url(self, name):
+        if not self.querystring_auth:
+            base = self.public_url or f'{self.client.meta.endpoint_url}/{self.bucket_name}'
+            return f'{base.rstrip("/")}/{filepath_to_uri(self._key(name))}'
+        return self.presigned_download_url(name)
+
+    # Direct transfer
+
+    def presigned_download_url(self, name, filename=None, expires=None):
+        """
+        A GET URL for the object, valid for ``expires`` seconds. With
+        ``filename`` the browser saves it as an attachment under that name.
+        """
+        params = {'Bucket': self.bucket_name, 'Key': self._key(name)}
+        if filename:
+            params['ResponseContentDisposition'] = content_disposition_header(True, filename)
+        return self.client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=expires or self.url_expiry,
+        )
+
+    def presigned_upload(self, name, size, content_type=None, expires=None):
+        """
+        ``{'url': ..., 'fields': {...}}`` for a multipart form POST that can
+        only create ``name``, with exactly ``size`` bytes.
+        """
+        fields, conditions = {}, [['content-length-range', size, size]]
+        if content_type:
+            fields['Content-Type'] = content_type
+            conditions.append({'Content-Type': content_type})
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket_name, Key=self._key(name), Fields=fields, Conditions=conditions,
+            ExpiresIn=expires or self.url_expiry,
+        )
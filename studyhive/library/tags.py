@@ -0,0 +1,47 @@
+"""
+Tag name handling shared by the upload form and the bulk importer.
+"""
+
+from django.core.exceptions import ValidationError
+
+from . import caching
+from .models import Tag
+
+MAX_LENGTH = Tag._meta.get_field('name').max_length
+CHUNK_SIZE = 500
+
+
+def parse_tag_names(value):
+    """
+    Clean a comma-separated string (or a list) of tag names: whitespace is
+    stripped, blanks and repeats dropped. Raises ValidationError for a name
+    too long to store.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    names = []
+    for name in value:
+        name = str(name).strip()
+        if not name or name in names:
+            continue
+        if len(name) > MAX_LENGTH:
+            raise ValidationError(f'Tag "{name[:20]}..." is longer than {MAX_LENGTH} characters.')
+        names.append(name)
+    return names
+
+
+def resolve_tags(names):
+    """
+    Return ``{name: Tag}`` for ``names``, creating any that do not exist yet.
+    One INSERT ... ON CONFLICT DO NOTHING and one SELECT per ``CHUNK_SIZE``
+    names, however many tags are new.
+    """
+    names = list(dict.fromkeys(names))
+    tags = {}
+    for start in range(0, len(names), CHUNK_SIZE):
+        chunk = names[start:start + CHUNK_SIZE]
+        Tag.objects.bulk_create([Tag(name=name) for name in chunk], ignore_conflicts=True)
+        tags.update((tag.name, tag) for tag in Tag.objects.filter(name__in=chunk))
+    # bulk_create sends no signals; new ids may be cached as missing
+    caching.tags.invalidate(tag.pk for tag in tags.values())
+    return tags
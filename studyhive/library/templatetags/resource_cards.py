@@ -0,0 +1,14 @@
+from django import template
+
+from library.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def resource_cards(resources, variant='grid'):
+    """
+    Render ``resources`` as cards, from the card cache where possible:
+    ``{% resource_cards page 'grid' as cards %}``, then ``{{ card }}`` for each.
+    """
+    return render_cards(resources, variant)
@@ -1,8 +1,13 @@
 from django import template
-import re
+
+from library.media import youtube_video_id as parse_video_id
 
 register = template.Library()
 
+# Templates read Resource.video_id and Resource.embed_url, which are worked
+# out once at save time (see library/media.py); these filters are for URLs
+# that are not on a resource.
+
 @register.filter(name='youtube_embed_url')
 def youtube_embed_url(value):
     """
@@ -11,14 +16,8 @@ def youtube_embed_url(value):
     Input: https://www.youtube.com/watch?v=dQw4w9WgXcQ
     Output: https://www.youtube.com/embed/dQw4w9WgXcQ
     """
-    youtube_regex = (
-        r'(https?://)?(www\.)?'
-        '(youtube|youtu|youtube-nocookie)\.(com|be)/'
-        '(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})')
-
-    match = re.match(youtube_regex, value)
-    if match:
-        video_id = match.group(6)
+    video_id = parse_video_id(value)
+    if video_id:
         return f'https://www.youtube.com/embed/{video_id}'
     return value
 
@@ -30,9 +29,4 @@ def youtube_video_id(value):
     - https://www.youtube.com/watch?v=ID
     - https://youtu.be/ID
     """
-    youtube_regex = (r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
-                     r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})')
-    match = re.match(youtube_regex, value)
-    if match:
-        return match.group(6)
-    return None
\ No newline at end of file
+    return parse_video_id(value)
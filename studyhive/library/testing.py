@@ -0,0 +1,40 @@
+"""
+Test helpers for the query budgets declared with
+``library.profiling.query_budget``.
+
+    class ResourceDetailTests(QueryBudgetMixin, TestCase):
+        def test_detail_budget(self):
+            response = self.client.get(reverse('resource_detail', args=[resource.id]))
+            self.assertWithinQueryBudget(response)
+
+The request must go through ``QueryProfilingMiddleware``, which is active
+whenever ``QUERY_PROFILING`` is on (``override_settings`` works too, since the
+test client builds a fresh handler for every request).
+"""
+
+from .profiling import budget_for
+
+
+class QueryBudgetMixin:
+
+    def assertWithinQueryBudget(self, response, budget=None):
+        """
+        Fail if the request behind ``response`` ran more queries than
+        ``budget``, or than the budget declared for its view. The failure
+        message lists every statement that was repeated.
+        """
+        recorder = getattr(response, 'query_recorder', None)
+        if recorder is None:
+            self.fail('No query profile on the response; is QueryProfilingMiddleware installed and QUERY_PROFILING on?')
+        if budget is None:
+            budget = budget_for(response.wsgi_request)
+        if budget is None:
+            self.fail(f'No query budget declared for {response.wsgi_request.path}.')
+        if recorder.count > budget:
+            repeated = '\n'.join(
+                f'  {count}x {sql}' for sql, count in sorted(recorder.duplicates.items(), key=lambda item: -item[1])
+            )
+            self.fail(
+                f'{response.wsgi_request.path} ran {recorder.count} queries, budget is {budget}.'
+                + (f'\nRepeated statements:\n{repeated}' if repeated else '')
+            )
@@ -0,0 +1,34 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Resource, ResourceActivityDay
+
+
+@override_settings(PREVIEW_WORKERS=0, TEXT_EXTRACTION_WORKERS=0)
+class ActivityApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        uploader = User.objects.create_user('uploader', password='pw')
+        resource = Resource.objects.create(
+            title='Limits lecture', resource_type='Video', file_type='YouTube',
+            video_url='https://www.youtube.com/watch?v=abcdefghijk', uploader=uploader,
+        )
+        for day in (1, 15):
+            ResourceActivityDay.objects.create(resource=resource, day=datetime.date(2024, 3, day), views=day)
+
+    def test_since(self):
+        response = self.client.get(reverse('api:activity-list'), {'since': '2024-03-10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['day'] for row in response.json()['results']], ['2024-03-15'])
+
+    def test_bad_since(self):
+        # Malformed, and well-formed but impossible
+        for value in ('last week', '2024-02-30'):
+            with self.subTest(since=value):
+                response = self.client.get(reverse('api:activity-list'), {'since': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'since': 'Expected YYYY-MM-DD'})
@@ -0,0 +1,86 @@
+import random
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import autocomplete
+from ..autocomplete import PrefixIndex
+from ..models import Resource, Tag
+
+WORDS = ['calculus', 'call', 'linear', 'algebra', 'limits', 'lines', 'intro', 'to', 'notes', 'exam']
+
+
+class PrefixIndexTests(SimpleTestCase):
+
+    def label(self, rng):
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+
+    def test_updates_match_a_fresh_load(self):
+        rng = random.Random(5)
+        entries = {i: (self.label(rng), rng.randint(0, 50)) for i in range(300)}
+        index = PrefixIndex()
+        index.load(entries)
+        for prefix in ('c', 'l', 'li', 'in'):
+            index.lookup(prefix)
+        for _ in range(30):
+            removed = set(rng.sample(sorted(entries), 5))
+            changed = {rng.randint(0, 400): (self.label(rng), rng.randint(0, 50)) for _ in range(10)}
+            for entry_id in removed:
+                entries.pop(entry_id, None)
+            entries.update(changed)
+            index.update(changed, removed - changed.keys())
+
+            fresh = PrefixIndex()
+            fresh.load(entries)
+            self.assertEqual(index._state[0], fresh._state[0])
+            self.assertEqual(index._state[1], fresh._state[1])
+            # Memoised answers stay right too
+            for prefix in ('c', 'l', 'li', 'in', 'exam'):
+                self.assertEqual(index.lookup(prefix, 20), fresh.lookup(prefix, 20))
+
+    def test_lookup(self):
+        index = PrefixIndex()
+        index.load({1: ('Intro to Calculus', 5), 2: ('Calculus notes', 9), 3: ('Linear algebra', 1)})
+        self.assertEqual([entry_id for entry_id, *_ in index.lookup('calc')], [2, 1])
+        index.update({3: ('Calculator tricks', 20)}, [2])
+        self.assertEqual(index.lookup('CALC'), [(3, 'Calculator tricks', 20), (1, 'Intro to Calculus', 5)])
+        self.assertEqual(index.lookup('lin'), [])
+
+
+@override_settings(PREVIEW_WORKERS=0, TEXT_EXTRACTION_WORKERS=0)
+class SignalBatchingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('uploader', password='pw')
+
+    def setUp(self):
+        autocomplete.load()
+        self.addCleanup(setattr, autocomplete, '_loaded_at', None)
+
+    def create(self, title):
+        resource = Resource.objects.create(
+            title=title, resource_type='Video', file_type='YouTube',
+            video_url='https://www.youtube.com/watch?v=abcdefghijk', uploader=self.user,
+        )
+        resource.tags.add(self.tag)
+        return resource
+
+    def test_one_update_per_commit(self):
+        self.tag = Tag.objects.create(name='thermodynamics')
+        with (
+            mock.patch.object(autocomplete.titles, 'update', wraps=autocomplete.titles.update) as titles,
+            mock.patch.object(autocomplete.tags, 'update', wraps=autocomplete.tags.update) as tags,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            resources = [self.create(f'Entropy lecture {i}') for i in range(20)]
+        self.assertEqual(titles.call_count, 1)
+        self.assertEqual(tags.call_count, 1)
+        self.assertEqual({entry_id for entry_id, *_ in autocomplete.titles.lookup('entropy', 20)}, {r.pk for r in resources})
+        self.assertEqual(autocomplete.tags.lookup('thermo'), [(self.tag.pk, 'thermodynamics', 20)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Resource.objects.filter(pk__in=[r.pk for r in resources[:5]]).delete()
+        self.assertEqual(len(autocomplete.titles.lookup('entropy', 20)), 15)
+        self.assertEqual(autocomplete.tags.lookup('thermo'), [(self.tag.pk, 'thermodynamics', 15)])
@@ -0,0 +1,153 @@
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..comments import MAX_DEPTH, build_tree, path_segment, thread_page
+from ..models import Comment, Resource
+
+
+@override_settings(PREVIEW_WORKERS=0, TEXT_EXTRACTION_WORKERS=0)
+class CommentTreeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('commenter', password='pw')
+        cls.resource = Resource.objects.create(
+            title='Limits lecture', resource_type='Video', file_type='YouTube',
+            video_url='https://www.youtube.com/watch?v=abcdefghijk', uploader=cls.user,
+        )
+
+    def comment(self, parent=None, text='Helpful'):
+        return Comment.objects.create(user=self.user, resource=self.resource, parent_comment=parent, comment_text=text)
+
+    def reload(self, *comments):
+        return [Comment.objects.get(pk=comment.pk) for comment in comments]
+
+    def chain(self, length, parent=None):
+        comments = []
+        for _ in range(length):
+            parent = self.comment(parent)
+            comments.append(parent)
+        return comments
+
+    def test_path_segment_sorts_like_ids(self):
+        ids = [1, 9, 10, 35, 36, 37, 1295, 1296, 46655, 46656, 36 ** 8 - 1]
+        self.assertEqual(sorted(path_segment(i) for i in ids), [path_segment(i) for i in ids])
+        self.assertEqual(path_segment(36), '00000010')
+
+    def test_reply_paths(self):
+        root = self.comment()
+        reply = self.comment(root)
+        nested = self.comment(reply)
+        root, reply, nested = self.reload(root, reply, nested)
+        self.assertEqual((root.path, root.depth, root.thread_id), (path_segment(root.pk), 0, root.pk))
+        self.assertEqual((reply.path, reply.depth, reply.thread_id), (root.path + path_segment(reply.pk), 1, root.pk))
+        self.assertEqual(nested.path, reply.path + path_segment(nested.pk))
+        self.assertEqual((nested.depth, nested.thread_id), (2, root.pk))
+
+    def test_tree_order(self):
+        first = self.comment(text='first')
+        second = self.comment(text='second')
+        reply = self.comment(first, text='reply')
+        nested = self.comment(reply, text='nested')
+        later_reply = self.comment(first, text='later reply')
+        self.comment(second, text='second reply')
+
+        ordered = Comment.objects.filter(resource=self.resource).order_by('path')
+        self.assertEqual(
+            [comment.comment_text for comment in ordered],
+            ['first', 'reply', 'nested', 'later reply', 'second', 'second reply'],
+        )
+        roots = build_tree(ordered)
+        self.assertEqual([root.pk for root in roots], [first.pk, second.pk])
+        self.assertEqual([child.pk for child in roots[0].children], [reply.pk, later_reply.pk])
+        self.assertEqual([child.pk for child in roots[0].children[0].children], [nested.pk])
+
+    def test_reply_past_max_depth_goes_to_parent(self):
+        comments = self.chain(MAX_DEPTH + 1)
+        deepest = self.reload(comments[-1])[0]
+        self.assertEqual(deepest.depth, MAX_DEPTH)
+
+        reply = self.reload(self.comment(deepest))[0]
+        # Attached beside the deepest comment rather than below it
+        self.assertEqual(reply.parent_comment_id, comments[-2].pk)
+        self.assertEqual(reply.depth, MAX_DEPTH)
+        self.assertLessEqual(len(reply.path), Comment._meta.get_field('path').max_length)
+
+    def test_move_subtree(self):
+        first, second = self.comment(), self.comment()
+        reply = self.comment(first)
+        nested = self.comment(reply)
+        deeper = self.comment(nested)
+
+        reply = Comment.objects.get(pk=reply.pk)
+        reply.parent_comment = second
+        reply.save()
+        second, reply, nested, deeper = self.reload(second, reply, nested, deeper)
+        self.assertEqual(reply.path, second.path + path_segment(reply.pk))
+        self.assertEqual(nested.path, reply.path + path_segment(nested.pk))
+        self.assertEqual(deeper.path, nested.path + path_segment(deeper.pk))
+        self.assertEqual([c.depth for c in (reply, nested, deeper)], [1, 2, 3])
+        self.assertEqual({c.thread_id for c in (reply, nested, deeper)}, {second.pk})
+        self.assertEqual(Comment.objects.filter(thread_id=first.pk).count(), 1)
+
+        # Up to the top level: the reply starts its own thread
+        reply.parent_comment = None
+        reply.save()
+        reply, nested, deeper = self.reload(reply, nested, deeper)
+        self.assertEqual((reply.path, reply.depth, reply.thread_id), (path_segment(reply.pk), 0, reply.pk))
+        self.assertEqual(deeper.path, reply.path + path_segment(nested.pk) + path_segment(deeper.pk))
+        self.assertEqual((deeper.depth, deeper.thread_id), (2, reply.pk))
+
+    def test_move_below_own_reply_is_refused(self):
+        root = self.comment()
+        reply = self.comment(root)
+        nested = self.reload(self.comment(reply))[0]
+        for target in (nested, Comment.objects.get(pk=reply.pk)):
+            reply = Comment.objects.get(pk=reply.pk)
+            reply.parent_comment = target
+            with self.subTest(target=target.pk), self.assertRaises(ValueError):
+                reply.save()
+        # Refused before anything was written
+        reply, nested = self.reload(reply, nested)
+        self.assertEqual(reply.parent_comment_id, root.pk)
+        self.assertEqual(nested.path, reply.path + path_segment(nested.pk))
+
+    def test_move_too_deep_is_refused(self):
+        deep = self.chain(MAX_DEPTH)[-1]
+        root = self.comment()
+        reply = self.comment(root)
+        self.comment(reply)
+
+        reply = Comment.objects.get(pk=reply.pk)
+        reply.parent_comment = self.reload(deep)[0]
+        with self.assertRaises(ValueError):
+            reply.save()
+        self.assertEqual(self.reload(reply)[0].parent_comment_id, root.pk)
+
+    @override_settings(COMMENT_THREADS_PER_PAGE=2)
+    def test_thread_page(self):
+        roots = [self.comment(text=f'thread {i}') for i in range(5)]
+        for root in roots:
+            self.comment(self.comment(root))
+        factory = RequestFactory()
+
+        pages, cursor = [], None
+        while True:
+            page = thread_page(factory.get('/', {'comments_cursor': cursor} if cursor else {}), self.resource)
+            pages.append(page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        # Newest thread first, two threads a page, each with its replies
+        self.assertEqual([[thread.pk for thread in page] for page in pages], [
+            [roots[4].pk, roots[3].pk], [roots[2].pk, roots[1].pk], [roots[0].pk],
+        ])
+        for page in pages:
+            for thread in page:
+                self.assertEqual(len(thread.children), 1)
+                self.assertEqual(len(thread.children[0].children), 1)
+        self.assertFalse(pages[0].has_previous)
+
+        # And back again
+        page = thread_page(factory.get('/', {'comments_cursor': pages[2].previous_cursor}), self.resource)
+        self.assertEqual([thread.pk for thread in page], [roots[2].pk, roots[1].pk])
@@ -0,0 +1,131 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import FieldFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from ..downloads import parse_range, serve_file
+from ..models import Resource
+
+PAYLOAD = bytes(range(100))
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_ignored(self):
+        for header in (None, '', 'bytes=', 'bytes=-', 'items=0-1', 'bytes=a-b', 'bytes=0-1,5-6'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 100))
+
+    def test_ranges(self):
+        cases = {
+            'bytes=0-9': (0, 9),
+            'bytes=10-': (10, 99),
+            'bytes=90-500': (90, 99),
+            # Suffix ranges: the last N bytes, or all of a shorter file
+            'bytes=-10': (90, 99),
+            'bytes=-500': (0, 99),
+            ' bytes=5-5 ': (5, 5),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 100), expected)
+
+    def test_unsatisfiable(self):
+        for header in ('bytes=100-', 'bytes=200-300', 'bytes=9-5', 'bytes=-0'):
+            with self.subTest(header=header):
+                self.assertIs(parse_range(header, 100), False)
+
+
+@override_settings(DOWNLOAD_SENDFILE_MODE=None)
+class ServeFileTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        storage = FileSystemStorage(location=directory)
+        name = storage.save('resources/week 1?.pdf', ContentFile(PAYLOAD))
+        self.fieldfile = FieldFile(None, Resource._meta.get_field('file'), name)
+        self.fieldfile.storage = storage
+        self.factory = RequestFactory()
+
+    def serve(self, method='get', **headers):
+        response, counted = serve_file(getattr(self.factory, method)('/download/', headers=headers), self.fieldfile)
+        self.addCleanup(response.close)
+        return response, counted
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_download(self):
+        response, counted = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), PAYLOAD)
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(counted)
+
+    def test_range(self):
+        response, counted = self.serve(range='bytes=-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.content(response), PAYLOAD[90:])
+        self.assertEqual(response['Content-Range'], 'bytes 90-99/100')
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_only_get_from_start_counts(self):
+        cases = [
+            ('get', {}, True),
+            ('get', {'range': 'bytes=0-'}, True),
+            ('get', {'range': 'bytes=0-9'}, True),
+            # Resuming an interrupted download is the same download
+            ('get', {'range': 'bytes=50-'}, False),
+            ('get', {'range': 'bytes=-10'}, False),
+            ('head', {}, False),
+        ]
+        for method, headers, expected in cases:
+            with self.subTest(method=method, **headers):
+                self.assertEqual(self.serve(method, **headers)[1], expected)
+
+    def test_multi_range_is_ignored(self):
+        response, counted = self.serve(range='bytes=0-9,20-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), PAYLOAD)
+        self.assertTrue(counted)
+
+    def test_unsatisfiable_range(self):
+        response, counted = self.serve(range='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+        self.assertFalse(counted)
+
+    def test_if_range(self):
+        etag = self.serve()[0]['ETag']
+        response, counted = self.serve(range='bytes=50-', if_range=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertFalse(counted)
+
+        # The file changed since the partial copy: start over
+        response, counted = self.serve(range='bytes=50-', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), PAYLOAD)
+        self.assertTrue(counted)
+
+    def test_revalidation(self):
+        etag = self.serve()[0]['ETag']
+        response, counted = self.serve(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(counted)
+
+    @override_settings(DOWNLOAD_SENDFILE_MODE='x-accel-redirect', DOWNLOAD_ACCEL_PREFIX='/protected/')
+    def test_x_accel_redirect(self):
+        response, counted = self.serve(range='bytes=50-')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/resources/week%201%3F.pdf')
+        self.assertEqual(response.content, b'')
+        self.assertFalse(counted)
+
+    @override_settings(DOWNLOAD_SENDFILE_MODE='x-sendfile')
+    def test_x_sendfile(self):
+        response, _ = self.serve()
+        self.assertEqual(response['X-Sendfile'], self.fieldfile.path)
@@ -0,0 +1,91 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import leaderboards, tracking
+from ..models import Bookmark, Comment, Rating, Resource, Subject, Tag
+from ..testing import QueryBudgetMixin
+
+
+@override_settings(
+    QUERY_PROFILING=True,
+    # TestCase data is only visible on the test's own connection
+    ASYNC_CONCURRENT_QUERIES=False,
+    TRACKING_FLUSH_INTERVAL=0,
+    PREVIEW_WORKERS=0,
+    TEXT_EXTRACTION_WORKERS=0,
+)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every view with a declared ``@query_budget`` stays within it, cache cold."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pw')
+        others = [User.objects.create_user(f'user{i}', password='pw') for i in range(3)]
+        cls.subject = Subject.objects.create(name='Calculus')
+        cls.tag = Tag.objects.create(name='limits')
+        cls.resources = []
+        for i in range(5):
+            resource = Resource.objects.create(
+                title=f'Limits lecture {i}', resource_type='Video', file_type='YouTube',
+                video_url=f'https://www.youtube.com/watch?v=abcdefghij{i}',
+                uploader=others[i % len(others)], subject=cls.subject,
+            )
+            resource.tags.add(cls.tag)
+            cls.resources.append(resource)
+        # Enough related rows per resource for an N+1 query to show
+        for resource in cls.resources:
+            for user in others:
+                comment = Comment.objects.create(user=user, resource=resource, comment_text='Helpful')
+                Comment.objects.create(user=cls.user, resource=resource, comment_text='Agreed', parent_comment=comment)
+                Rating.objects.create(user=user, resource=resource, rating=4)
+            Bookmark.objects.create(user=cls.user, resource=resource)
+        # As cron and the tracking buffer keep them in production
+        leaderboards.refresh()
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='reader', password='pw')
+
+    def tearDown(self):
+        # Write buffered views inside the test transaction, not after it
+        tracking.flush_all()
+
+    def test_index(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('index')))
+
+    def test_profile(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('profile')))
+        self.assertWithinQueryBudget(self.client.get(reverse('user_profile', args=['user0'])))
+
+    def test_resource_detail(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('resource_detail', args=[self.resources[0].pk])))
+
+    def test_bookmarks_list(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('bookmarks_list')))
+
+    def test_tag_resources(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('tag_resources', args=[self.tag.pk])))
+
+    def test_recommendations(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('recommendations')))
+
+    def test_autocomplete(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('autocomplete'), {'q': 'lim'}))
+
+    def test_search(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('search_resources'), {'q': 'limits'}))
+        self.assertWithinQueryBudget(self.client.get(reverse('search_resources'), {'subject': self.subject.pk}))
+
+    def test_subject_resources(self):
+        self.assertWithinQueryBudget(self.client.get(reverse('subject_resources', args=[self.subject.pk])))
+
+    def test_over_budget_fails(self):
+        with override_settings(QUERY_BUDGETS={'tag_resources': 1}):
+            with self.assertLogs('library.profiling', 'WARNING'):
+                response = self.client.get(reverse('tag_resources', args=[self.tag.pk]))
+            with self.assertRaisesMessage(AssertionError, 'budget is 1'):
+                self.assertWithinQueryBudget(response)
+        with self.assertRaisesMessage(AssertionError, 'budget is 0'):
+            self.assertWithinQueryBudget(self.client.get(reverse('index')), budget=0)
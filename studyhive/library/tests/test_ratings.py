@@ -0,0 +1,98 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from ..models import Rating, Resource
+from ..ratings import apply_rating_delta, reconcile_ratings
+
+
+@override_settings(PREVIEW_WORKERS=0, TEXT_EXTRACTION_WORKERS=0)
+class RatingAggregateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'rater{i}', password='pw') for i in range(3)]
+        cls.resources = [
+            Resource.objects.create(
+                title=f'Lecture {i}', resource_type='Video', file_type='YouTube',
+                video_url=f'https://www.youtube.com/watch?v=abcdefghij{i}', uploader=cls.users[0],
+            )
+            for i in range(2)
+        ]
+        cls.resource = cls.resources[0]
+
+    def assertAggregates(self, resource, total, score):
+        resource = Resource.objects.get(pk=resource.pk)
+        self.assertEqual((resource.total_ratings, resource.rating_sum), (total, score))
+        self.assertAlmostEqual(resource.average_rating, score / total if total else 0.0)
+
+    def rate(self, user, rating, resource=None):
+        return Rating.objects.create(user=user, resource=resource or self.resource, rating=rating)
+
+    def test_apply_rating_delta(self):
+        apply_rating_delta(self.resource.pk, 2, 7)
+        self.assertAggregates(self.resource, 2, 7)
+        apply_rating_delta(self.resource.pk, -1, -3)
+        self.assertAggregates(self.resource, 1, 4)
+
+    def test_create(self):
+        self.rate(self.users[0], 4)
+        self.assertAggregates(self.resource, 1, 4)
+        self.rate(self.users[1], 1)
+        self.assertAggregates(self.resource, 2, 5)
+
+    def test_update(self):
+        self.rate(self.users[0], 4)
+        self.rate(self.users[1], 2)
+        # A fresh instance remembers the stored value from post_init
+        rating = Rating.objects.get(user=self.users[0])
+        rating.rating = 5
+        rating.save()
+        self.assertAggregates(self.resource, 2, 7)
+        # Saving again applies only the change since the last save
+        rating.rating = 3
+        rating.save()
+        self.assertAggregates(self.resource, 2, 5)
+        rating.save()
+        self.assertAggregates(self.resource, 2, 5)
+
+    def test_move_to_another_resource(self):
+        rating = self.rate(self.users[0], 4)
+        rating.resource = self.resources[1]
+        rating.save()
+        self.assertAggregates(self.resources[0], 0, 0)
+        self.assertAggregates(self.resources[1], 1, 4)
+
+    def test_delete(self):
+        self.rate(self.users[0], 4)
+        rating = self.rate(self.users[1], 2)
+        # The stored value counts, not an unsaved change
+        rating.rating = 5
+        rating.delete()
+        self.assertAggregates(self.resource, 1, 4)
+
+    def test_delete_last_rating(self):
+        self.rate(self.users[0], 4)
+        self.rate(self.users[1], 2)
+        # Queryset deletes send post_delete per row too
+        Rating.objects.filter(resource=self.resource).delete()
+        resource = Resource.objects.get(pk=self.resource.pk)
+        # No division by zero: the average falls back to 0
+        self.assertEqual((resource.total_ratings, resource.rating_sum, resource.average_rating), (0, 0, 0.0))
+
+    def test_reconcile_matches_incremental(self):
+        self.rate(self.users[0], 4)
+        rating = self.rate(self.users[1], 2)
+        self.rate(self.users[2], 5, self.resources[1])
+        rating.rating = 3
+        rating.save()
+        Rating.objects.filter(user=self.users[0]).delete()
+        self.rate(self.users[0], 1, self.resources[1])
+        incremental = list(Resource.objects.order_by('pk').values_list('total_ratings', 'rating_sum', 'average_rating'))
+        self.assertEqual(reconcile_ratings(), [])
+
+        # Drift that bypassed the signals is found and undone
+        Resource.objects.update(total_ratings=9, rating_sum=9, average_rating=1.0)
+        self.assertEqual(sorted(reconcile_ratings(dry_run=True)), [resource.pk for resource in self.resources])
+        self.assertEqual(sorted(reconcile_ratings()), [resource.pk for resource in self.resources])
+        reconciled = list(Resource.objects.order_by('pk').values_list('total_ratings', 'rating_sum', 'average_rating'))
+        self.assertEqual(reconciled, incremental)
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Rating, Resource
+from ..recommender import build_neighbors, touched_resources
+
+
+@override_settings(PREVIEW_WORKERS=0, TEXT_EXTRACTION_WORKERS=0)
+class IncrementalRunTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'rater{i}', password='pw') for i in range(2)]
+        cls.resources = [
+            Resource.objects.create(
+                title=f'Lecture {i}', resource_type='Video', file_type='YouTube',
+                video_url=f'https://www.youtube.com/watch?v=abcdefghij{i}', uploader=cls.users[0],
+            )
+            for i in range(3)
+        ]
+        for user in cls.users:
+            for resource in cls.resources:
+                Rating.objects.create(user=user, resource=resource, rating=4)
+
+    def rerate(self, resource, score):
+        # As the resource page does
+        Rating.objects.update_or_create(user=self.users[0], resource=resource, defaults={'rating': score})
+
+    def test_rerating_touches_resource(self):
+        since = timezone.now()
+        self.assertEqual(touched_resources(since), set())
+        self.rerate(self.resources[1], 2)
+        self.assertEqual(touched_resources(since), {self.resources[1].pk})
+        # The first rating's date is kept
+        rating = Rating.objects.get(user=self.users[0], resource=self.resources[1])
+        self.assertLess(rating.rating_date, since)
+
+    def test_incremental_run_recomputes_rerated_resource(self):
+        self.assertEqual(build_neighbors().items_updated, 3)
+        self.assertEqual(build_neighbors().items_updated, 0)
+        self.rerate(self.resources[2], 1)
+        run = build_neighbors()
+        self.assertFalse(run.full)
+        self.assertEqual(run.items_updated, 1)
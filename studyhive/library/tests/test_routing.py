@@ -0,0 +1,118 @@
+from django.contrib.sessions.models import Session
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from ..models import Resource, Tag
+from ..routing import PIN_COOKIE, ReplicaPinningMiddleware, _current, replica_reads
+
+
+def read_aliases(request):
+    """Where a read, a session read, a write and a read after it go."""
+    aliases = [router.db_for_read(Resource), router.db_for_read(Session)]
+    if request.method == 'POST':
+        router.db_for_write(Tag)
+        aliases.append(router.db_for_read(Resource))
+    return HttpResponse(','.join(aliases))
+
+
+@replica_reads
+def replica_view(request):
+    return read_aliases(request)
+
+
+@replica_reads
+async def async_replica_view(request):
+    return read_aliases(request)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=10)
+class ReplicaRoutingTests(TransactionTestCase):
+    """``ReplicaRouter`` and ``ReplicaPinningMiddleware``; the replica is never queried."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaPinningMiddleware(replica_view)
+
+    def aliases(self, response):
+        return response.content.decode().split(',')
+
+    def test_reads_go_to_the_replica(self):
+        response = self.middleware(self.factory.get('/'))
+        self.assertEqual(self.aliases(response), ['replica1', DEFAULT_DB_ALIAS])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_reads_outside_replica_views_go_to_the_primary(self):
+        response = ReplicaPinningMiddleware(read_aliases)(self.factory.get('/'))
+        self.assertEqual(self.aliases(response), [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS])
+        # Nor outside a request
+        self.assertEqual(router.db_for_read(Resource), DEFAULT_DB_ALIAS)
+
+    def test_writes_go_to_the_primary(self):
+        response = self.middleware(self.factory.post('/'))
+        self.assertEqual(router.db_for_write(Tag), DEFAULT_DB_ALIAS)
+        # POST never reads from a replica, before or after the write
+        self.assertEqual(self.aliases(response), [DEFAULT_DB_ALIAS] * 3)
+
+    def test_write_during_get_moves_later_reads_to_the_primary(self):
+        def view(request):
+            before = router.db_for_read(Resource)
+            self.assertEqual(router.db_for_write(Tag), DEFAULT_DB_ALIAS)
+            return HttpResponse(f'{before},{router.db_for_read(Resource)}')
+
+        response = ReplicaPinningMiddleware(replica_reads(view))(self.factory.get('/'))
+        self.assertEqual(self.aliases(response), ['replica1', DEFAULT_DB_ALIAS])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_reads_in_atomic_block_go_to_the_primary(self):
+        def view(request):
+            with transaction.atomic():
+                inside = router.db_for_read(Resource)
+            return HttpResponse(f'{inside},{router.db_for_read(Resource)}')
+
+        response = ReplicaPinningMiddleware(replica_reads(view))(self.factory.get('/'))
+        self.assertEqual(self.aliases(response), [DEFAULT_DB_ALIAS, 'replica1'])
+
+    def test_post_pins_the_client(self):
+        response = self.middleware(self.factory.post('/'))
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        self.assertTrue(cookie['httponly'])
+
+        # Pinned: reads stay on the primary while the cookie lasts
+        pinned = self.factory.get('/')
+        pinned.COOKIES[PIN_COOKIE] = cookie.value
+        response = self.middleware(pinned)
+        self.assertEqual(self.aliases(response), [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        # Once the browser drops it, back to the replica
+        response = self.middleware(self.factory.get('/'))
+        self.assertEqual(self.aliases(response)[0], 'replica1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_pin_without_replicas(self):
+        response = self.middleware(self.factory.post('/'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_state_is_reset_after_each_request(self):
+        self.middleware(self.factory.post('/'))
+        self.assertIsNone(_current.get())
+
+        def failing_view(request):
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            ReplicaPinningMiddleware(replica_reads(failing_view))(self.factory.get('/'))
+        self.assertIsNone(_current.get())
+
+    async def test_async_request(self):
+        middleware = ReplicaPinningMiddleware(async_replica_view)
+        response = await middleware(self.factory.get('/'))
+        self.assertEqual(self.aliases(response), ['replica1', DEFAULT_DB_ALIAS])
+        # Awaited in this task, so a leaked state would show here
+        self.assertIsNone(_current.get())
+
+        response = await middleware(self.factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertIsNone(_current.get())
@@ -0,0 +1,130 @@
+import base64
+import json
+import os
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, SimpleTestCase
+
+try:
+    import requests
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+from .. import downloads
+from ..storage import S3Storage
+
+BUCKET = 'studyhive-test'
+# Larger than a few download chunks, and not a multiple of one
+PAYLOAD = bytes(range(256)) * 1000
+
+
+@skipUnless(mock_aws, 'moto is not installed')
+class S3StorageTests(SimpleTestCase):
+    """``S3Storage`` against moto's in-process S3."""
+
+    def setUp(self):
+        # Keep botocore away from any real credentials or config
+        environ = mock.patch.dict(os.environ, {
+            'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing', 'AWS_CONFIG_FILE': os.devnull,
+        })
+        environ.start()
+        self.addCleanup(environ.stop)
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.storage = S3Storage(
+            bucket_name=BUCKET, region_name='us-east-1', access_key='testing', secret_key='testing', location='media',
+        )
+        self.storage.client.create_bucket(Bucket=BUCKET)
+
+    def test_save_open_delete(self):
+        self.assertTrue(self.storage.exists_bucket())
+        name = self.storage.save('resources/notes.pdf', ContentFile(b'%PDF-1.4 notes'))
+        self.assertEqual(name, 'resources/notes.pdf')
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), 14)
+        # Stored under the location prefix
+        head = self.storage.client.head_object(Bucket=BUCKET, Key='media/resources/notes.pdf')
+        self.assertEqual(head['ContentType'], 'application/pdf')
+        self.assertEqual(self.storage.listdir('resources'), ([], ['notes.pdf']))
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 notes')
+
+        # An existing name is not overwritten
+        other = self.storage.save('resources/notes.pdf', ContentFile(b'other'))
+        self.assertNotEqual(other, name)
+        self.storage.delete(other)
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.size(name)
+
+    def test_open_is_read_only(self):
+        with self.assertRaises(ValueError):
+            self.storage.open('resources/notes.pdf', 'wb')
+
+    def test_range_reads(self):
+        name = self.storage.save('resources/big.bin', ContentFile(PAYLOAD))
+        f = self.storage.open(name)
+        self.assertEqual(f.size, len(PAYLOAD))
+        # Sequential reads keep one GET open across chunk boundaries
+        self.assertEqual(f.read(100), PAYLOAD[:100])
+        self.assertEqual(f.read(downloads.CHUNK_SIZE), PAYLOAD[100:100 + downloads.CHUNK_SIZE])
+        self.assertEqual(f.tell(), 100 + downloads.CHUNK_SIZE)
+
+        # Seeking starts a ranged GET at the new position
+        start = downloads.CHUNK_SIZE - 10
+        f.seek(start)
+        self.assertEqual(f.read(20), PAYLOAD[start:start + 20])
+        f.seek(-5, 2)
+        self.assertEqual(f.read(), PAYLOAD[-5:])
+        self.assertEqual(f.read(), b'')
+        f.seek(0)
+        self.assertEqual(f.read(), PAYLOAD)
+        f.close()
+
+        # The streaming path of serve_file reads in CHUNK_SIZE pieces
+        start, length = 1000, 2 * downloads.CHUNK_SIZE + 500
+        chunks = list(downloads._iter_range(self.storage.open(name), start, length))
+        self.assertEqual([len(chunk) for chunk in chunks], [downloads.CHUNK_SIZE] * 2 + [500])
+        self.assertEqual(b''.join(chunks), PAYLOAD[start:start + length])
+
+    def test_presigned_upload(self):
+        upload = self.storage.presigned_upload('uploads/slides.pdf', 5, content_type='application/pdf')
+        fields = upload['fields']
+        self.assertEqual(fields['key'], 'media/uploads/slides.pdf')
+        # moto accepts any size, so check the signed policy S3 enforces
+        policy = json.loads(base64.b64decode(fields['policy']))
+        self.assertIn(['content-length-range', 5, 5], policy['conditions'])
+        self.assertIn({'Content-Type': 'application/pdf'}, policy['conditions'])
+        self.assertIn({'key': 'media/uploads/slides.pdf'}, policy['conditions'])
+
+        response = requests.post(upload['url'], data=fields, files={'file': ('slides.pdf', b'%PDF-')})
+        self.assertLess(response.status_code, 300)
+        self.assertEqual(self.storage.size('uploads/slides.pdf'), 5)
+
+    def test_serve_file_redirects_to_presigned_url(self):
+        name = self.storage.save('resources/big.bin', ContentFile(PAYLOAD))
+        fieldfile = SimpleNamespace(storage=self.storage, name=name)
+        factory = RequestFactory()
+
+        response, counted = downloads.serve_file(factory.get('/download/', HTTP_RANGE='bytes=10-'), fieldfile)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+        # The bucket serves the range itself, so every GET is a new download
+        self.assertTrue(counted)
+        location = response['Location']
+        self.assertIn('X-Amz-Signature=', location)
+        self.assertIn('response-content-disposition=', location)
+
+        fetched = requests.get(location)
+        self.assertEqual(fetched.status_code, 200)
+        self.assertEqual(fetched.content, PAYLOAD)
+        self.assertIn('big.bin', fetched.headers['Content-Disposition'])
+
+        _, counted = downloads.serve_file(factory.head('/download/'), fieldfile)
+        self.assertFalse(counted)
@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import uploads
+from ..models import Resource, UploadSession
+
+PAYLOAD = os.urandom(300 * 1024)
+
+
+class DroppedStream(io.BytesIO):
+    """A request body whose connection drops after ``limit`` bytes."""
+
+    def __init__(self, data, limit):
+        super().__init__(data)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise OSError('Connection reset by peer')
+        return super().read(min(size, self.limit - self.tell()))
+
+
+@override_settings(PREVIEW_WORKERS=0, TEXT_EXTRACTION_WORKERS=0)
+class ChunkedUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('uploader', password='pw')
+
+    def setUp(self):
+        # One directory, so finished uploads can be renamed into MEDIA_ROOT
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = override_settings(
+            MEDIA_ROOT=os.path.join(directory, 'media'), UPLOAD_TEMP_DIR=os.path.join(directory, 'uploads'),
+        )
+        paths.enable()
+        self.addCleanup(paths.disable)
+        uploads._hashers.clear()
+        self.addCleanup(uploads._hashers.clear)
+        self.client.force_login(self.user)
+
+    def create(self, length=len(PAYLOAD), filename='notes.pdf'):
+        response = self.client.post(reverse('upload_sessions'), headers={
+            'Tus-Resumable': '1.0.0',
+            'Upload-Length': str(length),
+            'Upload-Metadata': 'filename ' + base64.b64encode(filename.encode()).decode(),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def patch(self, url, data, offset, **headers):
+        return self.client.patch(url, data, content_type='application/offset+octet-stream', headers={
+            'Tus-Resumable': '1.0.0', 'Upload-Offset': str(offset), **headers,
+        })
+
+    def offset(self, url):
+        return int(self.client.head(url)['Upload-Offset'])
+
+    def session(self, url):
+        return UploadSession.objects.get(pk=url.rstrip('/').rsplit('/', 1)[1])
+
+    def finalize(self, url):
+        return self.client.post(url + 'finalize/', {'title': 'Notes', 'resource_type': 'Document', 'file_type': 'PDF'})
+
+    def test_patch_at_wrong_offset(self):
+        url = self.create()
+        self.assertEqual(self.patch(url, PAYLOAD[:1000], 0).status_code, 204)
+        for offset in (0, 500, 2000):
+            with self.subTest(offset=offset):
+                response = self.patch(url, PAYLOAD[offset:offset + 1000], offset)
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(response['Upload-Offset'], '1000')
+        self.assertEqual(self.offset(url), 1000)
+        with open(uploads.part_path(self.session(url)), 'rb') as fp:
+            self.assertEqual(fp.read(), PAYLOAD[:1000])
+
+    def test_resumed_upload_continues_hash(self):
+        url = self.create()
+        session = self.session(url)
+        # The connection drops partway through; what arrived is kept
+        with self.assertRaises(uploads.UploadError):
+            uploads.append_chunk(session, DroppedStream(PAYLOAD[:200000], 70000), 0, 200000)
+        offset = self.offset(url)
+        self.assertEqual(offset, 70000)
+        # This worker kept the running hash at the new offset
+        self.assertEqual(uploads._hashers[session.pk][0], offset)
+
+        self.assertEqual(self.patch(url, PAYLOAD[offset:200000], offset).status_code, 204)
+        # Another worker takes the last chunk and catches up from the part file
+        uploads._hashers.clear()
+        self.assertEqual(self.patch(url, PAYLOAD[200000:], 200000).status_code, 204)
+
+        response = self.finalize(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['sha256'], hashlib.sha256(PAYLOAD).hexdigest())
+
+    def test_checksum_mismatch_rolls_back(self):
+        url = self.create()
+        self.assertEqual(self.patch(url, PAYLOAD[:1000], 0).status_code, 204)
+        chunk = PAYLOAD[1000:5000]
+        wrong = base64.b64encode(hashlib.sha1(b'something else').digest()).decode()
+        response = self.patch(url, chunk, 1000, upload_checksum=f'sha1 {wrong}')
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(response['Upload-Offset'], '1000')
+        self.assertEqual(self.offset(url), 1000)
+        self.assertEqual(self.session(url).offset, 1000)
+
+        right = base64.b64encode(hashlib.sha1(chunk).digest()).decode()
+        self.assertEqual(self.patch(url, chunk, 1000, upload_checksum=f'sha1 {right}').status_code, 204)
+        self.assertEqual(self.patch(url, PAYLOAD[5000:], 5000).status_code, 204)
+        # The rolled back bytes never reached the running hash
+        self.assertEqual(self.finalize(url).json()['sha256'], hashlib.sha256(PAYLOAD).hexdigest())
+
+    def test_finalize_renames_part_file(self):
+        url = self.create()
+        self.assertEqual(self.patch(url, PAYLOAD, 0).status_code, 204)
+        part = uploads.part_path(self.session(url))
+        inode = os.stat(part).st_ino
+
+        response = self.finalize(url)
+        self.assertEqual(response.status_code, 201)
+        resource = Resource.objects.get(pk=response.json()['resource_id'])
+        # Moved into place, not copied: same inode, and the part file is gone
+        self.assertFalse(os.path.exists(part))
+        self.assertEqual(os.stat(resource.file.path).st_ino, inode)
+        with resource.file.open('rb') as fp:
+            self.assertEqual(fp.read(), PAYLOAD)
+        self.assertEqual(self.session(url).resource_id, resource.pk)
+
+        # Only once
+        self.assertEqual(self.finalize(url).status_code, 409)
+
+    def test_finalize_incomplete(self):
+        url = self.create()
+        self.assertEqual(self.patch(url, PAYLOAD[:1000], 0).status_code, 204)
+        response = self.finalize(url)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '1000')
@@ -0,0 +1,142 @@
+"""
+Streaming text extraction from documents.
+
+This module runs inside the extraction process pool (see
+``library.extraction``) and imports nothing from Django.
+
+Text is read a page at a time and never as a whole file: PDFs through
+Poppler's ``pdftotext`` writing to a pipe (pages end with a form feed),
+PPTX and DOCX by parsing the XML inside the ZIP incrementally, one slide or
+paragraph at a time. Legacy PPT and DOC files are converted to PDF by
+LibreOffice first. Reading stops, and the tool is killed, as soon as
+``max_chars`` of normalised text have been collected, so a 300-page scan
+costs no more than its first ``max_chars`` characters.
+"""
+
+import io
+import re
+import tempfile
+import unicodedata
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+from .tools import Limits, ToolError, check, convert_to_pdf, fetch, streaming
+
+PDFTOTEXT = 'pdftotext'
+EXTRACTED_TYPES = {'PDF', 'PPT', 'DOC', 'DOCX'}
+CHUNK_SIZE = 64 * 1024
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DRAWING_NS = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+SLIDE_RE = re.compile(r'^ppt/slides/slide(\d+)\.xml$')
+
+HYPHENATED_RE = re.compile(r'(\w)-\n(\w)')
+CONTROL_RE = re.compile(r'[\x00-\x08\x0b-\x1f\x7f-\x9f]')
+SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(text):
+    """NFKC, words split across lines rejoined, whitespace collapsed."""
+    text = unicodedata.normalize('NFKC', text)
+    text = HYPHENATED_RE.sub(r'\1\2', text)
+    text = CONTROL_RE.sub(' ', text)
+    return SPACE_RE.sub(' ', text).strip()
+
+
+def iter_pdf_pages(path, limits):
+    args = [PDFTOTEXT, '-q', '-enc', 'UTF-8', '-eol', 'unix', path, '-']
+    with streaming(args, limits) as process:
+        reader = io.TextIOWrapper(process.stdout, encoding='utf-8', errors='replace')
+        pending = ''
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            pages = (pending + chunk).split('\f')
+            pending = pages.pop()
+            yield from pages
+        if pending:
+            yield pending
+        check(process, args, limits)
+
+
+def _iter_text_blocks(fp, block_tag, text_tag):
+    # Only the element being read is kept; finished ones are cleared
+    parts = []
+    for event, element in iterparse(fp, events=('end',)):
+        if element.tag == text_tag and element.text:
+            parts.append(element.text)
+        elif element.tag == block_tag:
+            if parts:
+                yield ' '.join(parts)
+                parts = []
+            element.clear()
+
+
+def iter_docx_paragraphs(archive):
+    with archive.open('word/document.xml') as fp:
+        yield from _iter_text_blocks(fp, f'{WORD_NS}p', f'{WORD_NS}t')
+
+
+def iter_pptx_slides(archive):
+    slides = sorted(
+        (int(match.group(1)), name)
+        for name in archive.namelist()
+        if (match := SLIDE_RE.match(name))
+    )
+    for _, name in slides:
+        with archive.open(name) as fp:
+            yield ' '.join(_iter_text_blocks(fp, f'{DRAWING_NS}p', f'{DRAWING_NS}t'))
+
+
+def iter_pages(path, file_type, workdir, limits):
+    """Yield the raw text of ``path`` a page (slide, paragraph) at a time."""
+    if file_type == 'PDF':
+        yield from iter_pdf_pages(path, limits)
+        return
+    if zipfile.is_zipfile(path):
+        # PPTX is stored as PPT, see importer.FILE_TYPES_BY_EXTENSION
+        try:
+            with zipfile.ZipFile(path) as archive:
+                names = set(archive.namelist())
+                if 'word/document.xml' in names:
+                    yield from iter_docx_paragraphs(archive)
+                    return
+                if 'ppt/presentation.xml' in names:
+                    yield from iter_pptx_slides(archive)
+                    return
+        except (zipfile.BadZipFile, SyntaxError) as exc:
+            # ElementTree's ParseError is a SyntaxError
+            raise ToolError(f'Unreadable {file_type} file: {exc}')
+    yield from iter_pdf_pages(convert_to_pdf(path, workdir, limits), limits)
+
+
+def extract_text(path, file_type, max_chars, limits=None):
+    """
+    Return ``(text, pages, truncated)`` for the document at ``path`` (a
+    local path or a URL): its normalised text, one line per non-empty page,
+    cut at ``max_chars``. Raises ``ToolError``.
+    """
+    if file_type not in EXTRACTED_TYPES:
+        raise ToolError(f'No text extraction for {file_type} files')
+    limits = limits or Limits()
+    lines, size, pages, truncated = [], 0, 0, False
+    with tempfile.TemporaryDirectory(prefix='studyhive-text-') as workdir:
+        path = fetch(path, workdir, limits)
+        page_iter = iter_pages(path, file_type, workdir, limits)
+        try:
+            for page in page_iter:
+                pages += 1
+                text = normalize(page)
+                if not text:
+                    continue
+                if size + len(text) > max_chars:
+                    lines.append(text[:max_chars - size].rsplit(' ', 1)[0])
+                    truncated = True
+                    break
+                lines.append(text)
+                size += len(text) + 1
+        finally:
+            # Stops the tool if we broke off early
+            page_iter.close()
+    return '\n'.join(line for line in lines if line), pages, truncated
@@ -0,0 +1,68 @@
+"""
+First-page rendering for document previews.
+
+This module runs inside the preview process pool (see ``library.previews``)
+and deliberately imports nothing from Django, so spawned workers start
+without setting up the project.
+
+PDFs are rasterised with Poppler's ``pdftoppm``, which only ever reads the
+first page. PPT, DOC and DOCX files are converted to PDF by LibreOffice
+first. Both run under the limits of ``library.tools``.
+"""
+
+import io
+import os
+import tempfile
+
+from PIL import Image
+
+from .tools import Limits, ToolError, convert_to_pdf, fetch, run
+
+PDFTOPPM = 'pdftoppm'
+CONVERTED_TYPES = {'PPT', 'DOC', 'DOCX'}
+RENDERED_TYPES = {'PDF'} | CONVERTED_TYPES
+
+# The largest preview is rendered at most this tall, so a long poster or a
+# strip of slides cannot produce a giant bitmap
+MAX_ASPECT = 2
+
+
+def _rasterise_first_page(pdf, width, workdir, limits):
+    prefix = os.path.join(workdir, 'page')
+    run(
+        [PDFTOPPM, '-f', '1', '-l', '1', '-singlefile', '-png',
+         '-scale-to-x', str(width), '-scale-to-y', '-1', pdf, prefix],
+        limits,
+    )
+    return prefix + '.png'
+
+
+def render_first_page(path, file_type, widths, limits=None):
+    """
+    Render the first page of the document at ``path`` (a local path or a
+    URL) once per width in ``widths``. Returns ``{width: png_bytes}``;
+    raises ``ToolError``.
+    """
+    if file_type not in RENDERED_TYPES:
+        raise ToolError(f'No previews for {file_type} files')
+    limits = limits or Limits()
+    widths = sorted(set(widths), reverse=True)
+    with tempfile.TemporaryDirectory(prefix='studyhive-preview-') as workdir:
+        path = fetch(path, workdir, limits)
+        pdf = convert_to_pdf(path, workdir, limits) if file_type in CONVERTED_TYPES else path
+        page = _rasterise_first_page(pdf, widths[0], workdir, limits)
+        # Bounded by the -scale-to-x above, so the decoder cannot blow up
+        with Image.open(page) as image:
+            image.load()
+            image = image.convert('RGB')
+        if image.height > image.width * MAX_ASPECT:
+            image = image.crop((0, 0, image.width, image.width * MAX_ASPECT))
+
+    rendered = {}
+    for width in widths:
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG', optimize=True)
+        rendered[width] = buffer.getvalue()
+    return rendered
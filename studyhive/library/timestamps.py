@@ -0,0 +1,75 @@
+"""
+``Resource.updated_at`` for changes that do not go through ``Resource.save()``.
+
+``auto_now`` covers edits to the resource itself, and the relative UPDATEs of
+``library.tracking`` and ``library.ratings`` set the column along with the
+counters. Tag changes, and renamed subjects and uploaders (whose names the
+API embeds), are caught here. The API uses the column for ETag and
+Last-Modified headers (see ``library.api.conditional``), so anything shown in
+a resource's representation must bump it. Tag changes also bump
+``card_version`` for the card cache (see ``library.cards``) and drop the
+resources from the object cache (see ``library.caching``).
+"""
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching
+from .models import Resource, ResourceTag, Subject, Tag
+
+
+def touch_resources(resource_ids):
+    resource_ids = list(resource_ids)
+    if resource_ids:
+        # Tags are not on the cards, but tag pages list them by card
+        Resource.objects.filter(pk__in=resource_ids).update(
+            updated_at=timezone.now(), card_version=F('card_version') + 1,
+        )
+        caching.invalidate_resources(resource_ids)
+
+
+@receiver(post_save, sender=ResourceTag)
+@receiver(post_delete, sender=ResourceTag)
+def touch_tagged_resource(sender, instance, **kwargs):
+    touch_resources([instance.resource_id])
+
+
+@receiver(m2m_changed, sender=Resource.tags.through)
+def touch_retagged_resources(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_resources([instance.pk])
+    elif action == 'pre_clear':
+        instance._touch_cleared_ids = list(instance.resources.values_list('id', flat=True))
+    elif action == 'post_clear':
+        touch_resources(getattr(instance, '_touch_cleared_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        touch_resources(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def touch_renamed_tag(sender, instance, created, **kwargs):
+    if not created:
+        touch_resources(instance.resource_tags.values_list('resource_id', flat=True))
+
+
+@receiver(post_save, sender=Subject)
+def touch_renamed_subject(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'name' in update_fields):
+        touch_resources(instance.resources.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Subject)
+def touch_unfiled_resources(sender, instance, **kwargs):
+    # Before SET_NULL detaches them without signals
+    touch_resources(instance.resources.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def touch_renamed_uploader(sender, instance, created, update_fields=None, **kwargs):
+    # Logging in saves last_login only; anything else may have been a rename
+    if not created and (update_fields is None or 'username' in update_fields):
+        touch_resources(instance.uploaded_resources.values_list('id', flat=True))
@@ -0,0 +1,172 @@
+"""
+Running external document tools (Poppler, LibreOffice) under limits.
+
+Like ``library.thumbnails`` and ``library.textextract``, this module is
+imported by spawned pool workers and must not import Django.
+
+Every tool runs in its own session with CPU time and address space capped
+by ``setrlimit`` and a wall-clock timeout on top, and is killed with its
+whole process group when it overruns.
+"""
+
+import os
+import signal
+import subprocess
+import threading
+import time
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+
+try:
+    import resource as rlimit
+except ImportError:  # Windows: only the wall-clock timeout applies
+    rlimit = None
+
+SOFFICE = 'soffice'
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class ToolError(Exception):
+    """A document could not be converted, rendered or read."""
+
+
+class Limits:
+
+    def __init__(self, cpu_seconds=30, memory_bytes=1024 ** 3, timeout=60):
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.timeout = timeout
+
+    def apply(self):
+        # preexec_fn: runs in the tool's process between fork and exec
+        if rlimit is None:
+            return
+        if self.cpu_seconds:
+            rlimit.setrlimit(rlimit.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds))
+        limit_memory(self.memory_bytes)
+
+
+def limit_memory(memory_bytes):
+    """Cap the address space of the current process, e.g. a pool worker."""
+    if rlimit is not None and memory_bytes:
+        rlimit.setrlimit(rlimit.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def _name(args):
+    return os.path.basename(args[0])
+
+
+def start(args, limits, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE):
+    try:
+        return subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=stderr,
+            preexec_fn=limits.apply if rlimit is not None else None,
+            start_new_session=True,
+        )
+    except FileNotFoundError:
+        raise ToolError(f'{_name(args)} is not installed')
+
+
+def kill(process):
+    # soffice forks a helper, so kill the group and not just the child
+    if process.poll() is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError):
+        process.kill()
+
+
+def run(args, limits):
+    """Run a tool to completion; raises ``ToolError`` if it fails or overruns."""
+    process = start(args, limits)
+    try:
+        _, stderr = process.communicate(timeout=limits.timeout)
+    except subprocess.TimeoutExpired:
+        kill(process)
+        process.communicate()
+        raise ToolError(f'{_name(args)} took longer than {limits.timeout}s')
+    if process.returncode != 0:
+        message = stderr.decode('utf-8', 'replace').strip().splitlines()[-1:] or [f'exit status {process.returncode}']
+        raise ToolError(f'{_name(args)} failed: {message[0]}')
+
+
+@contextmanager
+def streaming(args, limits):
+    """
+    Start a tool whose stdout is read as it is produced. The tool is killed
+    after ``limits.timeout`` seconds, or when the block exits early; call
+    ``check()`` once its output has been read to the end.
+    """
+    # stderr is dropped: nobody reads it while stdout is streamed, and a
+    # chatty tool would block on a full pipe
+    process = start(args, limits, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    process.timed_out = False
+
+    def overrun():
+        process.timed_out = True
+        kill(process)
+
+    watchdog = threading.Timer(limits.timeout, overrun)
+    watchdog.daemon = True
+    watchdog.start()
+    try:
+        yield process
+    finally:
+        watchdog.cancel()
+        kill(process)
+        process.stdout.close()
+        process.wait()
+
+
+def check(process, args, limits):
+    """Raise ``ToolError`` if a streamed tool overran or failed."""
+    process.wait()
+    if process.timed_out:
+        raise ToolError(f'{_name(args)} took longer than {limits.timeout}s')
+    if process.returncode != 0:
+        raise ToolError(f'{_name(args)} failed with exit status {process.returncode}')
+
+
+def fetch(source, workdir, limits):
+    """
+    A local path for ``source``. Paths are returned as they are; URLs, such
+    as presigned object storage links, are downloaded into ``workdir``
+    within ``limits.timeout``.
+    """
+    if not source.startswith(('http://', 'https://')):
+        return source
+    name = os.path.basename(urllib.parse.unquote(urllib.parse.urlsplit(source).path)) or 'document'
+    path = os.path.join(workdir, 'source-' + name)
+    deadline = time.monotonic() + limits.timeout
+    try:
+        with urllib.request.urlopen(source, timeout=limits.timeout) as response, open(path, 'wb') as fp:
+            while True:
+                data = response.read(DOWNLOAD_CHUNK_SIZE)
+                if not data:
+                    break
+                fp.write(data)
+                if time.monotonic() > deadline:
+                    raise ToolError(f'Downloading the document took longer than {limits.timeout}s')
+    except OSError as exc:
+        raise ToolError(f'Could not download the document: {exc}')
+    return path
+
+
+def convert_to_pdf(path, workdir, limits):
+    """Convert an Office document to PDF in ``workdir``; returns its path."""
+    # A private profile lets several conversions run at once
+    profile = 'file://' + os.path.join(workdir, 'profile')
+    run(
+        [SOFFICE, f'-env:UserInstallation={profile}', '--headless', '--norestore',
+         '--convert-to', 'pdf', '--outdir', workdir, path],
+        limits,
+    )
+    pdf = os.path.join(workdir, os.path.splitext(os.path.basename(path))[0] + '.pdf')
+    if not os.path.exists(pdf):
+        raise ToolError('LibreOffice produced no PDF')
+    return pdf
@@ -0,0 +1,232 @@
+"""
+Buffered activity tracking.
+
+Page views and downloads are recorded into an in-process buffer instead of being written to
+the database on the request path. The buffer is flushed in bulk when it grows
+past ``TRACKING_BUFFER_SIZE`` events, every ``TRACKING_FLUSH_INTERVAL``
+seconds from a background thread, and once more when the process exits.
+
+A flush issues one ``bulk_create`` for the event rows, one grouped UPDATE
+per distinct counter delta (and per distinct trending score delta, see
+``library.trending``) and one upsert per daily rollup table (see
+``library.rollups``), so a burst of hits on a hot resource turns into a
+single write instead of one write lock per page view.
+
+A flush that fails is put back and retried by the next one, up to
+``TRACKING_MAX_RETRIES`` times in a row, after which the events are dropped
+and logged. An integrity or data error is not worth retrying: the batch is
+written in halves instead, so only the events that fail on their own (say,
+for a user deleted since the hit) are dropped.
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import leaderboards, rollups, trending
+from .models import Download, Resource, View
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    """
+    Collects ``(user_id, resource_id)`` events for one event model, the
+    matching counter column on ``Resource``, the daily rollup column (see
+    ``library.rollups``) and the kind of trending event (see
+    ``library.trending``).
+
+    ``unique_per_user`` mirrors the old ``get_or_create`` behaviour: at most
+    one event row is kept per user and resource, while the counter still
+    counts every hit.
+    """
+
+    def __init__(self, model, counter_field, rollup_field, trending_kind, unique_per_user=False):
+        self.model = model
+        self.counter_field = counter_field
+        self.rollup_field = rollup_field
+        self.trending_kind = trending_kind
+        self.unique_per_user = unique_per_user
+        self._lock = threading.Lock()
+        self._events = []
+        self._flusher = None
+        self._failures = 0
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'TRACKING_FLUSH_INTERVAL', 10)
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'TRACKING_BUFFER_SIZE', 500)
+
+    @property
+    def max_retries(self):
+        return getattr(settings, 'TRACKING_MAX_RETRIES', 5)
+
+    def record(self, resource_id, user_id=None):
+        """Queue one event. Anonymous hits only bump the counter."""
+        with self._lock:
+            self._events.append((user_id, resource_id))
+            if len(self._events) >= self.max_size:
+                self._flush_in_background()
+            else:
+                self._schedule()
+
+    def _flush_in_background(self):
+        # Called with the lock held. The request that fills the buffer must
+        # not pay for the write, so hand it to a thread straight away.
+        if isinstance(self._flusher, threading.Timer):
+            self._flusher.cancel()
+        self._flusher = threading.Thread(target=self._flush_from_timer, daemon=True)
+        self._flusher.start()
+
+    def _schedule(self):
+        # Called with the lock held
+        if self._flusher is None and self.flush_interval > 0:
+            self._flusher = threading.Timer(self.flush_interval, self._flush_from_timer)
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # Timer threads get their own connection; don't leak it
+            connection.close()
+
+    def pending(self):
+        with self._lock:
+            return len(self._events)
+
+    def flush(self):
+        """Write all buffered events to the database."""
+        with self._lock:
+            events, self._events = self._events, []
+            if isinstance(self._flusher, threading.Timer):
+                self._flusher.cancel()
+            self._flusher = None
+        if not events:
+            return 0
+        try:
+            self._write(events)
+            written = len(events)
+        except (IntegrityError, DataError):
+            # Retrying would fail the same way; find the bad events instead
+            logger.exception('Failed to flush %d %s events, writing them in parts', len(events), self.model.__name__)
+            try:
+                written = self._write_isolating(events)
+            except Exception:
+                # Some parts may be written already, so a retry could count
+                # them twice
+                logger.exception('Dropping the unwritten part of %d %s events', len(events), self.model.__name__)
+                return 0
+        except Exception:
+            with self._lock:
+                self._failures += 1
+                give_up = self._failures > self.max_retries
+                if give_up:
+                    self._failures = 0
+                else:
+                    # Put the events back so the next flush can retry them, but
+                    # don't grow without bound while the database is unavailable
+                    self._events[:0] = events[-self.max_size * 10:]
+                    self._schedule()
+            if give_up:
+                logger.exception(
+                    'Dropping %d %s events after %d failed flushes', len(events), self.model.__name__, self.max_retries + 1,
+                )
+            else:
+                logger.exception('Failed to flush %d %s events', len(events), self.model.__name__)
+            return 0
+        with self._lock:
+            self._failures = 0
+        # The events are committed; a failed refresh must not requeue them
+        try:
+            leaderboards.note_activity(written)
+        except Exception:
+            logger.exception('Failed to refresh leaderboards after flushing %s events', self.model.__name__)
+        return written
+
+    def _write_isolating(self, events):
+        """Write ``events`` in ever smaller parts, dropping those that fail alone. Returns the number written."""
+        try:
+            self._write(events)
+            return len(events)
+        except (IntegrityError, DataError):
+            if len(events) == 1:
+                logger.exception('Dropping %s event %r that cannot be written', self.model.__name__, events[0])
+                return 0
+        middle = len(events) // 2
+        return self._write_isolating(events[:middle]) + self._write_isolating(events[middle:])
+
+    def _write(self, events):
+        hits = Counter(resource_id for _, resource_id in events)
+        day = timezone.localdate()
+        if self.unique_per_user:
+            rows = {(user_id, resource_id) for user_id, resource_id in events if user_id is not None}
+        else:
+            rows = [(user_id, resource_id) for user_id, resource_id in events if user_id is not None]
+
+        with transaction.atomic():
+            # Resources may have been deleted since the hit was buffered
+            live_ids = set(Resource.objects.filter(id__in=hits).values_list('id', flat=True))
+            rows = [row for row in rows if row[1] in live_ids]
+
+            # Every hit counts in the rollups, whatever is kept as a row below
+            rollups.add_events(self.rollup_field, [event for event in events if event[1] in live_ids], day)
+
+            if self.unique_per_user and rows:
+                existing = set(
+                    self.model.objects.filter(
+                        user_id__in={user_id for user_id, _ in rows},
+                        resource_id__in={resource_id for _, resource_id in rows},
+                    ).values_list('user_id', 'resource_id')
+                )
+                rows = [row for row in rows if row not in existing]
+
+            # The event date is auto_now_add, so rows are stamped with the
+            # flush time, at most one flush interval after the actual hit.
+            self.model.objects.bulk_create(
+                [self.model(user_id=user_id, resource_id=resource_id) for user_id, resource_id in rows],
+                batch_size=500,
+            )
+
+            # One UPDATE per distinct delta rather than one per hit
+            by_delta = {}
+            for resource_id, count in hits.items():
+                if resource_id in live_ids:
+                    by_delta.setdefault(count, []).append(resource_id)
+            for delta, resource_ids in by_delta.items():
+                Resource.objects.filter(id__in=resource_ids).update(
+                    **{self.counter_field: F(self.counter_field) + delta}, updated_at=timezone.now(),
+                )
+            trending.add_events(self.trending_kind, {resource_id: count for resource_id, count in hits.items() if resource_id in live_ids})
+
+
+view_buffer = EventBuffer(View, 'views_count', 'views', 'view', unique_per_user=True)
+download_buffer = EventBuffer(Download, 'downloads_count', 'downloads', 'download')
+
+
+def record_view(resource, user=None):
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    view_buffer.record(resource.pk, user_id)
+
+
+def record_download(resource, user=None):
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    download_buffer.record(resource.pk, user_id)
+
+
+def flush_all():
+    view_buffer.flush()
+    download_buffer.flush()
+
+
+atexit.register(flush_all)
@@ -0,0 +1,139 @@
+"""
+Time-decayed trending scores.
+
+``Resource.trending_score`` is the sum of the weights of a resource's views,
+downloads, ratings and bookmarks, each decayed by half every
+``TRENDING_HALF_LIFE_HOURS``. Decaying every score continuously would mean
+rewriting every row all the time, so scores are stored relative to a shared
+reference time, ``TrendingState.epoch``: an event at time ``t`` adds
+``weight * 2 ** ((t - epoch) / half_life)``. Later events add more, which
+gives the same order as decaying everything else, and a score is one
+relative UPDATE per event (per flush, for views and downloads, see
+``library.tracking``). Top-N is an index scan on the column, overall or per
+subject (see ``library.leaderboards``).
+
+The multiplier doubles every half-life, so ``manage.py renormalize_trending``
+(run it daily) moves the epoch up to now and scales every score down by the
+same factor, which keeps the numbers small and the order unchanged. Scores
+that have decayed to nothing are set to zero. Writers and the job both lock
+the ``TrendingState`` row, so no event is added on the wrong scale.
+``--rebuild`` recomputes every score from the daily rollups, ratings and
+bookmarks.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time as day_time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Bookmark, Rating, Resource, ResourceActivityDay, TrendingState
+
+DEFAULT_WEIGHTS = {
+    'view': 1.0,
+    'download': 3.0,
+    'bookmark': 5.0,
+    # Times the rating (1-5)
+    'rating': 1.0,
+}
+# Scores below this are rounded to zero when renormalising
+NEGLIGIBLE = 1e-3
+BATCH_SIZE = 1000
+
+
+def _weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, 'TRENDING_WEIGHTS', {})}
+
+
+def half_life():
+    return getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 72) * 3600
+
+
+def _state():
+    # Locked until the caller's transaction ends
+    state, _ = TrendingState.objects.select_for_update().get_or_create(pk=1, defaults={'epoch': timezone.now()})
+    return state
+
+
+def _scale(epoch, when):
+    return 2 ** ((when - epoch).total_seconds() / half_life())
+
+
+def add_events(kind, hits, when=None):
+    """Add ``{resource_id: count}`` events of ``kind`` that happened at ``when`` (default: now)."""
+    weight = _weights()[kind]
+    when = when or timezone.now()
+    hits = {resource_id: count for resource_id, count in hits.items() if count}
+    if not hits or not weight:
+        return
+    with transaction.atomic():
+        scale = _scale(_state().epoch, when)
+        by_count = defaultdict(list)
+        for resource_id, count in hits.items():
+            by_count[count].append(resource_id)
+        # One UPDATE per distinct count, as for the counters
+        for count, resource_ids in by_count.items():
+            Resource.objects.filter(pk__in=resource_ids).update(
+                trending_score=F('trending_score') + weight * count * scale,
+            )
+
+
+def renormalize(now=None):
+    """Move the epoch to ``now`` and scale every score to match; returns the factor."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        state = _state()
+        factor = 1 / _scale(state.epoch, now)
+        Resource.objects.filter(trending_score__gt=0).update(
+            trending_score=Case(
+                When(trending_score__lt=NEGLIGIBLE / factor, then=Value(0.0)),
+                default=F('trending_score') * factor,
+                output_field=FloatField(),
+            ),
+        )
+        state.epoch = now
+        state.save(update_fields=['epoch'])
+    return factor
+
+
+def rebuild(now=None):
+    """Recompute every score from the recorded history. Returns how many resources have one."""
+    now = now or timezone.now()
+    weights = _weights()
+    scores = defaultdict(float)
+    current = timezone.get_current_timezone()
+    # Daily totals count as of noon on their day
+    for resource_id, day, views, downloads in ResourceActivityDay.objects.values_list(
+        'resource_id', 'day', 'views', 'downloads',
+    ).iterator(chunk_size=BATCH_SIZE):
+        scale = _scale(now, timezone.make_aware(datetime.combine(day, day_time(12)), current))
+        scores[resource_id] += (views * weights['view'] + downloads * weights['download']) * scale
+    for resource_id, rating, when in Rating.objects.values_list('resource_id', 'rating', 'rating_date').iterator(chunk_size=BATCH_SIZE):
+        scores[resource_id] += rating * weights['rating'] * _scale(now, when)
+    for resource_id, when in Bookmark.objects.values_list('resource_id', 'bookmark_date').iterator(chunk_size=BATCH_SIZE):
+        scores[resource_id] += weights['bookmark'] * _scale(now, when)
+
+    with transaction.atomic():
+        state = _state()
+        Resource.objects.filter(trending_score__gt=0).update(trending_score=0.0)
+        rows = [Resource(pk=resource_id, trending_score=score) for resource_id, score in scores.items() if score >= NEGLIGIBLE]
+        Resource.objects.bulk_update(rows, ['trending_score'], batch_size=BATCH_SIZE)
+        state.epoch = now
+        state.save(update_fields=['epoch'])
+    return len(rows)
+
+
+@receiver(post_save, sender=Rating)
+def add_rating(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_events('rating', {instance.resource_id: instance.rating})
+
+
+@receiver(post_save, sender=Bookmark)
+def add_bookmark(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_events('bookmark', {instance.resource_id: 1})
@@ -0,0 +1,336 @@
+"""
+Resumable chunked uploads.
+
+A client opens an upload session with the total size, sends the file in any
+number of ``PATCH`` requests, each starting at the session's current offset,
+and finalises the session with the resource's form fields. After a dropped
+connection it asks for the offset with ``HEAD`` and carries on from there
+instead of starting over. The headers follow tus 1.0 (``Upload-Length``,
+``Upload-Offset``, ``Upload-Metadata``, ``Upload-Checksum``, chunks sent as
+``application/offset+octet-stream``), see ``library.views`` for the
+endpoints.
+
+Chunks are appended to a part file under ``UPLOAD_TEMP_DIR`` as they are read
+from the request, and fed to a SHA-256 kept per session by the worker
+process. A worker that receives a chunk without having seen the previous
+ones catches up by hashing the part file once. Finalising hands the part
+file to storage as an already written temporary file, which
+``FileSystemStorage`` renames into place rather than copying.
+
+The part file's size is the session's offset, and a lock on it keeps two
+PATCHes to one session from interleaving. ``manage.py
+expire_upload_sessions`` removes sessions idle for ``UPLOAD_SESSION_TTL``
+seconds.
+
+On object storage that can sign uploads (``library.storage.S3Storage``) the
+browser skips all of this: ``create_direct_session()`` reserves an object
+name and signs a form POST to the bucket, and finalising only checks that
+the object arrived with the announced size.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File, locks
+from django.http import UnreadablePostError
+from django.utils import timezone
+
+from .models import Resource, UploadSession
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+# Running hashes kept per worker; abandoned sessions fall off the end
+MAX_HASHERS = 1000
+
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """A request the session cannot accept; ``status`` is the HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AssembledUpload(File):
+    """A finished part file; storage moves it into place instead of copying it."""
+
+    def __init__(self, path, name, size):
+        super().__init__(open(path, 'rb'), name)
+        self.path = path
+        self.size = size
+
+    def temporary_file_path(self):
+        return self.path
+
+
+class StoredObject(File):
+    """An object already in storage, to validate the upload form against."""
+
+    def __init__(self, name, size):
+        super().__init__(None, name)
+        self.size = size
+
+    def close(self):
+        pass
+
+
+def max_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 4 * 1024 ** 3)
+
+
+def max_chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', 64 * 1024 ** 2)
+
+
+def part_path(session):
+    return os.path.join(settings.UPLOAD_TEMP_DIR, f'{session.pk}.part')
+
+
+def current_offset(session):
+    try:
+        return os.path.getsize(part_path(session))
+    except FileNotFoundError:
+        return 0
+
+
+def parse_metadata(header):
+    """Decode a tus ``Upload-Metadata`` header into a dict of strings."""
+    metadata = {}
+    for pair in (header or '').split(','):
+        key, _, value = pair.strip().partition(' ')
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode('utf-8') if value else ''
+        except ValueError:
+            raise UploadError(f'Upload-Metadata value for "{key}" is not valid base64.')
+    return metadata
+
+
+def parse_checksum(header):
+    """``(algorithm, digest)`` from an ``Upload-Checksum`` header, or None."""
+    if not header:
+        return None
+    algorithm, _, value = header.strip().partition(' ')
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f'Unsupported checksum algorithm "{algorithm}".')
+    try:
+        return algorithm, base64.b64decode(value, validate=True)
+    except ValueError:
+        raise UploadError('Upload-Checksum digest is not valid base64.')
+
+
+def _file_storage():
+    return Resource._meta.get_field('file').storage
+
+
+def supports_direct_upload():
+    return hasattr(_file_storage(), 'presigned_upload')
+
+
+def _clean_new_upload(filename, length):
+    if length < 1:
+        raise UploadError('Upload-Length must be a positive number of bytes.')
+    if length > max_size():
+        raise UploadError(f'Uploads are limited to {max_size()} bytes.', 413)
+    filename = os.path.basename(filename.replace('\\', '/')).strip()
+    if not filename:
+        raise UploadError('A filename is required.')
+    if len(filename) > UploadSession._meta.get_field('filename').max_length:
+        raise UploadError('The filename is too long.')
+    return filename
+
+
+def create_session(user, filename, length):
+    filename = _clean_new_upload(filename, length)
+    session = UploadSession.objects.create(user=user, filename=filename, length=length)
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    open(part_path(session), 'xb').close()
+    return session
+
+
+def create_direct_session(user, filename, length, content_type=None):
+    """
+    Reserve an object name for a browser upload straight to storage. Returns
+    the session and the signed ``{'url', 'fields'}`` to POST the file to.
+    """
+    filename = _clean_new_upload(filename, length)
+    field = Resource._meta.get_field('file')
+    name = field.storage.get_available_name(field.generate_filename(None, filename), max_length=field.max_length)
+    session = UploadSession.objects.create(user=user, filename=filename, length=length, storage_name=name)
+    return session, field.storage.presigned_upload(name, length, content_type or None)
+
+
+def _take_hasher(session, offset):
+    # Popped, so a hasher is only ever used by the request holding the lock
+    with _hashers_lock:
+        entry = _hashers.pop(session.pk, None)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    # Chunks so far went to another worker, or this one restarted
+    hasher = hashlib.sha256()
+    with open(part_path(session), 'rb') as fp:
+        remaining = offset
+        while remaining:
+            data = fp.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher
+
+
+def _keep_hasher(session, offset, hasher):
+    with _hashers_lock:
+        _hashers[session.pk] = (offset, hasher)
+        while len(_hashers) > MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def _forget_hasher(session):
+    with _hashers_lock:
+        _hashers.pop(session.pk, None)
+
+
+def append_chunk(session, stream, offset, length, checksum=None):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset``. Without a
+    checksum, whatever arrived before a dropped connection is kept, as tus
+    requires; with one, the chunk is kept whole or not at all. Returns the
+    new offset.
+    """
+    if session.resource_id is not None:
+        raise UploadError('This upload has already been finalised.', 409)
+    if session.storage_name:
+        raise UploadError('This upload goes straight to storage.', 409)
+    if length is None:
+        raise UploadError('Content-Length is required.', 411)
+    if length > max_chunk_size():
+        raise UploadError(f'Chunks are limited to {max_chunk_size()} bytes.', 413)
+    if offset + length > session.length:
+        raise UploadError('The chunk runs past Upload-Length.', 413)
+
+    try:
+        fd = os.open(part_path(session), os.O_RDWR)
+    except FileNotFoundError:
+        raise UploadError('The upload has expired.', 410)
+    with os.fdopen(fd, 'r+b') as fp:
+        if not locks.lock(fp, locks.LOCK_EX | locks.LOCK_NB):
+            raise UploadError('Another chunk of this upload is still being written.', 409)
+        try:
+            size = fp.seek(0, os.SEEK_END)
+            if size != offset:
+                raise UploadError(f'Upload-Offset does not match the current offset {size}.', 409)
+            hasher = _take_hasher(session, offset)
+            chunk_hasher = hashlib.new(checksum[0]) if checksum else None
+
+            written = 0
+            failure = None
+            try:
+                while written < length:
+                    data = stream.read(min(CHUNK_SIZE, length - written))
+                    if not data:
+                        break
+                    fp.write(data)
+                    hasher.update(data)
+                    if chunk_hasher:
+                        chunk_hasher.update(data)
+                    written += len(data)
+            except (OSError, UnreadablePostError) as exc:
+                failure = exc
+
+            if written < length and failure is None:
+                failure = UploadError(f'The chunk ended after {written} of {length} bytes.')
+            if chunk_hasher and failure is None and chunk_hasher.digest() != checksum[1]:
+                failure = UploadError('The chunk does not match Upload-Checksum.', 460)
+            if failure is not None and chunk_hasher:
+                # Roll back; the running hash no longer matches the file
+                fp.truncate(offset)
+                written = 0
+            else:
+                _keep_hasher(session, offset + written, hasher)
+            fp.flush()
+            os.fsync(fp.fileno())
+        finally:
+            locks.unlock(fp)
+
+    new_offset = offset + written
+    UploadSession.objects.filter(pk=session.pk).update(offset=new_offset, updated_at=timezone.now())
+    session.offset = new_offset
+    if failure is not None:
+        if isinstance(failure, UploadError):
+            raise failure
+        raise UploadError(f'The connection dropped after {written} bytes: {failure}')
+    return new_offset
+
+
+def assembled_file(session):
+    """
+    The complete upload as an ``AssembledUpload``, with its SHA-256 stored on
+    the session. Raises ``UploadError`` if bytes are missing.
+    """
+    if session.resource_id is not None:
+        raise UploadError('This upload has already been finalised.', 409)
+    path = part_path(session)
+    size = current_offset(session)
+    if size != session.length:
+        raise UploadError(f'The upload is incomplete: {size} of {session.length} bytes received.', 409)
+    session.sha256 = _take_hasher(session, size).hexdigest()
+    return AssembledUpload(path, session.filename, size)
+
+
+def stored_object(session):
+    """
+    The directly uploaded object as a ``StoredObject``. Raises
+    ``UploadError`` if it is missing or not the announced size.
+    """
+    if session.resource_id is not None:
+        raise UploadError('This upload has already been finalised.', 409)
+    try:
+        size = _file_storage().size(session.storage_name)
+    except FileNotFoundError:
+        raise UploadError('The file has not reached storage yet.', 409)
+    if size != session.length:
+        raise UploadError(f'The stored file has {size} bytes, {session.length} were announced.', 409)
+    return StoredObject(session.filename, size)
+
+
+def complete(session, resource):
+    session.resource = resource
+    session.offset = session.length
+    session.save(update_fields=['resource', 'offset', 'sha256', 'updated_at'])
+    _forget_hasher(session)
+
+
+def discard(session):
+    """Delete a session and whatever it has received."""
+    if session.storage_name and session.resource_id is None:
+        _file_storage().delete(session.storage_name)
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    _forget_hasher(session)
+    session.delete()
+
+
+def expire_sessions(ttl=None):
+    """Delete sessions idle for ``ttl`` seconds; returns how many."""
+    ttl = ttl if ttl is not None else getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 3600)
+    expired = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=ttl))
+    count = 0
+    for session in expired.iterator():
+        discard(session)
+        count += 1
+    return count
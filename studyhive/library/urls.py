@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import profiling, views
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -7,15 +7,23 @@ urlpatterns = [
     path("logout", views.logout_view, name="logout"),
     path("register", views.register, name="register"),
     path('upload/', views.upload_resource, name='upload_resource'),
+    path('upload/batch/', views.import_resources_view, name='import_resources'),
+    path('upload/sessions/', views.create_upload_session, name='upload_sessions'),
+    path('upload/sessions/<uuid:session_id>/', views.upload_session, name='upload_session'),
+    path('upload/sessions/<uuid:session_id>/finalize/', views.finalize_upload, name='finalize_upload'),
+    path('upload/direct/', views.create_direct_upload, name='direct_upload'),
     path('profile/', views.profile_view, name='profile'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
     path('profile/<str:username>/', views.profile_view, name='user_profile'),
     path('resource/<int:resource_id>/', views.resource_detail, name='resource_detail'),
+    path('resource/<int:resource_id>/download/', views.download_resource, name='download_resource'),
     path('resource/<int:resource_id>/bookmark/', views.add_bookmark, name='add_bookmark'),
     path('resource/<int:resource_id>/unbookmark/', views.remove_bookmark, name='remove_bookmark'),
     path('bookmarks/', views.bookmarks_list, name='bookmarks_list'),
     path('tag/<int:tag_id>/', views.tag_resources, name='tag_resources'),
     path('recommendations/', views.recommendations_view, name='recommendations'),
     path('search/', views.search_resources, name='search_resources'),
+    path('autocomplete/', views.autocomplete_view, name='autocomplete'),
     path('subject/<int:subject_id>/', views.subject_resources, name='subject_resources'),
+    path('debug/queries/', profiling.query_report_view, name='query_report'),
 ]
\ No newline at end of file
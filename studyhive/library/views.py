@@ -1,15 +1,29 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate, login, logout
-from django.db import IntegrityError
-from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.contrib.auth.decorators import login_required, permission_required
 from django.shortcuts import HttpResponse, HttpResponseRedirect, render, redirect, get_object_or_404
-from django.urls import reverse
+from django.urls import reverse, reverse_lazy
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+from django.http import Http404, JsonResponse
+from django.conf import settings
 from django.contrib.auth.models import User 
 from django import forms
-from django.db.models import Avg, Q
-from .models import Resource, Tag, Subject, Download, View, Profile, Rating, Comment, Bookmark
+from django.db.models import Q
+from .models import Resource, Tag, Subject, Profile, Rating, Comment, Bookmark, ResourceNeighbor, UploadSession
+from .aio import arender, gather_queries, request_user, run_in_worker
+from .comments import thread_page
+from .downloads import serve_file
+from .leaderboards import get_leaderboards
+from .pagination import paginate, paginate_search
+from .importer import ImportSourceError, import_resources, open_source, read_manifest
+from .profiling import query_budget
+from .routing import replica_reads
+from .tags import parse_tag_names, resolve_tags
+from .tracking import record_download, record_view
+from . import autocomplete, caching, facets, rollups, uploads
 from django.contrib import messages
-from django.db.models import F
 
 
 class ProfileForm(forms.ModelForm):
@@ -36,7 +50,12 @@ class RegistrationForm(forms.ModelForm):
 
 class ResourceForm(forms.ModelForm):
     
-    tags = forms.CharField(widget=forms.TextInput(attrs={'placeholder': 'Enter tags separated by commas'}), required=False)
+    tags = forms.CharField(widget=forms.TextInput(attrs={
+        'placeholder': 'Enter tags separated by commas',
+        # Suggests existing tags, see library/static/library/autocomplete.js
+        'data-autocomplete': 'tags',
+        'data-autocomplete-url': reverse_lazy('autocomplete'),
+    }), required=False)
     class Meta:
         model = Resource
         fields = [
@@ -58,8 +77,12 @@ class ResourceForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(ResourceForm, self).__init__(*args, **kwargs)
         # Customize the fields as needed
-        self.fields['tags'].queryset = Tag.objects.all()
         self.fields['subject'].queryset = Subject.objects.all()
+        # Offered from the object cache; a submitted value is still checked
+        # against the table
+        self.fields['subject'].choices = [('', self.fields['subject'].empty_label)] + [
+            (subject.pk, str(subject)) for subject in caching.subjects.all()
+        ]
 
         self.fields['tags'].required = False
 
@@ -68,8 +91,7 @@ class ResourceForm(forms.ModelForm):
         tags = self.cleaned_data.get('tags')
         if tags:
             # Split the comma-separated string into a list of tag names
-            tag_list = [tag.strip() for tag in tags.split(',')]
-            return tag_list
+            return parse_tag_names(tags)
         return []
     
 
@@ -97,11 +119,18 @@ class ResourceForm(forms.ModelForm):
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
-        fields = ['comment_text']
+        fields = ['comment_text', 'parent_comment']
         widgets = {
             'comment_text': forms.Textarea(attrs={'rows': 3}),
+            'parent_comment': forms.HiddenInput(),
         }
 
+    def __init__(self, *args, resource=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Replies must stay on the same resource
+        if resource is not None:
+            self.fields['parent_comment'].queryset = Comment.objects.filter(resource=resource)
+
 
 class RatingForm(forms.ModelForm):
     class Meta:
@@ -113,17 +142,33 @@ class RatingForm(forms.ModelForm):
 
 
 
-def index(request):
+# Sort orders offered on resource listings, selected with ?sort=
+LISTING_ORDERINGS = {
+    'recent': ('-upload_date', '-id'),
+    'popular': ('-views_count', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+
+
+def listing_ordering(request):
+    return LISTING_ORDERINGS.get(request.GET.get('sort'), LISTING_ORDERINGS['recent'])
+
+
+@query_budget(6)
+@replica_reads
+async def index(request):
 
     # Authenticated users view their inbox
-    if request.user.is_authenticated:
-        popular_resources = Resource.objects.filter(is_active=True).order_by('-views_count')[:10]
-        recent_resources = Resource.objects.filter(is_active=True).order_by('-upload_date')[:10]
+    user = await request_user(request)
+    if user.is_authenticated:
+        boards = await run_in_worker(get_leaderboards, ['trending', 'recent'])
+        trending_resources = boards['trending']
+        recent_resources = boards['recent']
         context = {
-        'popular_resources': popular_resources,
+        'trending_resources': trending_resources,
         'recent_resources': recent_resources,
         }
-        return render(request, 'library/index.html', context)
+        return await arender(request, 'library/index.html', context)
 
     # Everyone else is prompted to sign in
     else:
@@ -170,31 +215,221 @@ def register(request):
 
 
 
+def save_uploaded_resource(form, user, stored_name=None):
+    resource = form.save(commit=False)
+    resource.uploader = user
+    if stored_name:
+        # Uploaded straight to storage; point at it instead of saving a copy
+        resource.file = stored_name
+    resource.save()
+    # Handle tags: one insert for the new ones, one fetch, one add
+    tags = form.cleaned_data.get('tags')
+    if tags:
+        resource.tags.add(*resolve_tags(tags).values())
+    return resource
+
+
+def render_upload_form(request, form):
+    # The page's script sends files straight to object storage when it can,
+    # else files over UPLOAD_CHUNK_SIZE in chunks
+    return render(request, 'library/upload_resource.html', {
+        'form': form,
+        'chunk_size': settings.UPLOAD_CHUNK_SIZE,
+        'direct_upload': uploads.supports_direct_upload(),
+    })
+
+
 @login_required
 def upload_resource(request):
     if request.method == 'POST':
         form = ResourceForm(request.POST, request.FILES)
         if form.is_valid():
-            resource = form.save(commit=False)
-            resource.uploader = request.user
-            resource.save()
-            # Handle tags
-            tags = form.cleaned_data.get('tags')
-            if tags:
-                resource.tags.clear()
-                for tag_name in tags:
-                    tag, created = Tag.objects.get_or_create(name=tag_name)
-                    resource.tags.add(tag)
+            resource = save_uploaded_resource(form, request.user)
             return redirect('resource_detail', resource_id=resource.id)
         else:
             # Form is invalid; render the form with errors
-            return render(request, 'library/upload_resource.html', {'form': form})
+            return render_upload_form(request, form)
     else:
         form = ResourceForm()
-    return render(request, 'library/upload_resource.html', {'form': form})
+    return render_upload_form(request, form)
+
+
+# Resumable chunked uploads (tus 1.0 core and termination), see library/uploads.py
+
+TUS_VERSION = '1.0.0'
+
+
+def tus_response(status=204, session=None, offset=None, **headers):
+    response = HttpResponse(status=status)
+    response['Tus-Resumable'] = TUS_VERSION
+    response['Cache-Control'] = 'no-store'
+    if session is not None:
+        response['Upload-Length'] = session.length
+        response['Upload-Offset'] = uploads.current_offset(session) if offset is None else offset
+    for name, value in headers.items():
+        response[name.replace('_', '-')] = value
+    return response
+
+
+def tus_error(error, session=None):
+    response = JsonResponse({'error': str(error)}, status=error.status)
+    if error.status == 460:
+        response.reason_phrase = 'Checksum Mismatch'
+    response['Tus-Resumable'] = TUS_VERSION
+    if session is not None:
+        response['Upload-Offset'] = uploads.current_offset(session)
+    return response
+
+
+def int_header(request, name):
+    value = request.headers.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise uploads.UploadError(f'{name} must be a non-negative integer.')
+    return int(value)
+
+
+def get_upload_session(request, session_id):
+    return get_object_or_404(UploadSession, pk=session_id, user=request.user)
+
+
+@require_http_methods(['POST', 'OPTIONS'])
+def create_upload_session(request):
+    """
+    Open a chunked upload: ``Upload-Length`` is the file size and
+    ``Upload-Metadata`` carries the base64 ``filename``. Responds 201 with
+    the session URL in ``Location``.
+    """
+    if request.method == 'OPTIONS':
+        return tus_response(
+            Tus_Version=TUS_VERSION, Tus_Extension='creation,termination,checksum',
+            Tus_Max_Size=uploads.max_size(), Tus_Checksum_Algorithm=','.join(uploads.CHECKSUM_ALGORITHMS),
+        )
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Log in to upload.'}, status=403)
+    try:
+        length = int_header(request, 'Upload-Length')
+        if length is None:
+            raise uploads.UploadError('Upload-Length is required.')
+        metadata = uploads.parse_metadata(request.headers.get('Upload-Metadata'))
+        session = uploads.create_session(request.user, metadata.get('filename', ''), length)
+    except uploads.UploadError as exc:
+        return tus_error(exc)
+    return tus_response(201, session, Location=reverse('upload_session', args=[session.pk]))
+
+
+@require_http_methods(['HEAD', 'PATCH', 'DELETE'])
+def upload_session(request, session_id):
+    """HEAD reports the offset, PATCH appends a chunk, DELETE abandons the upload."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Log in to upload.'}, status=403)
+    session = get_upload_session(request, session_id)
+    if request.method == 'HEAD':
+        return tus_response(200, session)
+    if request.method == 'DELETE':
+        uploads.discard(session)
+        return tus_response(204)
+    try:
+        if request.content_type != 'application/offset+octet-stream':
+            raise uploads.UploadError('Chunks must be sent as application/offset+octet-stream.', 415)
+        offset = int_header(request, 'Upload-Offset')
+        if offset is None:
+            raise uploads.UploadError('Upload-Offset is required.')
+        checksum = uploads.parse_checksum(request.headers.get('Upload-Checksum'))
+        # Read from the request stream, never request.body: the chunk goes
+        # to disk as it arrives
+        new_offset = uploads.append_chunk(session, request, offset, int_header(request, 'Content-Length'), checksum)
+    except uploads.UploadError as exc:
+        return tus_error(exc, session)
+    return tus_response(204, session, offset=new_offset)
+
+
+@require_POST
+def create_direct_upload(request):
+    """
+    Start an upload straight to object storage. Takes ``filename``, ``size``
+    and ``content_type``; responds 201 with the signed form to POST the file
+    to and the URL to finalise the upload at once it is stored.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Log in to upload.'}, status=403)
+    if not uploads.supports_direct_upload():
+        return JsonResponse({'error': 'Direct uploads need object storage; use /upload/sessions/.'}, status=404)
+    try:
+        size = request.POST.get('size', '')
+        if not size.isdigit():
+            raise uploads.UploadError('size must be a number of bytes.')
+        session, target = uploads.create_direct_session(
+            request.user, request.POST.get('filename', ''), int(size), request.POST.get('content_type'),
+        )
+    except uploads.UploadError as exc:
+        return JsonResponse({'error': str(exc)}, status=exc.status)
+    return JsonResponse({
+        'upload': target,
+        'finalize_url': reverse('finalize_upload', args=[session.pk]),
+    }, status=201)
+
+
+@require_POST
+def finalize_upload(request, session_id):
+    """
+    Turn a complete upload, chunked or direct, into a resource. Takes the
+    upload form's fields other than ``file``; responds 201 with the
+    resource, or 400 with the form errors.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Log in to upload.'}, status=403)
+    session = get_upload_session(request, session_id)
+    try:
+        if session.storage_name:
+            upload = uploads.stored_object(session)
+        else:
+            upload = uploads.assembled_file(session)
+    except uploads.UploadError as exc:
+        return tus_error(exc, None if session.storage_name else session)
+    try:
+        form = ResourceForm(request.POST, {'file': upload})
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+        with transaction.atomic():
+            resource = save_uploaded_resource(form, request.user, stored_name=session.storage_name)
+            uploads.complete(session, resource)
+    finally:
+        upload.close()
+    return JsonResponse({
+        'resource_id': resource.id,
+        'url': reverse('resource_detail', args=[resource.id]),
+        'sha256': session.sha256 or None,
+        'size': session.length,
+    }, status=201)
+
+
+@require_POST
+@permission_required('library.add_resource', raise_exception=True)
+def import_resources_view(request):
+    """
+    Batch upload: a ZIP ``archive`` with a ``manifest`` file (or a manifest
+    inside the archive), imported as by ``manage.py import_resources``.
+    Responds with the created ids and the per-row errors.
+    """
+    archive = request.FILES.get('archive')
+    if archive is None:
+        return JsonResponse({'error': 'An "archive" ZIP file is required.'}, status=400)
+    try:
+        source = open_source(archive)
+        try:
+            rows = read_manifest(source, request.FILES.get('manifest'))
+            result = import_resources(source, rows, request.user)
+        finally:
+            source.close()
+    except ImportSourceError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(result.as_dict(), status=201 if result.created else 400)
 
 
 @login_required
+@query_budget(8)
 def profile_view(request, username=None):
     if username:
         # Viewing another user's profile
@@ -206,11 +441,19 @@ def profile_view(request, username=None):
         is_own_profile = True
 
     # Get uploaded resources
-    uploaded_resources = Resource.objects.filter(uploader=user)
-
-    # Get activity history (Downloads and Views)
-    downloads = Download.objects.filter(user=user)
-    views = View.objects.filter(user=user)
+    uploaded_resources = paginate(
+        request, Resource.objects.filter(uploader=user), ('-upload_date', '-id'), param='uploads_cursor',
+    )
+
+    # Get activity history (Downloads and Views), one row per resource and day
+    downloads = paginate(
+        request, rollups.user_history(user, 'downloads').select_related('resource'), ('-day', '-id'),
+        param='downloads_cursor',
+    )
+    views = paginate(
+        request, rollups.user_history(user, 'views').select_related('resource'), ('-day', '-id'),
+        param='views_cursor',
+    )
 
     context = {
         'profile_user': user,
@@ -235,37 +478,28 @@ def edit_profile(request):
     return render(request, 'library/edit_profile.html', {'form': form})
 
 
-def resource_detail(request, resource_id):
-    resource = get_object_or_404(Resource, id=resource_id, is_active=True)
-    
-    # Record the view if the user is authenticated
-    if request.user.is_authenticated:
-        View.objects.get_or_create(user=request.user, resource=resource)
-    
-    # Update views count
-    resource.views_count = F('views_count') + 1
-    resource.save(update_fields=['views_count'])
-    
-    # Retrieve comments and ratings
-    comments = Comment.objects.filter(resource=resource).select_related('user').order_by('-comment_date')
-    average_rating = Rating.objects.filter(resource=resource).aggregate(Avg('rating'))['rating__avg'] or 0
-    total_ratings = Rating.objects.filter(resource=resource).count()
-    
-    # Handle comment submission
-    if request.method == 'POST' and 'comment_form' in request.POST:
-        comment_form = CommentForm(request.POST)
+def submit_resource_forms(request, resource):
+    """
+    Handle a comment, reply or rating POST on a resource page. Returns
+    ``(redirect, comment_form, rating_form)``; ``redirect`` is None when the
+    forms need to be shown again with their errors.
+    """
+    comment_form = CommentForm()
+    rating_form = RatingForm()
+
+    # Handle comment and reply submission
+    if 'comment_form' in request.POST:
+        comment_form = CommentForm(request.POST, resource=resource)
         if comment_form.is_valid():
             comment = comment_form.save(commit=False)
             comment.user = request.user
             comment.resource = resource
             comment.save()
             messages.success(request, 'Your comment has been posted.')
-            return redirect('resource_detail', resource_id=resource.id)
-    else:
-        comment_form = CommentForm()
-    
+            return redirect('resource_detail', resource_id=resource.id), comment_form, rating_form
+
     # Handle rating submission
-    if request.method == 'POST' and 'rating_form' in request.POST:
+    if 'rating_form' in request.POST:
         rating_form = RatingForm(request.POST)
         if rating_form.is_valid():
             rating, created = Rating.objects.update_or_create(
@@ -274,54 +508,113 @@ def resource_detail(request, resource_id):
                 defaults={'rating': rating_form.cleaned_data['rating']}
             )
             messages.success(request, 'Your rating has been submitted.')
-            return redirect('resource_detail', resource_id=resource.id)
+            return redirect('resource_detail', resource_id=resource.id), comment_form, rating_form
+
+    return None, comment_form, rating_form
+
+
+def get_user_rating(user, resource):
+    if not user.is_authenticated:
+        return None
+    return Rating.objects.filter(user=user, resource=resource).values_list('rating', flat=True).first()
+
+
+def is_bookmarked_by(user, resource):
+    return user.is_authenticated and Bookmark.objects.filter(user=user, resource=resource).exists()
+
+
+@query_budget(10)
+@replica_reads
+async def resource_detail(request, resource_id):
+    resource = await run_in_worker(caching.resources.get_or_404, resource_id)
+    if not resource.is_active:
+        raise Http404('No Resource matches the given query.')
+    user = await request_user(request)
+
+    if request.method == 'POST':
+        response, comment_form, rating_form = await sync_to_async(submit_resource_forms)(request, resource)
+        if response is not None:
+            return response
     else:
-        rating_form = RatingForm()
-    
-    # Check if the user has already rated
-    user_rating = None
-    if request.user.is_authenticated:
-        try:
-            user_rating = Rating.objects.get(user=request.user, resource=resource).rating
-        except Rating.DoesNotExist:
-            pass
-    
+        comment_form, rating_form = CommentForm(), RatingForm()
+        # Record the view; it is buffered and written to the database in bulk
+        if request.method == 'GET':
+            record_view(resource, user)
+
+    # The comment threads, the user's rating and bookmark and the tags are
+    # independent, so fetch them concurrently
+    comments, user_rating, is_bookmarked, tags = await gather_queries(
+        (thread_page, request, resource),
+        (get_user_rating, user, resource),
+        (is_bookmarked_by, user, resource),
+        lambda: list(resource.tags.all()),
+    )
+
     context = {
         'resource': resource,
         'comments': comments,
         'comment_form': comment_form,
         'rating_form': rating_form,
-        'average_rating': round(average_rating, 1),
-        'total_ratings': total_ratings,
+        'average_rating': round(resource.average_rating, 1),
+        'total_ratings': resource.total_ratings,
         'user_rating': user_rating,
+        'is_bookmarked': is_bookmarked,
+        'tags': tags,
     }
-    return render(request, 'library/resource_detail.html', context)
+    return await arender(request, 'library/resource_detail.html', context)
+
+
+@require_safe
+def download_resource(request, resource_id):
+    resource = caching.resources.get_or_404(resource_id)
+    if not resource.is_active:
+        raise Http404('No Resource matches the given query.')
+    if not resource.file:
+        raise Http404('This resource has no file to download.')
+
+    try:
+        response, counted = serve_file(request, resource.file)
+    except FileNotFoundError:
+        raise Http404('The file for this resource is missing.')
+    # Buffered like views, so the download itself never writes to the database
+    if counted:
+        record_download(resource, request.user)
+    return response
 
 
 @login_required
 def add_bookmark(request, resource_id):
-    resource = get_object_or_404(Resource, id=resource_id)
+    resource = caching.resources.get_or_404(resource_id)
     Bookmark.objects.get_or_create(user=request.user, resource=resource)
     return redirect('resource_detail', resource_id=resource.id)
 
 
 @login_required
 def remove_bookmark(request, resource_id):
-    resource = get_object_or_404(Resource, id=resource_id)
+    resource = caching.resources.get_or_404(resource_id)
     Bookmark.objects.filter(user=request.user, resource=resource).delete()
     return redirect('resource_detail', resource_id=resource.id)
 
 @login_required
+@query_budget(6)
 def bookmarks_list(request):
-    bookmarks = Bookmark.objects.filter(user=request.user).select_related('resource')
+    bookmarks = paginate(
+        request,
+        Bookmark.objects.filter(user=request.user).select_related('resource'),
+        ('-bookmark_date', '-id'),
+    )
     context = {
         'bookmarks': bookmarks,
     }
     return render(request, 'library/bookmarks_list.html', context)
 
+@query_budget(7)
+@replica_reads
 def tag_resources(request, tag_id):
-    tag = get_object_or_404(Tag, id=tag_id)
-    resources = Resource.objects.filter(tags=tag, is_active=True).order_by('-upload_date')
+    tag = caching.tags.get_or_404(tag_id)
+    resources = paginate(
+        request, Resource.objects.filter(tags=tag, is_active=True).select_related('uploader'), listing_ordering(request),
+    )
     context = {
         'tag': tag,
         'resources': resources,
@@ -332,47 +625,46 @@ def tag_resources(request, tag_id):
 # Recommendations implementation
 
 def get_popular_resources():
-    # Top resources based on views, downloads, and ratings
-    popular_by_views = Resource.objects.filter(is_active=True).order_by('-views_count')[:10]
-    popular_by_downloads = Resource.objects.filter(is_active=True).order_by('-downloads_count')[:10]
-    popular_by_ratings = Resource.objects.filter(is_active=True).annotate(avg_rating=Avg('ratings__rating')).order_by('-avg_rating')[:10]
+    # Top resources based on recent activity, then all-time downloads and ratings
+    boards = get_leaderboards(['trending', 'downloads', 'rating'])
 
     # Combine and remove duplicates while preserving order
-    popular_resources = list(dict.fromkeys(list(popular_by_views) + list(popular_by_downloads) + list(popular_by_ratings)))
+    popular_resources = list(dict.fromkeys(boards['trending'] + boards['downloads'] + boards['rating']))
     return popular_resources[:10]
 
 def get_recent_resources():
-    recent_resources = Resource.objects.filter(is_active=True).order_by('-upload_date')[:10]
-    return recent_resources
-
-def get_user_activity_recommendations(user):
-    # Get resources the user has interacted with
-    user_resources = Resource.objects.filter(
-        Q(views__user=user) | Q(downloads__user=user) | Q(ratings__user=user)
-    ).distinct()
-
-    # Get tags and subjects from these resources
-    user_tags = Tag.objects.filter(resources__in=user_resources).distinct()
-    user_subjects = Subject.objects.filter(resources__in=user_resources).distinct()
-
-    # Get resources matching these tags and subjects
-    recommended_resources = Resource.objects.filter(
-        (Q(tags__in=user_tags) | Q(subject__in=user_subjects)),
-        is_active=True
-    ).exclude(
-        id__in=user_resources.values_list('id', flat=True)
-    ).distinct().order_by('-views_count')[:10]
+    return get_leaderboards(['recent'])['recent']
+
+def get_user_activity_recommendations(user, limit=10):
+    # Resources the user interacted with most recently; each is an indexed
+    # lookup on (user, date)
+    history = 50
+    seen = set()
+    seen.update(rollups.recent_resource_ids(user, 'views', history))
+    seen.update(rollups.recent_resource_ids(user, 'downloads', history))
+    seen.update(Rating.objects.filter(user=user).order_by('-rating_date').values_list('resource_id', flat=True)[:history])
+    seen.update(Bookmark.objects.filter(user=user).order_by('-bookmark_date').values_list('resource_id', flat=True)[:history])
+    if not seen:
+        return []
 
-    return recommended_resources
+    # Sum the precomputed similarities of their neighbours (see library/recommender.py)
+    scores = {}
+    for neighbor_id, score in ResourceNeighbor.objects.filter(resource_id__in=seen).values_list('neighbor_id', 'score'):
+        if neighbor_id not in seen:
+            scores[neighbor_id] = scores.get(neighbor_id, 0.0) + score
+    best = sorted(scores, key=lambda resource_id: (-scores[resource_id], resource_id))[:limit * 2]
 
+    found = Resource.objects.filter(is_active=True).select_related('uploader').in_bulk(best)
+    return [found[resource_id] for resource_id in best if resource_id in found][:limit]
 
-def get_combined_recommendations(user):
-    recommendations = []
 
-    # Get recommendations from different methods
-    popular_resources = get_popular_resources()
-    recent_resources = get_recent_resources()
-    activity_based_resources = get_user_activity_recommendations(user)
+async def get_combined_recommendations(user):
+    # Get recommendations from the different methods concurrently
+    popular_resources, recent_resources, activity_based_resources = await gather_queries(
+        get_popular_resources,
+        get_recent_resources,
+        (get_user_activity_recommendations, user),
+    )
     
     # Combine and prioritize recommendations
     combined_list = list(dict.fromkeys(
@@ -384,55 +676,126 @@ def get_combined_recommendations(user):
     return combined_list[:10]
 
 @login_required
-def recommendations_view(request):
-    recommendations = get_combined_recommendations(request.user)
+@query_budget(12)
+@replica_reads
+async def recommendations_view(request):
+    recommendations = await get_combined_recommendations(await request_user(request))
     context = {
         'recommendations': recommendations,
     }
-    return render(request, 'library/recommendations.html', context)
+    return await arender(request, 'library/recommendations.html', context)
 
 
-def search_resources(request):
-    query = request.GET.get('q')
-    resources = Resource.objects.filter(is_active=True)
-    
-    if query:
-        resources = resources.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(tags__name__icontains=query)
-        ).distinct()
-    
-    # Filtering by subject
+@require_safe
+@query_budget(2)
+def autocomplete_view(request):
+    """
+    Tag and title suggestions for ``?q=`` as JSON. Answered from memory; the
+    two queries are only run by the first request a process serves.
+    """
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 10
+    return JsonResponse(autocomplete.suggest(request.GET.get('q', ''), limit))
+
+
+# Query string parameter of each search filter (see library/facets.py)
+FACET_PARAMS = {
+    'subject_id': 'subject',
+    'resource_type': 'resource_type',
+    'file_type': 'file_type',
+}
+
+
+def search_filters(request):
     subject_id = request.GET.get('subject')
-    if subject_id:
-        resources = resources.filter(subject__id=subject_id)
-    
-    # Filtering by resource type
-    resource_type = request.GET.get('resource_type')
-    if resource_type:
-        resources = resources.filter(resource_type=resource_type)
-    
-    # Filtering by file type
-    file_type = request.GET.get('file_type')
-    if file_type:
-        resources = resources.filter(file_type=file_type)
-    
-    # Get all subjects and file types for filter options
-    subjects = Subject.objects.all()
-    file_types = Resource.FILE_TYPE_CHOICES  # Assuming you have this in your model
-    
+    return {
+        'subject_id': int(subject_id) if subject_id and subject_id.isdigit() else None,
+        'resource_type': request.GET.get('resource_type') or None,
+        'file_type': request.GET.get('file_type') or None,
+    }
+
+
+def find_resources(request, query, filters):
+    """The page of search results or filtered listings for ``request``."""
+    if query:
+        # Ranked lookup in the full-text index, best match first
+        resources = paginate_search(request, query, filters)
+    else:
+        resources = Resource.objects.filter(is_active=True).select_related('uploader')
+        resources = resources.filter(**{key: value for key, value in filters.items() if value is not None})
+        resources = paginate(request, resources, listing_ordering(request))
+    return resources
+
+
+def facet_options(request, counts, filters, labels):
+    """
+    ``[{'name', 'options': [{'label', 'count', 'selected', 'url'}]}]`` for the
+    filter sidebar. Each option's link toggles it and goes back to page one.
+    """
+    groups = []
+    for facet, name in (('subject_id', 'Subject'), ('resource_type', 'Type'), ('file_type', 'File type')):
+        param = FACET_PARAMS[facet]
+        selected = filters[facet]
+        values = [value for value, _ in counts[facet].most_common()]
+        if selected is not None and selected not in values:
+            values.append(selected)
+        options = []
+        for value in values:
+            params = request.GET.copy()
+            params.pop('cursor', None)
+            is_selected = value == selected
+            if is_selected:
+                params.pop(param, None)
+            else:
+                params[param] = str(value)
+            options.append({
+                'label': labels[facet].get(value, value),
+                'count': counts[facet].get(value, 0),
+                'selected': is_selected,
+                'url': f'?{params.urlencode()}',
+            })
+        groups.append({'name': name, 'options': options})
+    return groups
+
+
+@query_budget(7)
+@replica_reads
+async def search_resources(request):
+    query = request.GET.get('q')
+    filters = search_filters(request)
+
+    # The results, the facet counts for the whole query (see
+    # library/facets.py) and the subject names (see library/caching.py) are
+    # fetched concurrently
+    resources, (counts, total), subjects = await gather_queries(
+        (find_resources, request, query, filters),
+        (facets.get_facets, query, filters),
+        caching.subjects.in_bulk,
+    )
+
+    labels = {
+        'subject_id': {pk: subject.name for pk, subject in subjects.items()},
+        'resource_type': dict(Resource.RESOURCE_TYPE_CHOICES),
+        'file_type': dict(Resource.FILE_TYPE_CHOICES),
+    }
     context = {
         'resources': resources,
         'query': query,
-        'subjects': subjects,
-        'file_types': [ft[0] for ft in file_types],  # Extract file type names
+        'total': total,
+        'facets': facet_options(request, counts, filters, labels),
     }
-    return render(request, 'library/search_results.html', context)
+    return await arender(request, 'library/search_results.html', context)
 
+@query_budget(7)
+@replica_reads
 def subject_resources(request, subject_id):
-    subject = get_object_or_404(Subject, id=subject_id)
-    resources = Resource.objects.filter(subject=subject, is_active=True)
+    subject = caching.subjects.get_or_404(subject_id)
+    resources = paginate(
+        request, Resource.objects.filter(subject=subject, is_active=True).select_related('uploader'),
+        listing_ordering(request),
+    )
 
     context = {
         'subject': subject,
@@ -0,0 +1,75 @@
+"""
+Process pools for document jobs that must stay off the request path.
+
+Preview rendering (``library.previews``) and text extraction
+(``library.extraction``) each keep one lazily started pool per web process.
+Workers are spawned, not forked, because the web process has threads and
+open database connections, so whatever runs in them must import without
+Django (see ``library.tools``).
+"""
+
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+
+def document_source(fieldfile):
+    """
+    What a worker should read ``fieldfile`` from: its path on local storage,
+    or a signed URL on object storage.
+    """
+    try:
+        return fieldfile.storage.path(fieldfile.name)
+    except NotImplementedError:
+        return fieldfile.storage.url(fieldfile.name)
+
+
+class WorkerPool:
+    """
+    ``ProcessPoolExecutor`` sized by the ``<prefix>_WORKERS`` setting, whose
+    workers are replaced after ``<prefix>_TASKS_PER_CHILD`` jobs.
+    """
+
+    def __init__(self, prefix, initializer=None, initargs=()):
+        self.prefix = prefix
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    @property
+    def workers(self):
+        return getattr(settings, f'{self.prefix}_WORKERS', 2)
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def make(self, workers=None):
+        """A new executor, for callers that manage its lifetime themselves."""
+        initargs = self.initargs() if callable(self.initargs) else self.initargs
+        return ProcessPoolExecutor(
+            max_workers=workers or self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=self.initializer,
+            initargs=initargs,
+            max_tasks_per_child=getattr(settings, f'{self.prefix}_TASKS_PER_CHILD', 50),
+        )
+
+    def get(self):
+        """The shared executor, started on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.make()
+            return self._executor
+
+    def shutdown(self):
+        # Queued jobs are dropped; the backfill commands pick them up later
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
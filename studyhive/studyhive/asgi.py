@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'studyhive.settings')
+# Read by the settings: no persistent database connections under ASGI
+os.environ.setdefault('STUDYHIVE_SERVER', 'asgi')
 
 application = get_asgi_application()
@@ -38,10 +38,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     'library',
 ]
 
 MIDDLEWARE = [
+    'library.profiling.QueryProfilingMiddleware',
+    'library.routing.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'library.context_processors.user_profile',
             ],
         },
     },
@@ -75,13 +79,85 @@ WSGI_APPLICATION = 'studyhive.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Under WSGI, connections are kept open between requests (one per thread)
+# and checked before reuse. studyhive/asgi.py sets STUDYHIVE_SERVER=asgi,
+# which closes them after every request and every gather_queries worker
+# call instead: async views run queries on a pool of executor threads, and
+# persistent connections would leave each of those threads holding one.
+# SQLite runs in WAL mode, so readers don't block the writer,
+# with synchronous=NORMAL, memory-mapped reads and a busy timeout; writes
+# take the lock up front (BEGIN IMMEDIATE) so concurrent writers wait their
+# turn instead of failing with "database is locked". On PostgreSQL, drop
+# CONN_MAX_AGE and set OPTIONS = {'pool': True} instead.
+CONN_MAX_AGE = 0 if os.environ.get('STUDYHIVE_SERVER') == 'asgi' else 600
+SQLITE_OPTIONS = {
+    'timeout': 20,
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': ';'.join([
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA mmap_size=268435456',
+        'PRAGMA cache_size=-20000',
+        'PRAGMA temp_store=MEMORY',
+    ]),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
+# Read replicas (see library/routing.py)
+# Listing, search, resource and API reads go to a replica; writes, and a
+# client's reads for REPLICA_PIN_SECONDS after it wrote, go to the primary.
+# STUDYHIVE_DB_REPLICAS is a comma-separated list of SQLite files opened
+# read-only; `manage.py sync_sqlite_replicas` copies the primary into them.
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get('STUDYHIVE_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'{Path(path).resolve().as_uri()}?mode=ro',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20, 'init_command': 'PRAGMA mmap_size=268435456'},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['library.routing.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+
+# Cache (see library/caching.py)
+# STUDYHIVE_CACHE picks per-process memory (the default), a directory shared
+# by the processes of one host, or a Redis-compatible server (Redis, Valkey,
+# KeyDB) at CACHE_URL. Cached objects are invalidated by deleting their keys,
+# so several processes need a shared cache to see each other's changes.
+STUDYHIVE_CACHE = os.environ.get('STUDYHIVE_CACHE', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'studyhive',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_URL', 'redis://127.0.0.1:6379/0'),
+        'KEY_PREFIX': 'studyhive',
+    },
+}
+CACHES = {'default': CACHE_BACKENDS[STUDYHIVE_CACHE]}
+# Resources, subjects, tags and profiles are cached this many seconds at most
+OBJECT_CACHE_TIMEOUT = 600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -126,4 +202,165 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Media files (user-uploaded content)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# File storage (see library/storage.py)
+# Uploads live under MEDIA_ROOT unless STUDYHIVE_STORAGE=s3, which keeps them
+# in an S3-compatible bucket (AWS, MinIO, moto). Browsers then upload and
+# download through presigned URLs and Django never handles the bytes.
+STORAGE_BACKEND = os.environ.get('STUDYHIVE_STORAGE', 'filesystem')
+S3_STORAGE_OPTIONS = {
+    'bucket_name': os.environ.get('S3_BUCKET', 'studyhive'),
+    'endpoint_url': os.environ.get('S3_ENDPOINT_URL') or None,
+    'region_name': os.environ.get('S3_REGION', 'us-east-1'),
+    'access_key': os.environ.get('S3_ACCESS_KEY_ID'),
+    'secret_key': os.environ.get('S3_SECRET_ACCESS_KEY'),
+    'addressing_style': os.environ.get('S3_ADDRESSING_STYLE', 'auto'),
+    'url_expiry': 3600,
+}
+STORAGES = {
+    'default': (
+        {'BACKEND': 'library.storage.S3Storage', 'OPTIONS': S3_STORAGE_OPTIONS}
+        if STORAGE_BACKEND == 's3'
+        else {'BACKEND': 'django.core.files.storage.FileSystemStorage'}
+    ),
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Buffered view/download tracking (see library/tracking.py)
+# Events are flushed when the buffer reaches TRACKING_BUFFER_SIZE, every
+# TRACKING_FLUSH_INTERVAL seconds (0 disables the timer), and on shutdown.
+# A batch that keeps failing is dropped after TRACKING_MAX_RETRIES retries.
+TRACKING_FLUSH_INTERVAL = 10
+TRACKING_BUFFER_SIZE = 500
+TRACKING_MAX_RETRIES = 5
+
+# Daily activity rollups (see library/rollups.py)
+# Raw View/Download rows older than ACTIVITY_RETENTION_DAYS are deleted by
+# `manage.py compact_activity` (run it daily from cron), in batches of
+# ACTIVITY_COMPACT_BATCH_SIZE rows.
+ACTIVITY_RETENTION_DAYS = 90
+ACTIVITY_COMPACT_BATCH_SIZE = 5000
+
+# Resource downloads (see library/downloads.py)
+# None streams files from Django with Range support. 'x-accel-redirect'
+# (nginx, internal location at DOWNLOAD_ACCEL_PREFIX mapped to MEDIA_ROOT) or
+# 'x-sendfile' (Apache/lighttpd) hand the transfer to the web server instead.
+DOWNLOAD_SENDFILE_MODE = None
+DOWNLOAD_ACCEL_PREFIX = '/protected/'
+
+# Cursor pagination for resource listings (see library/pagination.py)
+# Clients may ask for ?page_size= up to PAGINATION_MAX_PAGE_SIZE.
+PAGINATION_PAGE_SIZE = 24
+PAGINATION_MAX_PAGE_SIZE = 100
+
+# Item-to-item recommendations (see library/recommender.py)
+# Rebuild with `manage.py build_recommendations` (incremental) or `--full`.
+RECOMMENDER_TOP_K = 20
+RECOMMENDER_MIN_SCORE = 0.01
+
+# Materialised leaderboards (see library/leaderboards.py)
+# Boards are refreshed after LEADERBOARD_REFRESH_DELTA tracked events or
+# LEADERBOARD_REFRESH_INTERVAL seconds, and by `manage.py refresh_leaderboards`.
+# New uploads refresh the "recent" board LEADERBOARD_RECENT_DELAY seconds later.
+LEADERBOARD_SIZE = 10
+LEADERBOARD_REFRESH_DELTA = 1000
+LEADERBOARD_REFRESH_INTERVAL = 600
+LEADERBOARD_CACHE_TIMEOUT = 300
+LEADERBOARD_RECENT_DELAY = 5
+
+# Trending scores (see library/trending.py)
+# Each view, download, bookmark and rating (times its value) adds its weight
+# in TRENDING_WEIGHTS, halved every TRENDING_HALF_LIFE_HOURS. Run
+# `manage.py renormalize_trending` daily from cron.
+TRENDING_HALF_LIFE_HOURS = 72
+TRENDING_WEIGHTS = {'view': 1.0, 'download': 3.0, 'bookmark': 5.0, 'rating': 1.0}
+
+# Search facet counts (see library/facets.py)
+# Per-query counts by subject, resource type and file type are cached this
+# many seconds, so they may lag behind new uploads by as much.
+FACET_CACHE_TIMEOUT = 60
+
+# Tag and title autocomplete (see library/autocomplete.py)
+# Each process keeps the index in memory and reloads it in the background
+# once it is this many seconds old, picking up other processes' changes.
+AUTOCOMPLETE_REFRESH_INTERVAL = 900
+
+# Resource card cache (see library/cards.py)
+# Rendered cards are cached per resource and invalidated by Resource.card_version,
+# so the timeout only bounds how long unused entries linger.
+CARD_CACHE_TIMEOUT = 6 * 3600
+
+# Query profiling (see library/profiling.py)
+# Adds X-Query-Count/X-Query-Time-ms/X-Query-Duplicates headers and keeps a
+# rolling report of the last QUERY_PROFILING_WINDOW requests per URL name at
+# /debug/queries/. QUERY_BUDGETS overrides the budgets declared on views.
+QUERY_PROFILING = DEBUG
+QUERY_PROFILING_WINDOW = 200
+QUERY_BUDGETS = {}
+
+# Threaded comments (see library/comments.py)
+COMMENT_THREADS_PER_PAGE = 20
+
+# Async views (see library/aio.py)
+# Independent queries in async views run concurrently on separate
+# connections. Turn off to run them one at a time on the request's thread.
+ASYNC_CONCURRENT_QUERIES = True
+
+# Bulk resource import (see library/importer.py)
+# Rows are inserted IMPORT_BATCH_SIZE per transaction while IMPORT_WORKERS
+# threads copy the files into storage.
+IMPORT_BATCH_SIZE = 200
+IMPORT_WORKERS = 8
+
+# Resumable chunked uploads (see library/uploads.py)
+# Part files are kept in UPLOAD_TEMP_DIR, which should be on the same
+# filesystem as MEDIA_ROOT so finished uploads are renamed, not copied.
+# The upload page switches to chunks for files over UPLOAD_CHUNK_SIZE.
+UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, 'uploads')
+UPLOAD_MAX_SIZE = 4 * 1024 ** 3
+UPLOAD_CHUNK_SIZE = 8 * 1024 ** 2
+UPLOAD_CHUNK_MAX_SIZE = 64 * 1024 ** 2
+UPLOAD_SESSION_TTL = 24 * 3600
+
+# Document preview thumbnails (see library/previews.py)
+# First pages are rendered at each width in PREVIEW_SIZES by PREVIEW_WORKERS
+# processes (0 turns background rendering off). Each pdftoppm/LibreOffice run
+# gets PREVIEW_CPU_LIMIT seconds of CPU, PREVIEW_MEMORY_LIMIT bytes of memory
+# and PREVIEW_TIMEOUT seconds in all.
+PREVIEW_SIZES = (160, 320, 640)
+PREVIEW_DIR = 'previews/'
+PREVIEW_WORKERS = 2
+PREVIEW_TASKS_PER_CHILD = 50
+PREVIEW_CPU_LIMIT = 30
+PREVIEW_MEMORY_LIMIT = 1024 ** 3
+PREVIEW_TIMEOUT = 60
+
+# Document text extraction for search (see library/extraction.py)
+# Up to TEXT_EXTRACTION_MAX_CHARS of each document's text is indexed.
+# TEXT_EXTRACTION_WORKERS = 0 turns background extraction off; the
+# `extract_text` command still works.
+TEXT_EXTRACTION_MAX_CHARS = 200_000
+TEXT_EXTRACTION_WORKERS = 2
+TEXT_EXTRACTION_TASKS_PER_CHILD = 50
+TEXT_EXTRACTION_CPU_LIMIT = 60
+TEXT_EXTRACTION_MEMORY_LIMIT = 1024 ** 3
+TEXT_EXTRACTION_TIMEOUT = 120
+
+# File size, MIME type and page count of uploads (see library/media.py)
+# Probed on the text extraction pool; `manage.py probe_media` backfills.
+MEDIA_PROBE_CPU_LIMIT = 10
+MEDIA_PROBE_TIMEOUT = 30
+
+# Read-only JSON API at /api/v1/ (see library/api/)
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'DEFAULT_PAGINATION_CLASS': 'library.api.pagination.KeysetPagination',
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'] + (
+        ['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []
+    ),
+}
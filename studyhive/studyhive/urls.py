@@ -21,5 +21,6 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/v1/', include('library.api.urls')),
     path('', include("library.urls")),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)